@@ -0,0 +1,443 @@
+import os
+import time
+import sqlite3
+import argparse
+import threading
+
+import numpy as np
+import pandas as pd
+
+import review_queue
+import annotation_store
+import review_dataset
+
+
+# File extensions of annotation databases
+DATABASE_EXTENSIONS = [".sqlite", ".sqlite3", ".db"]
+
+SCHEMA = """
+CREATE TABLE images (
+    image_idx   INTEGER PRIMARY KEY,
+    image_name  TEXT NOT NULL UNIQUE,
+    decision    INTEGER NOT NULL DEFAULT 0,
+    session_id  TEXT,
+    decided_at  REAL
+);
+CREATE TABLE categories (
+    category_idx    INTEGER PRIMARY KEY,
+    category        TEXT NOT NULL UNIQUE
+);
+"""
+
+INDEXES = """
+CREATE INDEX annotations_image_idx ON annotations (image_idx);
+CREATE INDEX annotations_category_idx ON annotations (category_idx);
+CREATE INDEX images_decision ON images (decision, image_idx);
+"""
+
+# Columns of the annotation file that are stored as IDs of the images / categories tables in the annotations table
+INTERNED_COLUMNS = {
+    "image_name": ("image_idx", "INTEGER NOT NULL REFERENCES images"),
+    "category": ("category_idx", "INTEGER REFERENCES categories")
+}
+
+
+def is_database(path):
+    return os.path.splitext(path)[1].lower() in DATABASE_EXTENSIONS
+
+
+def connect(path_database):
+    connection = sqlite3.connect(path_database, timeout=30)
+    connection.execute("PRAGMA synchronous=NORMAL")
+    return connection
+
+
+def file_columns(connection):
+    """Returns the columns of the annotation file imported into a database (see INTERNED_COLUMNS)."""
+    stored_columns = {stored: column for column, (stored, _) in INTERNED_COLUMNS.items()}
+    return [stored_columns.get(row[1], row[1]) for row in connection.execute("PRAGMA table_info(annotations)") if row[1] != "row_id"]
+
+
+def read_columns(path_database):
+    """Returns the column names of the annotations of a database without reading its rows."""
+    connection = connect(path_database)
+    try:
+        return file_columns(connection)
+    finally:
+        connection.close()
+
+
+def sql_type(dtype):
+    if pd.api.types.is_integer_dtype(dtype) or pd.api.types.is_bool_dtype(dtype):
+        return "INTEGER"
+    if pd.api.types.is_float_dtype(dtype):
+        return "REAL"
+    return "TEXT"
+
+
+def annotation_chunks(path_annotations, chunk_size):
+    """Yields the annotations of a pipe-separated CSV (read incrementally), Parquet or Feather file in chunks."""
+    if annotation_store.file_format(path_annotations) == "csv":
+        yield from pd.read_csv(path_annotations, sep="|", chunksize=chunk_size)
+        return
+    df = annotation_store.read_annotations(path_annotations)
+    for start in range(0, max(len(df), 1), chunk_size):
+        yield df.iloc[start:start + chunk_size]
+
+
+def import_decisions(connection, path, decision):
+    """Sets the decision of the images contained in a file of approved / discarded annotations."""
+    try:
+        image_names = annotation_store.read_annotations(path, columns=["image_name"])["image_name"].unique()
+    except pd.errors.EmptyDataError:
+        return
+    with connection:
+        connection.executemany(
+            "UPDATE images SET decision = ? WHERE image_name = ?",
+            ((decision, image_name) for image_name in image_names)
+        )
+
+
+def import_annotations(path_annotations, path_database, path_approved="", path_discarded="", chunk_size=1 << 18):
+    """Imports annotations (pipe-separated CSV, Parquet or Feather) into a new SQLite database.
+
+    The rows are stored with all their columns (and their position in the file as row_id), the images and
+    categories in the order they first appear; the image names and categories of the rows are stored as
+    their IDs (image_idx and category_idx, see INTERNED_COLUMNS). Decisions are taken from existing files
+    of approved / discarded annotations (approvals take precedence); rows of images that are not part of
+    the annotations are not imported.
+
+    Args:
+        path_annotations (str): Path to the annotation file.
+        path_database (str): Path to the database, which must not exist yet.
+        path_approved (str, optional): File of approved annotations. Defaults to "".
+        path_discarded (str, optional): File of discarded annotations. Defaults to "".
+        chunk_size (int, optional): Number of rows inserted at once. Defaults to 1 << 18.
+
+    Returns:
+        int: The number of imported rows.
+    """
+    if os.path.exists(path_database):
+        raise FileExistsError(f"The database '{path_database}' already exists!")
+
+    connection = connect(path_database)
+    connection.execute("PRAGMA journal_mode=WAL")
+    connection.executescript(SCHEMA)
+    images = {}
+    categories = {}
+    n_rows = 0
+    try:
+        for chunk in annotation_chunks(path_annotations, chunk_size):
+            if n_rows == 0:
+                columns = ", ".join(
+                    '"{}" {}'.format(*INTERNED_COLUMNS.get(column, (column, sql_type(dtype)))) for column, dtype in chunk.dtypes.items()
+                )
+                connection.execute(f"CREATE TABLE annotations (row_id INTEGER PRIMARY KEY, {columns})")
+                insert = f"INSERT INTO annotations VALUES ({', '.join(['?'] * (len(chunk.columns) + 1))})"
+            new_images = [name for name in pd.unique(chunk["image_name"]) if name not in images]
+            new_categories = [name for name in pd.unique(chunk["category"].dropna()) if name not in categories]
+            images.update(zip(new_images, range(len(images), len(images) + len(new_images))))
+            categories.update(zip(new_categories, range(len(categories), len(categories) + len(new_categories))))
+            chunk = chunk.assign(
+                image_name=chunk["image_name"].map(images),
+                category=chunk["category"].map(categories).astype("Int64")
+            )
+            rows = chunk.astype(object).where(chunk.notna(), None)
+            with connection:
+                connection.executemany("INSERT INTO images (image_idx, image_name) VALUES (?, ?)", ((images[name], name) for name in new_images))
+                connection.executemany("INSERT INTO categories VALUES (?, ?)", ((categories[name], name) for name in new_categories))
+                connection.executemany(insert, ((n_rows + idx, *row) for idx, row in enumerate(rows.itertuples(index=False))))
+            n_rows += len(chunk)
+        connection.executescript(INDEXES)
+
+        if path_discarded != "" and os.path.exists(path_discarded):
+            import_decisions(connection, path_discarded, review_dataset.DECISION_DISCARDED)
+        if path_approved != "" and os.path.exists(path_approved):
+            import_decisions(connection, path_approved, review_dataset.DECISION_APPROVED)
+    finally:
+        connection.close()
+    return n_rows
+
+
+def export_annotations(path_database, path, decision=None):
+    """Writes the annotations of a database (all or only those of the images with the given decision)
+    as pipe-separated CSV, Parquet or Feather file, in the order they were imported.
+    """
+    dataset = DatabaseReviewDataset(path_database)
+    try:
+        df = dataset.all_annotations() if decision is None else dataset.decided_annotations(decision)
+    finally:
+        dataset.close()
+    review_dataset.write_file(df, path)
+    return len(df)
+
+
+class DatabaseReviewDataset(review_dataset.ReviewDataset):
+    """Annotations and review decisions kept in a SQLite database (see import_annotations).
+
+    Only the categories are read when opening the database; images, their annotations and the next
+    image without decision are looked up through indexes on the image / category IDs, and the names
+    are only joined in for display and export. Decisions are single-row transactions
+    on the database, which is shared by all sessions and processes (no journal is needed). The
+    database holds the decisions; the files of approved / discarded annotations are exported from it.
+    """
+
+    def __init__(self, path_database, path_approved="", path_discarded=""):
+        self.path_annotations = path_database
+        self.path_approved = path_approved
+        self.path_discarded = path_discarded
+        self.autosave = True
+        self.journal = None
+        self.version = 0
+        self._lock = threading.RLock()
+        self._local = threading.local()
+
+        connection = self.connection()
+        self.columns = file_columns(connection)
+        self.categories = [row[0] for row in connection.execute("SELECT category FROM categories ORDER BY category_idx")]
+        self.n_images = connection.execute("SELECT COUNT(*) FROM images").fetchone()[0]
+        self.queues = {}
+        self.load_decisions()
+
+    def connection(self):
+        """Returns the connection of the calling thread (sqlite3 connections cannot be shared between threads)."""
+        connection = getattr(self._local, "connection", None)
+        if connection is None:
+            connection = self._local.connection = connect(self.path_annotations)
+        return connection
+
+    def __len__(self):
+        return self.n_images
+
+    def is_stale(self):
+        return False
+
+    def pick_up(self):
+        """New annotations are imported into the database (see import_annotations), nothing to pick up."""
+        return 0
+
+    def image_name(self, idx):
+        return self.connection().execute("SELECT image_name FROM images WHERE image_idx = ?", (int(idx),)).fetchone()[0]
+
+    def next_undecided(self, idx, queue_order="file"):
+        """Returns the position of the first image without decision after idx in the given review order (wrapping around), or None.
+
+        The file order is served by the index on the decisions. The other orders use a review queue that is
+        built on first use; as the decisions of other processes are only seen in the database, the images it
+        returns are checked there and dropped from it if they have been decided in the meantime.
+        """
+        connection = self.connection()
+        if queue_order == "file":
+            query = "SELECT image_idx FROM images WHERE decision = ? AND image_idx > ? ORDER BY image_idx LIMIT 1"
+            row = connection.execute(query, (review_dataset.DECISION_NONE, int(idx))).fetchone()
+            if row is None:
+                row = connection.execute(query, (review_dataset.DECISION_NONE, -1)).fetchone()
+            return None if row is None else row[0]
+
+        queue = self.queue(queue_order)
+        while True:
+            next_idx = queue.next(idx)
+            if next_idx is None:
+                return None
+            decision = connection.execute("SELECT decision FROM images WHERE image_idx = ?", (next_idx,)).fetchone()[0]
+            if decision == review_dataset.DECISION_NONE:
+                return next_idx
+            queue.update([next_idx], False)
+
+    def queue(self, queue_order):
+        with self._lock:
+            queue = self.queues.get(queue_order)
+            if queue is None:
+                queue = review_queue.ReviewQueue(self._queue_order(queue_order), self._undecided())
+                self.queues[queue_order] = queue
+            return queue
+
+    def _undecided(self):
+        undecided = np.ones(self.n_images, dtype=bool)
+        rows = self.connection().execute("SELECT image_idx FROM images WHERE decision != ?", (review_dataset.DECISION_NONE,)).fetchall()
+        undecided[[row[0] for row in rows]] = False
+        return undecided
+
+    def _queue_order(self, queue_order):
+        """Computes the review order from aggregates over the annotations of each image."""
+        connection = self.connection()
+        score_column = next((column for column in review_queue.SCORE_COLUMNS if column in self.columns), None)
+        scores = f'MIN(a."{score_column}"), MAX(a."{score_column}")' if score_column else "NULL, NULL"
+        stats = np.zeros((self.n_images, 4))
+        rows = connection.execute(
+            f"SELECT a.image_idx, COUNT(*), {scores}, MIN(c.n) FROM annotations a JOIN (SELECT category_idx, COUNT(*) AS n "
+            "FROM annotations GROUP BY category_idx) c ON c.category_idx = a.category_idx GROUP BY a.image_idx"
+        ).fetchall()
+        if rows:
+            stats[[row[0] for row in rows]] = np.array([row[1:] for row in rows], dtype=np.float64)
+        min_scores, max_scores = (stats[:, 1], stats[:, 2]) if score_column else (None, None)
+        return review_queue.priority_order(queue_order, stats[:, 0], min_scores, max_scores, stats[:, 3])
+
+    def category_values(self, category_idxs):
+        """Returns the categories of the given category IDs (None for rows without category) as categorical,
+        whose codes are the category IDs (see ReviewDataset.categories).
+        """
+        codes = pd.Series(category_idxs, dtype=np.float64).fillna(-1).to_numpy(np.int64)
+        return pd.Categorical.from_codes(codes, categories=self.categories)
+
+    def image_annotations(self, image_name):
+        columns = ", ".join(["category_idx", *annotation_store.UI_COLUMNS[2:]])
+        rows = self.connection().execute(
+            f"SELECT {columns} FROM annotations WHERE image_idx = (SELECT image_idx FROM images WHERE image_name = ?) ORDER BY row_id",
+            (image_name,)
+        ).fetchall()
+        annotations = pd.DataFrame.from_records(rows, columns=annotation_store.UI_COLUMNS[1:])
+        return annotations.assign(image_name=image_name, category=self.category_values(annotations["category"]))[annotation_store.UI_COLUMNS]
+
+    def review_annotations(self):
+        connection = self.connection()
+        columns = annotation_store.UI_COLUMNS[2:]
+        rows = connection.execute(
+            f"SELECT image_idx, category_idx, {', '.join(columns)} FROM annotations ORDER BY image_idx, row_id"
+        ).fetchall()
+        annotations = pd.DataFrame.from_records(rows, columns=["image_idx", "category_idx", *columns])
+        image_idxs = annotations["image_idx"].to_numpy(np.int64)
+        names = pd.Index([row[0] for row in connection.execute("SELECT image_name FROM images ORDER BY image_idx")], dtype=object)
+        annotations = pd.DataFrame({
+            "image_name": pd.Categorical.from_codes(image_idxs, categories=names),
+            "category": self.category_values(annotations["category_idx"]),
+            **{column: annotations[column].astype(annotation_store.UI_DTYPES[column]) for column in columns}
+        })
+        annotations, _, img_names, img_offsets, _ = review_dataset.build_image_index(annotations)
+        # The images are ordered by their IDs (only images with annotations are part of the index)
+        positions = pd.Index(np.unique(image_idxs))
+        decisions = np.zeros(len(img_names), dtype=np.int8)
+        rows = connection.execute("SELECT image_idx, decision FROM images WHERE decision != ?", (review_dataset.DECISION_NONE,)).fetchall()
+        if rows:
+            idxs = positions.get_indexer([row[0] for row in rows])
+            decisions[idxs[idxs >= 0]] = np.array([row[1] for row in rows], dtype=np.int8)[idxs >= 0]
+        return annotations, img_names, img_offsets, decisions
+
+    def image_segmentations(self, image_name):
+        if "segmentation" not in self.columns:
+            return None
+        rows = self.connection().execute(
+            "SELECT segmentation FROM annotations WHERE image_idx = (SELECT image_idx FROM images WHERE image_name = ?) ORDER BY row_id",
+            (image_name,)
+        ).fetchall()
+        return [row[0] for row in rows]
+
+    def decision(self, image_name):
+        row = self.connection().execute("SELECT decision FROM images WHERE image_name = ?", (image_name,)).fetchone()
+        return review_dataset.DECISION_NONE if row is None else row[0]
+
+    def image_decision(self, idx):
+        return self.connection().execute("SELECT decision FROM images WHERE image_idx = ?", (int(idx),)).fetchone()[0]
+
+    def decide_idxs(self, idxs, decision, session_id=""):
+        timestamp = time.time()
+        connection = self.connection()
+        with connection:
+            connection.executemany(
+                "UPDATE images SET decision = ?, session_id = ?, decided_at = ? WHERE image_idx = ?",
+                ((decision, session_id, timestamp, int(idx)) for idx in idxs)
+            )
+
+    def decide_many(self, image_names, decision, session_id=""):
+        """Records the same decision for several images in one transaction."""
+        timestamp = time.time()
+        connection = self.connection()
+        with connection:
+            connection.executemany(
+                "UPDATE images SET decision = ?, session_id = ?, decided_at = ? WHERE image_name = ?",
+                ((decision, session_id, timestamp, image_name) for image_name in image_names)
+            )
+
+    def load_decisions(self):
+        """Loads the rows of images that are not part of the database from the files of approved / discarded annotations."""
+        self.approved_other = self._other_annotations(self.path_approved)
+        self.discarded_other = self._other_annotations(self.path_discarded)
+
+    def _other_annotations(self, path, batch_size=500):
+        if path == "" or not os.path.exists(path):
+            return pd.DataFrame()
+        try:
+            image_names = annotation_store.read_annotations(path, columns=["image_name"])["image_name"]
+        except pd.errors.EmptyDataError:
+            return pd.DataFrame()
+        unique_names = list(image_names.unique())
+        known = set()
+        for start in range(0, len(unique_names), batch_size):
+            batch = unique_names[start:start + batch_size]
+            query = f"SELECT image_name FROM images WHERE image_name IN ({', '.join(['?'] * len(batch))})"
+            known.update(row[0] for row in self.connection().execute(query, batch))
+        unknown = ~image_names.isin(known)
+        if not unknown.any():
+            return pd.DataFrame()
+        return annotation_store.read_annotations(path).loc[unknown.values]
+
+    def refresh(self):
+        pass
+
+    def _query_annotations(self, where="", parameters=()):
+        # The image names and categories are only decoded here, for the files written
+        decoded = {"image_name": "i.image_name", "category": "c.category"}
+        columns = ", ".join(decoded.get(column, f'a."{column}"') for column in self.columns)
+        rows = self.connection().execute(
+            f"SELECT {columns} FROM annotations a JOIN images i ON i.image_idx = a.image_idx "
+            f"LEFT JOIN categories c ON c.category_idx = a.category_idx {where} ORDER BY a.image_idx, a.row_id",
+            parameters
+        ).fetchall()
+        return pd.DataFrame.from_records(rows, columns=self.columns)
+
+    def all_annotations(self):
+        return self._query_annotations()
+
+    def decided_annotations(self, decision):
+        return self._query_annotations("WHERE i.decision = ?", (decision,))
+
+    def close(self):
+        with self._lock:
+            if self.path_approved != "" or self.path_discarded != "":
+                self.save_progress()
+            connection = getattr(self._local, "connection", None)
+            if connection is not None:
+                connection.close()
+                self._local.connection = None
+
+
+if __name__ == "__main__":
+
+    # Parse and check the input arguments
+    parser = argparse.ArgumentParser(description="Imports annotations into / exports them from an SQLite annotation database.")
+    subparsers = parser.add_subparsers(dest="command", required=True)
+    parser_import = subparsers.add_parser("import", help="Import annotations (and the decisions of existing approved / discarded files).")
+    parser_import.add_argument("-i", "--input-file", dest="input_file", type=str, help="Input annotation file (CSV, Parquet or Feather).", required=True)
+    parser_import.add_argument("-o", "--output-database", dest="output_database", type=str, help="Output database. Defaults to " + \
+                                    "the name of the input file (with .sqlite extension).", required=False)
+    parser_export = subparsers.add_parser("export", help="Export the approved / discarded (or all) annotations.")
+    parser_export.add_argument("-i", "--input-database", dest="input_database", type=str, help="Input database.", required=True)
+    parser_export.add_argument("-o", "--output-file", dest="output_file", type=str, help="Output file for all annotations.", required=False)
+    for subparser in [parser_import, parser_export]:
+        subparser.add_argument("-a", "--approved-file", dest="approved_file", type=str, default="", help="File of approved annotations.")
+        subparser.add_argument("-d", "--discarded-file", dest="discarded_file", type=str, default="", help="File of discarded annotations.")
+    args = parser.parse_args()
+
+    if args.command == "import":
+        output_database = args.output_database or os.path.splitext(args.input_file)[0] + DATABASE_EXTENSIONS[0]
+        if not os.path.exists(args.input_file):
+            print(f"Input file '{args.input_file}' does not exist!")
+            exit()
+        if os.path.exists(output_database):
+            print(f"The database '{output_database}' already exists!")
+            exit()
+        start = time.perf_counter()
+        n_rows = import_annotations(args.input_file, output_database, args.approved_file, args.discarded_file)
+        print(f"Imported {n_rows} rows into '{output_database}' in {time.perf_counter() - start:.1f}s.")
+        exit()
+
+    if not os.path.exists(args.input_database):
+        print(f"Input database '{args.input_database}' does not exist!")
+        exit()
+    for path, decision in [
+        (args.output_file, None),
+        (args.approved_file, review_dataset.DECISION_APPROVED),
+        (args.discarded_file, review_dataset.DECISION_DISCARDED)
+    ]:
+        if path:
+            print(f"Wrote {export_annotations(args.input_database, path, decision)} rows to '{path}'.")
@@ -0,0 +1,322 @@
+import os
+
+from io import BytesIO
+
+import numpy as np
+import pandas as pd
+
+
+# File extensions and the formats they are read / written with (Parquet and Feather require pyarrow)
+FORMATS = {
+    ".csv": "csv",
+    ".parquet": "parquet",
+    ".pq": "parquet",
+    ".feather": "feather",
+    ".arrow": "feather"
+}
+
+# Columns needed for reviewing the annotations and the compact dtypes they are held in
+UI_COLUMNS = ["image_name", "category", "bbox_xmin", "bbox_ymin", "bbox_width", "bbox_height"]
+UI_DTYPES = {
+    "image_name": "category",
+    "category": "category",
+    "bbox_xmin": np.float32,
+    "bbox_ymin": np.float32,
+    "bbox_width": np.float32,
+    "bbox_height": np.float32
+}
+
+# String columns interned into dense integer IDs when read: the codes of the categoricals they are held in
+# number the values in the order in which they first appear (see Interner)
+INTERNED_COLUMNS = ["image_name", "category"]
+READ_DTYPES = {**UI_DTYPES, **{column: object for column in INTERNED_COLUMNS}}
+
+# Number of CSV rows parsed at once by read_ui_annotations
+READ_CHUNK_ROWS = 1 << 18
+
+
+def file_format(path):
+    """Returns the format of an annotation file given by its extension (defaulting to the pipe-separated CSV)."""
+    return FORMATS.get(os.path.splitext(path)[1].lower(), "csv")
+
+
+def is_columnar(path):
+    return file_format(path) != "csv"
+
+
+def read_table(path, columns=None):
+    """Memory-maps a Parquet / Feather file and reads the given columns as pyarrow.Table."""
+    if file_format(path) == "parquet":
+        import pyarrow.parquet as pq
+        return pq.read_table(path, columns=columns, memory_map=True)
+    import pyarrow.feather as feather
+    return feather.read_table(path, columns=columns, memory_map=True)
+
+
+def read_columns(path):
+    """Returns the column names of an annotation file without reading its rows."""
+    fmt = file_format(path)
+    if fmt == "csv":
+        with open(path, "r") as file:
+            return file.readline().rstrip("\r\n").split("|")
+    if fmt == "parquet":
+        import pyarrow.parquet as pq
+        return pq.read_schema(path, memory_map=True).names
+    import pyarrow as pa
+    with pa.memory_map(path) as source:
+        return pa.ipc.open_file(source).schema.names
+
+
+def read_annotations(path, columns=None):
+    """Reads annotations from a pipe-separated CSV, Parquet or Feather file.
+
+    Args:
+        path (str): Path to the annotation file; the format is detected by its extension.
+        columns (list, optional): Only read these columns. Defaults to all columns.
+
+    Returns:
+        pandas.DataFrame: The annotations.
+    """
+    if file_format(path) == "csv":
+        return pd.read_csv(path, sep="|", usecols=columns)
+    return read_table(path, columns).to_pandas()
+
+
+class Interner:
+    """Assigns dense integer IDs to strings in the order in which they first appear.
+
+    The values are added in batches (e.g. the chunks of a CSV file), each factorized on its own; the unique
+    values of all batches are factorized once more at the end, so that no per-value work is done in Python.
+    """
+
+    def __init__(self):
+        self.codes = []
+        self.uniques = []
+
+    def add(self, values):
+        codes, uniques = pd.factorize(values)
+        self.codes.append(codes.astype(np.int32))
+        self.uniques.append(np.asarray(uniques, dtype=object))
+
+    def categorical(self):
+        """Returns all added values as categorical whose codes are their IDs (-1 for missing values)."""
+        ids, names = pd.factorize(np.concatenate(self.uniques)) if self.uniques else (np.zeros(0, dtype=np.int64), [])
+        bounds = np.cumsum([0] + [len(uniques) for uniques in self.uniques])
+        codes = [np.append(ids[start:end], -1).astype(np.int32)[codes] for start, end, codes in zip(bounds[:-1], bounds[1:], self.codes)]
+        return pd.Categorical.from_codes(np.concatenate(codes) if codes else np.zeros(0, dtype=np.int32),
+                                         categories=pd.Index(names, dtype=object))
+
+
+def _read_ui_csv(source):
+    """Reads the UI_COLUMNS of a CSV file (path or file object) in chunks, interning the INTERNED_COLUMNS."""
+    interners = {column: Interner() for column in INTERNED_COLUMNS}
+    chunks = []
+    for chunk in pd.read_csv(source, sep="|", usecols=UI_COLUMNS, dtype=READ_DTYPES, chunksize=READ_CHUNK_ROWS):
+        for column, interner in interners.items():
+            interner.add(chunk[column].to_numpy())
+        chunks.append(chunk.drop(columns=INTERNED_COLUMNS))
+    if not chunks:
+        return pd.DataFrame({column: pd.Series(dtype=dtype) for column, dtype in UI_DTYPES.items()})
+    df = pd.concat(chunks, ignore_index=True)
+    return df.assign(**{column: interner.categorical() for column, interner in interners.items()})[UI_COLUMNS]
+
+
+def read_ui_annotations(path):
+    """Reads only the columns needed for reviewing (UI_COLUMNS) with compact dtypes (UI_DTYPES).
+
+    The image names and categories are interned while reading: their categories are ordered by first
+    appearance, so that the codes are dense IDs of the images and categories in the order of the file.
+    """
+    if file_format(path) == "csv":
+        return _read_ui_csv(path)
+    import pyarrow.compute as pc
+    table = read_table(path, UI_COLUMNS)
+    for column in INTERNED_COLUMNS:
+        # Dictionary encoding numbers the values by first appearance, in one dictionary for all chunks
+        table = table.set_column(table.schema.get_field_index(column), column, pc.dictionary_encode(table.column(column)))
+    return table.to_pandas().astype(UI_DTYPES)[UI_COLUMNS]
+
+
+def read_interned(path, column="image_name"):
+    """Reads one column of strings of an annotation file as categorical interned like by read_ui_annotations."""
+    if file_format(path) == "csv":
+        interner = Interner()
+        for chunk in pd.read_csv(path, sep="|", usecols=[column], dtype={column: object}, chunksize=READ_CHUNK_ROWS):
+            interner.add(chunk[column].to_numpy())
+        return pd.Series(interner.categorical(), name=column)
+    import pyarrow.compute as pc
+    return pc.dictionary_encode(read_table(path, [column]).column(column)).to_pandas().astype("category").rename(column)
+
+
+def parse_ui_rows(header, data):
+    """Parses CSV rows (bytes without header, e.g. from AnnotationSource.read_appended) like read_ui_annotations."""
+    return _read_ui_csv(BytesIO(header + data))
+
+
+def csv_row_offsets(path, chunk_size=64 << 20):
+    """Returns the byte offsets at which the data rows of a CSV file start.
+
+    Assumes that no field contains a line break (which holds for the files written by this application).
+
+    Returns:
+        tuple: The header line (bytes) and the row offsets (numpy.ndarray), including the file size as last offset.
+    """
+    file_size = os.path.getsize(path)
+    newlines = []
+    with open(path, "rb") as file:
+        header = file.readline()
+        position = len(header)
+        while True:
+            chunk = file.read(chunk_size)
+            if not chunk:
+                break
+            newlines.append(np.flatnonzero(np.frombuffer(chunk, dtype=np.uint8) == ord("\n")) + position + 1)
+            position += len(chunk)
+    offsets = np.concatenate([[len(header)], *newlines]).astype(np.int64)
+    # A trailing line break does not start another row
+    offsets = offsets[offsets < file_size]
+    return header, np.append(offsets, file_size)
+
+
+def common_dtypes(dtypes, other):
+    """Combines the dtypes of the columns of two parts of a CSV file into those pandas infers for both read at once."""
+    if dtypes is None:
+        return dict(other)
+    combined = {}
+    for column, dtype in dtypes.items():
+        other_dtype = other.get(column, dtype)
+        if dtype == other_dtype:
+            combined[column] = dtype
+        elif pd.api.types.is_bool_dtype(dtype) or pd.api.types.is_bool_dtype(other_dtype):
+            # Booleans mixed with missing values or numbers are read as objects
+            combined[column] = np.dtype(object)
+        else:
+            combined[column] = np.result_type(dtype, other_dtype)
+    return combined
+
+
+class AnnotationSource:
+    """Random access to the complete rows of an annotation file by their position in the file.
+
+    Parquet / Feather files are memory-mapped; for CSV files, a byte-offset index of the rows is built
+    so that single rows can be read without parsing the rest of the file. Rows appended to a CSV file
+    can be read and indexed incrementally (see read_appended). Rows read from a CSV file get the dtypes
+    of the whole file (see dtypes), not those inferred from the rows read.
+    """
+
+    # Number of bytes before the end of the indexed rows compared to tell appending from rewriting
+    TAIL_SIZE = 4096
+
+    def __init__(self, path, n_rows=None):
+        self.path = path
+        self.format = file_format(path)
+        self.header = None
+        self.offsets = None
+        self._dtypes = None
+        if self.format == "csv":
+            self.header, self.offsets = csv_row_offsets(path)
+            # End of the indexed rows and the bytes before it
+            self.size = int(self.offsets[-1])
+            with open(path, "rb") as file:
+                file.seek(max(len(self.header), self.size - self.TAIL_SIZE))
+                self.tail = file.read(self.size - file.tell())
+            # Fall back to scanning the file if the rows could not be indexed (e.g. line breaks in fields)
+            if n_rows is not None and len(self.offsets) - 1 != n_rows:
+                self.offsets = None
+
+    def read_appended(self):
+        """Reads the complete rows appended to the CSV file since it was indexed and indexes them. An
+        incomplete last row (still being written) is left for the next call.
+
+        Returns:
+            bytes: The appended rows (without header, empty if there are none), or None if the file has been
+                rewritten rather than appended to (or is no CSV file) and has to be read again as a whole.
+        """
+        if self.format != "csv" or (self.tail and not self.tail.endswith(b"\n")):
+            return None
+        with open(self.path, "rb") as file:
+            if file.readline() != self.header:
+                return None
+            file.seek(self.size - len(self.tail))
+            if file.read(len(self.tail)) != self.tail:
+                return None
+            data = file.read()
+        data = data[:data.rfind(b"\n") + 1]
+        if not data:
+            return b""
+        row_ends = np.flatnonzero(np.frombuffer(data, dtype=np.uint8) == ord("\n")).astype(np.int64) + self.size + 1
+        if self.offsets is not None:
+            self.offsets = np.concatenate([self.offsets, row_ends])
+        if self._dtypes is not None:
+            self._dtypes = common_dtypes(self._dtypes, pd.read_csv(BytesIO(self.header + data), sep="|").dtypes.to_dict())
+        self.size += len(data)
+        self.tail = (self.tail + data)[-self.TAIL_SIZE:]
+        return data
+
+    def dtypes(self):
+        """Returns the dtypes of the columns of the CSV file as pandas infers them when reading the whole file,
+        inferred with one pass over the file on first use (and updated with the appended rows, see read_appended).
+        """
+        if self._dtypes is None:
+            dtypes = None
+            for chunk in pd.read_csv(self.path, sep="|", chunksize=READ_CHUNK_ROWS):
+                dtypes = common_dtypes(dtypes, chunk.dtypes.to_dict())
+            self._dtypes = dtypes if dtypes is not None else pd.read_csv(self.path, sep="|", nrows=0).dtypes.to_dict()
+        return self._dtypes
+
+    def rows(self, positions, columns=None):
+        """Reads the rows at the given positions (in that order).
+
+        Args:
+            positions (numpy.ndarray): Positions of the rows in the file (0 is the first row after the header).
+            columns (list, optional): Only return these columns. Defaults to all columns.
+
+        Returns:
+            pandas.DataFrame: The rows.
+        """
+        positions = np.asarray(positions, dtype=np.int64)
+        if self.format != "csv":
+            return read_rows(self.path, positions, columns)
+        if self.offsets is None or len(positions) > (len(self.offsets) - 1) // 8:
+            return self._scan(positions, columns)
+        lines = [None] * len(positions)
+        with open(self.path, "rb") as file:
+            for idx in np.argsort(positions, kind="stable"):
+                start, end = self.offsets[positions[idx]], self.offsets[positions[idx] + 1]
+                file.seek(start)
+                line = file.read(end - start)
+                lines[idx] = line if line.endswith(b"\n") else line + b"\n"
+        return pd.read_csv(BytesIO(self.header + b"".join(lines)), sep="|", usecols=columns, dtype=self.dtypes())
+
+    def _scan(self, positions, columns=None, chunk_size=1 << 18):
+        """Reads the rows at the given positions with one sequential pass over the file."""
+        wanted = np.unique(positions)
+        chunks = []
+        for chunk_idx, chunk in enumerate(pd.read_csv(self.path, sep="|", usecols=columns, dtype=self.dtypes(), chunksize=chunk_size)):
+            start = chunk_idx * chunk_size
+            selected = wanted[(wanted >= start) & (wanted < start + len(chunk))]
+            chunks.append(chunk.iloc[selected - start])
+        df = pd.concat(chunks) if chunks else pd.read_csv(self.path, sep="|", usecols=columns, dtype=self.dtypes(), nrows=0)
+        return df.loc[positions].reset_index(drop=True) if len(positions) else df
+
+
+def read_rows(path, positions, columns=None):
+    """Reads the rows at the given positions (all columns by default) of a Parquet / Feather file."""
+    return read_table(path, columns).take(positions).to_pandas()
+
+
+def write_annotations(df, path, fmt=None):
+    """Writes annotations as pipe-separated CSV, Parquet or Feather file.
+
+    Args:
+        df (pandas.DataFrame): The annotations.
+        path (str): Path to the annotation file.
+        fmt (str, optional): "csv", "parquet" or "feather". Defaults to the format given by the extension.
+    """
+    fmt = fmt or file_format(path)
+    if fmt == "parquet":
+        df.to_parquet(path, index=False)
+    elif fmt == "feather":
+        df.reset_index(drop=True).to_feather(path)
+    else:
+        df.to_csv(path, sep="|", index=False)
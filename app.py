@@ -11,9 +11,10 @@ __author__      = "David Massanés, University Osnabrück"
 __copyright__   = "Copyright 2023, University Osnabrück"
 __credits__     = ["David Massanés", "Arnab Ghosh Chowdhury", "Martin Atzmüller"]
 
-from dash import Dash, html, dcc, Output, Input, State, callback_context, no_update
+from dash import Dash, html, dcc, Output, Input, State, ALL, Patch, ClientsideFunction, callback_context, no_update
 from dash.exceptions import PreventUpdate
 import dash_bootstrap_components as dbc
+from flask import Response, abort, request, send_file
 
 from dash.dash_table import DataTable
 from dash.dash_table.Format import Format, Scheme
@@ -21,15 +22,43 @@ from dash.dash_table.Format import Format, Scheme
 import plotly.graph_objs as go
 import plotly.express as px
 
-import cv2
 from matplotlib.colors import to_rgba
 
 import pandas as pd
+import numpy as np
 
 import os
+import re
+import sys
+import hashlib
+import urllib.parse
+import atexit
+import itertools
+import uuid
+import signal
+import threading
 import traceback
+import weakref
 
 import convert_to_csv
+import conversion_jobs
+from image_cache import ImageCache, load_image
+import image_render
+import precompute_images
+import segmentation
+import box_matching
+import metrics
+import review_queue
+import review_dataset
+import annotation_store
+import annotation_db
+import iteration_diff
+
+try:
+    from PIL import Image
+except ImportError:
+    # Without Pillow, the size of an image is only known after decoding it
+    Image = None
 
 
 # Change these values to set the default paths shown in the "Configurations" card
@@ -37,6 +66,9 @@ PATH_IMAGES         = "demo/ssod/images"
 PATH_ANNOTATIONS    = "demo/ssod/model/predictions_0.csv"
 PATH_APPROVED       = "demo/ssod/model/predictions_0_approved.csv"
 PATH_DISCARDED      = "demo/ssod/model/predictions_0_discarded.csv"
+# Predictions of the previous iteration (e.g. predictions_0.csv when reviewing predictions_1.csv); if given,
+# the changes of the boxes since then are drawn and the review can be restricted to the changed pages
+PATH_PREVIOUS       = ""
 
 
 # Constants & important variables
@@ -53,20 +85,101 @@ TABLE_COLS_SPECS = [
     dict(id="bbox_height", name="bbox_height", type="numeric", format=FIXED_FORMAT)
 ]
 
+# With autosave, every decision is appended to a journal next to PATH_ANNOTATIONS; the files
+# PATH_APPROVED / PATH_DISCARDED are compacted from it when saving, starting and shutting down
 AUTOSAVE = True
 
-INITIALIZED = False
-
-CRT_IMG_IDX     = 0
-CRT_IMG_NAME    = ""
-
-CATEGORIES = []
-ANNOTATION_COLORS = []
-
-# Dataframes
-ANNOTATIONS = pd.DataFrame()
-APPROVED    = pd.DataFrame()
-DISCARDED   = pd.DataFrame()
+# Memory cap of the decoded image cache and number of images prefetched in both directions
+IMAGE_CACHE_MAX_BYTES   = 1 << 30
+IMAGE_PREFETCH          = 2
+IMAGE_CACHE             = ImageCache(max_bytes=IMAGE_CACHE_MAX_BYTES)
+
+# "layout_image" ships the pages as compressed images with RENDER_SIZE pixels on the longer side
+# (a higher resolution crop is loaded when zooming in); "imshow" embeds the raw pixels in the figure
+RENDER_MODE     = "layout_image"
+RENDER_SIZE     = 1024
+RENDER_FORMAT   = "jpg"
+RENDER_QUALITY  = 85
+
+# "url" references the pages in the figures by the URL of the image route (IMAGE_ROUTE), so that the browser
+# caches them and pages seen before cost neither a download nor any decoding on the server; "data_uri" embeds
+# the pages in every figure. The URLs change with the files, so the browser may reuse a page for IMAGE_MAX_AGE seconds
+IMAGE_DELIVERY  = "url"
+IMAGE_ROUTE     = "/images/"
+IMAGE_MAX_AGE   = 365 * 24 * 3600
+
+# Image directories served by the image route, by an opaque key: PATH_IMAGES and the image directories of the
+# sessions started on this server. The keys are also stored in IMAGE_ROOTS_DIR (one file per key), so that
+# every server process can serve the images of a session started through another one
+IMAGE_ROOTS_DIR = ".vizaod_image_roots"
+IMAGE_ROOTS     = {}
+
+# Directory of the images precomputed by precompute_images.py (previews, thumbnails and pyramid levels used
+# for zooming), which are used when present and up to date; None looks for it inside PATH_IMAGES
+IMAGE_ARTIFACTS_DIR = None
+
+# Draw the segmentation polygons of the annotations below their boxes. The polygons are simplified to about
+# one vertex per pixel of a SEGMENTATION_LOD_SIZE pixels wide view of the visible region (0 draws all vertices)
+SEGMENTATION_OVERLAY    = False
+SEGMENTATION_LOD_SIZE   = 1024
+
+# Styles of the changes since the previous iteration: halos below the added / moved boxes and the outlines
+# of the previous positions of the moved boxes and of the removed boxes above them
+DIFF_STYLES = {
+    "added": dict(color="rgba(40, 167, 69, 0.45)", width=10),
+    "moved": dict(color="rgba(253, 126, 20, 0.45)", width=10),
+    "moved (previous)": dict(color="rgb(253, 126, 20)", width=2, dash="dot"),
+    "removed": dict(color="rgb(220, 53, 69)", width=2, dash="dash")
+}
+
+# "server" renders every image on "Previous" / "Next" clicks; "clientside" keeps a window of NAVIGATION_BEHIND
+# previous and NAVIGATION_AHEAD upcoming images in the browser and navigates within it without contacting
+# the server, which only records decisions and refills the window (when less than NAVIGATION_MARGIN are left)
+NAVIGATION_MODE     = "server"
+NAVIGATION_BEHIND   = 2
+NAVIGATION_AHEAD    = 8
+NAVIGATION_MARGIN   = 3
+NAVIGATION_BUTTONS  = (["button_previous", "button_next"] if NAVIGATION_MODE == "server" else []) + \
+                      ["button_next_undecided", "button_approve", "button_discard"]
+
+# Print a JSON line with the duration of each phase and the response size of every instrumented callback
+# request (the same data is collected for the Prometheus metrics at /metrics)
+METRICS_LOG = False
+
+# Default order in which "Next unreviewed" and the decisions move through the images without decision
+# (see review_queue.QUEUE_ORDERS), e.g. "lowest_score" to review the least confident predictions first
+REVIEW_QUEUE_ORDER = "file"
+
+# Rows appended to the annotation file are picked up while reviewing (checked every WATCH_INTERVAL_MS). With
+# WATCH_PREDICTIONS, the predictions of later iterations written to the model directory ("predictions_M" for
+# the annotations "predictions_N", M > N) are added to the session as well; their decisions are stored in
+# PATH_APPROVED / PATH_DISCARDED of the session
+WATCH_PREDICTIONS   = False
+WATCH_INTERVAL_MS   = 5000
+
+# Number of images per page of the batch review grid and size of their thumbnails
+GRID_PAGE_SIZE      = 24
+GRID_THUMBNAIL_SIZE = 256
+
+# The state of each review session (paths and current image) lives in the browser ("store_session"),
+# so that every request can be served by any thread or process. The annotations are loaded once per
+# process and shared by all sessions reviewing them into the same files of approved / discarded annotations
+# (by (PATH_ANNOTATIONS, PATH_APPROVED, PATH_DISCARDED)); their decisions are shared through the journal.
+# DATASETS_LOCK only guards the lookup, every entry is loaded under its own lock (see get_dataset)
+DATASETS        = {}
+DATASETS_LOCK   = threading.Lock()
+
+# Changes of the datasets since their previous iteration by (PATH_ANNOTATIONS, PATH_APPROVED, PATH_DISCARDED, PATH_PREVIOUS),
+# computed once per process
+DIFFS       = {}
+DIFFS_LOCK  = threading.Lock()
+
+# Conversions run as background jobs in CONVERSION_WORKERS worker processes per server process. The jobs
+# (state and progress) are stored on disk in CONVERSION_JOBS_DIR, so that every server process can show them
+CONVERSION_JOBS_DIR     = ".vizaod_jobs"
+CONVERSION_WORKERS      = 2
+CONVERSION_POLL_MS      = 1000
+CONVERSION_JOBS         = conversion_jobs.JobRunner(conversion_jobs.JobStore(CONVERSION_JOBS_DIR), CONVERSION_WORKERS)
 
 
 # ===============================================================================================================================================
@@ -79,35 +192,46 @@ def blank_figure():
     figure.update_yaxes(showgrid=False, showticklabels=False, zeroline=False)
     return figure
 
-def image_figure(image_name):
-    global PATH_IMAGES, ANNOTATIONS, ANNOTATION_COLORS
-
+@metrics.span("figure")
+def image_figure(dataset, path_images, image_name, diff=None):
     if not image_name:
         return blank_figure()
 
-    image_path = os.path.join(PATH_IMAGES, image_name)
+    image_path = os.path.join(path_images, image_name)
 
     if not os.path.exists(image_path):
         print(f"Image '{image_path}' does not exist!")
         return blank_figure()
 
-    img = cv2.imread(image_path)
-    img = cv2.cvtColor(img, cv2.COLOR_BGR2RGB)
-    fig = px.imshow(img)
-
-    anns = [(row["bbox_xmin"], row["bbox_ymin"], row["bbox_width"], row["bbox_height"], row["category"]) \
-                for _, row in ANNOTATIONS.loc[ANNOTATIONS["image_name"] == image_name].iterrows()]
-
-    for ann in anns:
-        color = ANNOTATION_COLORS[ann[4]]
-        fig.add_shape(
-            type="rect",
-            x0=ann[0],
-            y0=ann[1],
-            x1=ann[2] + ann[0],
-            y1=ann[3] + ann[1],
-            line=dict(color=color, width=3)
-        )
+    if RENDER_MODE == "layout_image":
+        with metrics.span("image"):
+            preview = page_preview(path_images, image_name)
+        if preview is None:
+            print(f"Image '{image_path}' could not be read!")
+            return blank_figure()
+        fig = go.Figure(go.Scatter(x=[0, preview.width], y=[0, preview.height], mode="markers", marker_opacity=0, hoverinfo="skip"))
+        fig.add_layout_image(preview.layout_image())
+        # Placeholder for the high resolution crop shown when zooming in
+        fig.add_layout_image(visible=False)
+        fig.update_xaxes(range=[0, preview.width], showgrid=False, zeroline=False, constrain="domain")
+        fig.update_yaxes(range=[preview.height, 0], showgrid=False, zeroline=False, constrain="domain", scaleanchor="x")
+    else:
+        with metrics.span("image"):
+            img = IMAGE_CACHE.get(image_path)
+        if img is None:
+            print(f"Image '{image_path}' could not be read!")
+            return blank_figure()
+        fig = px.imshow(img)
+
+    if SEGMENTATION_OVERLAY:
+        fig.add_traces(polygon_traces(dataset, path_images, image_name))
+    anns = dataset.image_annotations(image_name)
+    below, above = diff_traces(diff, anns, image_name) if diff is not None else ([], [])
+    fig.add_traces(below)
+    fig.add_traces(box_traces(anns, dataset.categories))
+    fig.add_traces(above)
+    if below or above:
+        fig.update_layout(legend=dict(x=1, xanchor="right", y=1, bgcolor="rgba(255, 255, 255, 0.7)"))
 
     fig.update_layout(
         margin=dict(l=10, r=10, t=10, b=10),
@@ -115,530 +239,1592 @@ def image_figure(image_name):
     
     return fig
 
-def check_status(image_name):
-    global APPROVED, DISCARDED
-    if image_name in APPROVED["image_name"].values or "approved" in PATH_ANNOTATIONS:
-        return ["Approved", "success"]
-    elif image_name in DISCARDED["image_name"].values or "discarded" in PATH_ANNOTATIONS:
-        return ["Discarded", "danger"]
-    return ["Not analysed", "secondary"]
+def box_paths(boxes):
+    """Returns the outlines of (x0, y0, x1, y1) boxes as rows of corners in drawing order, the last column (NaN)
+    separating the boxes when the rows are concatenated.
+    """
+    x0, y0, x1, y1 = boxes.T
+    gap = np.full(len(boxes), np.nan)
+    return np.column_stack([x0, x1, x1, x0, x0, gap]), np.column_stack([y0, y0, y1, y1, y0, gap])
+
+def box_traces(anns, categories):
+    """Returns the boxes of the given annotations as one line trace per category.
+
+    Each trace draws the outlines of all boxes of its category as closed paths separated by gaps,
+    which is much cheaper to build and to render than one layout shape per box. The boxes are grouped
+    by category ID (the codes of the category column, indexing categories and COLORS).
+    """
+    xs, ys = box_paths(box_matching.box_corners(anns))
+
+    category_ids = anns["category"].cat.codes.to_numpy()
+    traces = []
+    for category_id in pd.unique(category_ids):
+        mask = category_ids == category_id
+        traces.append(go.Scatter(
+            x=xs[mask].ravel(),
+            y=ys[mask].ravel(),
+            mode="lines",
+            line=dict(color=COLORS[category_id] if category_id >= 0 else "gray", width=3),
+            name=str(categories[category_id]) if category_id >= 0 else "nan",
+            hoverinfo="name",
+            showlegend=False
+        ))
+    return traces
+
+def diff_traces(diff, anns, image_name):
+    """Returns the changes of an image since the previous iteration (see iteration_diff) as line traces.
+
+    Returns:
+        tuple: The traces to draw below the boxes (halos of the added / moved boxes) and above them (the previous
+            positions of the moved boxes and the removed boxes).
+    """
+    changes = diff.image_changes(image_name)
+    if changes is None:
+        return [], []
+    status, previous_boxes, previous_status = changes
+    boxes = box_matching.box_corners(anns)
+    layers = [
+        ("added", boxes[status == iteration_diff.ADDED], False),
+        ("moved", boxes[status == iteration_diff.MOVED], False),
+        ("moved (previous)", previous_boxes[previous_status == iteration_diff.MOVED], True),
+        ("removed", previous_boxes[previous_status == iteration_diff.REMOVED], True)
+    ]
+    below, above = [], []
+    for name, layer_boxes, is_above in layers:
+        if len(layer_boxes) == 0:
+            continue
+        xs, ys = box_paths(layer_boxes)
+        trace = go.Scatter(x=xs.ravel(), y=ys.ravel(), mode="lines", line=DIFF_STYLES[name], name=name, hoverinfo="name")
+        (above if is_above else below).append(trace)
+    return below, above
+
+def image_polygons(dataset, path_images, image_name):
+    """Returns the parsed segmentation polygons of an image (cached like the images), or None if there are none."""
+    def load_polygons(image_path):
+        segmentations = dataset.image_segmentations(image_name)
+        if segmentations is None:
+            return None
+        try:
+            return segmentation.parse_polygons(segmentations, dataset.image_annotations(image_name)["category"].cat.codes.to_numpy())
+        except ValueError:
+            print(f"The segmentations of image '{image_name}' could not be parsed!")
+            return None
+    image_path = os.path.join(path_images, image_name)
+    return IMAGE_CACHE.get(image_path, loader=load_polygons, tag=f"polygons|{dataset.path_annotations}|{getattr(dataset, 'mtime', 0)}")
+
+def polygon_traces(dataset, path_images, image_name, view=None):
+    """Returns the segmentation polygons of an image as one line trace per category, simplified for the given
+    (x0, y0, x1, y1) view (defaults to all polygons). The number of traces does not depend on the view.
+    """
+    polygons = image_polygons(dataset, path_images, image_name)
+    if polygons is None or len(polygons) == 0:
+        return []
+    extent = polygons.extent() if view is None else max(view[2] - view[0], view[3] - view[1])
+    tolerance = extent / SEGMENTATION_LOD_SIZE if SEGMENTATION_LOD_SIZE else 0.0
+    traces = []
+    for category_id in pd.unique(polygons.categories):
+        xs, ys = polygons.paths(polygons.categories == category_id, tolerance, view)
+        traces.append(go.Scatter(
+            x=xs,
+            y=ys,
+            mode="lines",
+            line=dict(color=COLORS[category_id] if category_id >= 0 else "gray", width=1),
+            name=str(dataset.categories[category_id]) if category_id >= 0 else "nan",
+            hoverinfo="name",
+            showlegend=False
+        ))
+    return traces
+
+def polygon_zoom_patch(dataset, path_images, image_name, relayout_data, patch=None):
+    """Adds the polygons simplified for the zoomed region to a patch of the figure of the given image (see image_figure).
+
+    Returns:
+        dash.Patch: The patch or None if the zoom does not require any changes.
+    """
+    if relayout_data.get("xaxis.autorange") or relayout_data.get("yaxis.autorange"):
+        view = None
+    elif all(key in relayout_data for key in ("xaxis.range[0]", "xaxis.range[1]", "yaxis.range[0]", "yaxis.range[1]")):
+        x0, x1 = sorted([relayout_data["xaxis.range[0]"], relayout_data["xaxis.range[1]"]])
+        y0, y1 = sorted([relayout_data["yaxis.range[0]"], relayout_data["yaxis.range[1]"]])
+        view = (x0, y0, x1, y1)
+    else:
+        return patch
+
+    traces = polygon_traces(dataset, path_images, image_name, view)
+    if not traces:
+        return patch
+    patch = patch if patch is not None else Patch()
+    # The polygons directly follow the (invisible or image) trace spanning the page
+    for idx, trace in enumerate(traces, start=1):
+        patch["data"][idx]["x"] = trace.x
+        patch["data"][idx]["y"] = trace.y
+    return patch
+
+def image_artifacts(path_images, image_path):
+    """Returns the metadata of the precomputed images of an image (see precompute_images.py) or None if there are none up to date."""
+    cache_dir = IMAGE_ARTIFACTS_DIR or precompute_images.default_cache_dir(path_images)
+    loader = lambda path: precompute_images.read_artifacts(cache_dir, path_images, path)
+    return IMAGE_CACHE.get(image_path, loader=loader, tag="artifacts|" + cache_dir)
+
+def image_size(path_images, image_path):
+    """Returns the (width, height) of an image from its precomputed metadata or its header, without decoding it
+    (or None if it cannot be read).
+    """
+    artifacts = image_artifacts(path_images, image_path)
+    if artifacts is not None:
+        return artifacts["width"], artifacts["height"]
+    return IMAGE_CACHE.get(image_path, loader=read_image_size, tag="size")
+
+def read_image_size(image_path):
+    if Image is None:
+        img = IMAGE_CACHE.get(image_path)
+        return None if img is None else (img.shape[1], img.shape[0])
+    try:
+        with Image.open(image_path) as img:
+            width, height = img.size
+            # Like OpenCV, which decodes the images, apply the EXIF orientation
+            if img.getexif().get(0x0112) in (5, 6, 7, 8):
+                width, height = height, width
+    except OSError:
+        return None
+    return width, height
+
+def image_root_key(path_images):
+    """Returns the key of an image directory in the URLs of the image route."""
+    return hashlib.sha256(os.path.realpath(path_images).encode("utf-8")).hexdigest()[:16]
+
+def register_image_root(path_images):
+    """Allows the image route to serve the images of the given directory (see IMAGE_ROOTS)."""
+    global IMAGE_ROOTS, IMAGE_ROOTS_DIR
+    key = image_root_key(path_images)
+    root = os.path.realpath(path_images)
+    if IMAGE_ROOTS.get(key) == root:
+        return key
+    IMAGE_ROOTS[key] = root
+    os.makedirs(IMAGE_ROOTS_DIR, exist_ok=True)
+    tmp_path = os.path.join(IMAGE_ROOTS_DIR, f"{key}.{os.getpid()}.{threading.get_ident()}.tmp")
+    with open(tmp_path, "w") as file:
+        file.write(root)
+    os.replace(tmp_path, os.path.join(IMAGE_ROOTS_DIR, key))
+    return key
+
+def image_root(key):
+    """Returns the image directory registered under the given key (see register_image_root), or None."""
+    global IMAGE_ROOTS, IMAGE_ROOTS_DIR
+    if key == image_root_key(PATH_IMAGES):
+        return os.path.realpath(PATH_IMAGES)
+    root = IMAGE_ROOTS.get(key)
+    if root is None and re.fullmatch("[0-9a-f]{16}", key):
+        try:
+            with open(os.path.join(IMAGE_ROOTS_DIR, key), "r") as file:
+                root = IMAGE_ROOTS[key] = file.read()
+        except OSError:
+            return None
+    return root
+
+def image_url(path_images, image_name, size=0, fmt=""):
+    """Returns the URL of an image served by the image route (see serve_image), which changes with the image file."""
+    try:
+        version = os.stat(os.path.join(path_images, image_name)).st_mtime_ns
+    except OSError:
+        version = 0
+    query = urllib.parse.urlencode({"size": size, "format": fmt, "v": version})
+    path = f"{IMAGE_ROUTE}{image_root_key(path_images)}/{urllib.parse.quote(image_name)}"
+    return app.get_relative_path(path) + "?" + query
+
+def page_preview(path_images, image_name):
+    """Returns the preview of a page shown by image_figure: with IMAGE_DELIVERY "url", it references the image
+    route (only the size of the image is read); otherwise, it holds the compressed preview as data URI.
+    """
+    image_path = os.path.join(path_images, image_name)
+    if IMAGE_DELIVERY != "url":
+        return IMAGE_CACHE.get(image_path, loader=preview_loader(path_images), tag="preview")
+    size = image_size(path_images, image_path)
+    if size is None:
+        return None
+    width, height = size
+    source = image_url(path_images, image_name, RENDER_SIZE, RENDER_FORMAT)
+    return image_render.EncodedImage(source, 0, 0, width, height, max(1.0, max(width, height) / RENDER_SIZE))
+
+def served_image_loader(path_images, size, fmt):
+    """Returns a loader for the image cache that encodes an image as served by the image route: downscaled to size
+    pixels on its longer side (unless 0 or smaller) in the given format (or reads the precomputed preview).
+    """
+    def load_served_image(image_path):
+        artifacts = image_artifacts(path_images, image_path)
+        if artifacts is not None and artifacts["preview_size"] == size and artifacts["format"] == fmt:
+            with open(os.path.join(artifacts["dir"], artifacts["preview"]), "rb") as file:
+                return file.read()
+        img = IMAGE_CACHE.get(image_path)
+        if img is None:
+            return None
+        if size:
+            img, _ = image_render.resize_to(img, size)
+        return image_render.encode_bytes(img, fmt, RENDER_QUALITY)
+    return load_served_image
+
+def preview_loader(path_images):
+    """Returns a loader for the image cache that encodes the preview of an image (or reads the precomputed one)."""
+    def load_preview(image_path):
+        artifacts = image_artifacts(path_images, image_path)
+        if artifacts is not None and artifacts["preview_size"] == RENDER_SIZE and artifacts["format"] == RENDER_FORMAT:
+            with open(os.path.join(artifacts["dir"], artifacts["preview"]), "rb") as file:
+                source = image_render.data_uri(file.read(), RENDER_FORMAT)
+            return image_render.EncodedImage(source, 0, 0, artifacts["width"], artifacts["height"], artifacts["preview_scale"])
+        img = IMAGE_CACHE.get(image_path)
+        if img is None:
+            return None
+        return image_render.render_preview(img, RENDER_SIZE, RENDER_FORMAT, RENDER_QUALITY)
+    return load_preview
+
+def image_zoom_patch(path_images, image_name, relayout_data):
+    """Returns a patch for the figure of the given image that shows (or hides) a high resolution crop
+    of the zoomed region, or None if the zoom does not require any changes.
+    """
+    image_path = os.path.join(path_images, image_name)
+    preview = page_preview(path_images, image_name)
+    if preview is None:
+        return None
+
+    patch = Patch()
+    if relayout_data.get("xaxis.autorange") or relayout_data.get("yaxis.autorange"):
+        patch["layout"]["images"][1]["visible"] = False
+        return patch
+
+    x0 = relayout_data.get("xaxis.range[0]", 0)
+    x1 = relayout_data.get("xaxis.range[1]", preview.width)
+    y0 = relayout_data.get("yaxis.range[0]", preview.height)
+    y1 = relayout_data.get("yaxis.range[1]", 0)
+    if not any(key.startswith(("xaxis.range", "yaxis.range")) for key in relayout_data):
+        return None
+    x0, x1 = max(0, min(x0, x1)), min(preview.width, max(x0, x1))
+    y0, y1 = max(0, min(y0, y1)), min(preview.height, max(y0, y1))
+    if x1 - x0 < 1 or y1 - y0 < 1:
+        return None
+
+    # The preview is at full resolution or still has enough pixels for the zoomed region
+    if preview.scale == 1 or max(x1 - x0, y1 - y0) / preview.scale >= RENDER_SIZE:
+        patch["layout"]["images"][1]["visible"] = False
+        return patch
+
+    # Crop from the coarsest precomputed pyramid level that still has enough pixels, if available (level 0 is the
+    # original image, level N the N-th entry of the precomputed levels)
+    artifacts = image_artifacts(path_images, image_path)
+    levels = artifacts["levels"] if artifacts is not None else []
+    level = min(image_render.pyramid_level(max(x1 - x0, y1 - y0), RENDER_SIZE), len(levels))
+    img = IMAGE_CACHE.get(os.path.join(artifacts["dir"], levels[level - 1])) if level >= 1 else None
+    if img is not None:
+        pixel_scale = (preview.width / img.shape[1], preview.height / img.shape[0])
+    else:
+        img = IMAGE_CACHE.get(image_path)
+        pixel_scale = (1.0, 1.0)
+    if img is None:
+        return None
+    region = image_render.render_region(img, x0, y0, x1, y1, RENDER_SIZE, RENDER_FORMAT, RENDER_QUALITY, pixel_scale)
+    patch["layout"]["images"][1] = region.layout_image()
+    return patch
+
+def thumbnail_loader(dataset, path_images):
+    """Returns a loader for the image cache that renders thumbnails with the boxes of the dataset drawn onto them."""
+    # Colors by category ID
+    annotation_colors = [tuple(round(x * 255) for x in to_rgba(color)[:3]) for color in COLORS[:len(dataset.categories)]] + [(128, 128, 128)]
+
+    def load_thumbnail(image_path):
+        artifacts = image_artifacts(path_images, image_path)
+        if artifacts is not None and artifacts["thumbnail_size"] == GRID_THUMBNAIL_SIZE:
+            img = load_image(os.path.join(artifacts["dir"], artifacts["thumbnail"]))
+            box_scale = artifacts["thumbnail_scale"]
+        else:
+            img = load_image(image_path)
+            box_scale = 1.0
+        if img is None:
+            return None
+        anns = dataset.image_annotations(os.path.relpath(image_path, path_images))
+        boxes = anns[["bbox_xmin", "bbox_ymin", "bbox_width", "bbox_height"]].values / box_scale
+        colors = [annotation_colors[category_id] for category_id in anns["category"].cat.codes]
+        return image_render.render_thumbnail(img, boxes, colors, GRID_THUMBNAIL_SIZE, RENDER_FORMAT, RENDER_QUALITY)
+    return load_thumbnail
+
+def grid_page(dataset, session):
+    """Returns the positions of the images on the current page of the batch review grid."""
+    page = session.get("grid_page", 0)
+    return range(page * GRID_PAGE_SIZE, min((page + 1) * GRID_PAGE_SIZE, len(dataset)))
+
+def grid_options(dataset, session):
+    """Renders the thumbnails of the current grid page (in parallel) as options of the grid checklist."""
+    path_images = session["path_images"]
+    loader = thumbnail_loader(dataset, path_images)
+    # The boxes drawn change with the annotations picked up from the annotation file (see ReviewDataset.pick_up)
+    tag = f"thumbnail|{dataset.path_annotations}|{getattr(dataset, 'mtime', 0)}|{dataset.version}"
+    page = grid_page(dataset, session)
+    image_names = [dataset.image_name(idx) for idx in page]
+    IMAGE_CACHE.prefetch([os.path.join(path_images, image_name) for image_name in image_names], loader=loader, tag=tag)
+
+    options = []
+    for idx, image_name in zip(page, image_names):
+        thumbnail = IMAGE_CACHE.get(os.path.join(path_images, image_name), loader=loader, tag=tag)
+        status, color = check_status(dataset, session, idx)
+        options.append({
+            "label": html.Div([
+                html.Img(src=thumbnail.source if thumbnail is not None else "", className="grid-thumbnail"),
+                html.Div([
+                    dbc.Badge(status, color=color, class_name="me-1"),
+                    html.Small(image_name)
+                ])
+            ]),
+            "value": idx
+        })
 
-def next_image(step):
-    global ANNOTATIONS, CRT_IMG_IDX, CRT_IMG_NAME
-    img_names = ANNOTATIONS["image_name"].drop_duplicates()
-    CRT_IMG_IDX = (CRT_IMG_IDX + step) % len(img_names)
-    CRT_IMG_NAME = img_names.values[CRT_IMG_IDX]
+    # Render the next page in the background
+    next_page = range(page.stop, min(page.stop + GRID_PAGE_SIZE, len(dataset)))
+    IMAGE_CACHE.prefetch([os.path.join(path_images, dataset.image_name(idx)) for idx in next_page], loader=loader, tag=tag)
+    return options
 
-def save_progress_approved():
-    global APPROVED, PATH_APPROVED
-    if PATH_APPROVED != "":
-        APPROVED.to_csv(PATH_APPROVED, sep="|", index=False)
+def category_colors(dataset):
+    return {category: COLORS[idx] for idx, category in enumerate(dataset.categories)}
 
-def save_progress_discarded():
-    global DISCARDED, PATH_DISCARDED
-    if PATH_DISCARDED != "":
-        DISCARDED.to_csv(PATH_DISCARDED, sep="|", index=False)
+def check_status(dataset, session, idx):
+    """Returns the status badge (text and color) of the image at position idx (None if there are no images)."""
+    decision = review_dataset.DECISION_NONE if idx is None else dataset.image_decision(idx)
+    if decision == review_dataset.DECISION_APPROVED or "approved" in session["path_annotations"]:
+        return ["Approved", "success"]
+    elif decision == review_dataset.DECISION_DISCARDED or "discarded" in session["path_annotations"]:
+        return ["Discarded", "danger"]
+    return ["Not analysed", "secondary"]
 
-def save_progress():
-    save_progress_approved()
-    save_progress_discarded()
+def new_session(path_images, path_annotations, path_approved, path_discarded, session_id=None, queue_order=None,
+                path_previous="", changed_only=False):
+    """Returns the state of a review session as kept in the "store_session" store of the browser."""
+    return {
+        "session_id": session_id or uuid.uuid4().hex,
+        "path_images": path_images,
+        "path_annotations": path_annotations,
+        "path_approved": path_approved,
+        "path_discarded": path_discarded,
+        "path_previous": path_previous or "",
+        "queue_order": queue_order or REVIEW_QUEUE_ORDER,
+        "changed_only": bool(changed_only),
+        "img_idx": 0,
+        "n_images": 0,
+        "n_changed": 0,
+        "window_margin": NAVIGATION_MARGIN
+    }
+
+@metrics.span("load")
+def load_dataset(session):
+    """Loads the annotations reviewed in the given session."""
+    global AUTOSAVE, WATCH_PREDICTIONS
+    if annotation_db.is_database(session["path_annotations"]):
+        return annotation_db.DatabaseReviewDataset(session["path_annotations"], session["path_approved"], session["path_discarded"])
+    return review_dataset.ReviewDataset(session["path_annotations"], session["path_approved"], session["path_discarded"], autosave=AUTOSAVE,
+                                        watch=WATCH_PREDICTIONS)
+
+def retire_dataset(dataset):
+    """Closes a replaced dataset once the requests that still use it have released it: their decisions still
+    go to its journal, which the dataset replacing it applies (see ReviewDataset.refresh).
+    """
+    if dataset.journal is not None:
+        weakref.finalize(dataset, dataset.journal.close)
+
+def get_dataset(session):
+    """Returns the dataset reviewed in the given session, loading it if this process has not done so yet
+    (or if the annotation file has been rewritten), with the decisions of all sessions applied.
+    """
+    global DATASETS, DATASETS_LOCK
+    key = (session["path_annotations"], session["path_approved"], session["path_discarded"])
+    with DATASETS_LOCK:
+        entry = DATASETS.get(key)
+        if entry is None:
+            entry = DATASETS[key] = {"lock": threading.Lock(), "dataset": None}
+
+    # Loading the annotations only blocks the sessions reviewing the same ones
+    with entry["lock"]:
+        dataset = entry["dataset"]
+        if dataset is not None:
+            # Merge the rows appended to the annotation files (and new predictions) since the last check
+            dataset.pick_up()
+            if dataset.is_stale():
+                # Persist the progress before loading the rewritten annotations
+                dataset.save_progress()
+                entry["dataset"] = load_dataset(session)
+                retire_dataset(dataset)
+        else:
+            entry["dataset"] = load_dataset(session)
+        dataset = entry["dataset"]
+    dataset.refresh()
+    return dataset
+
+def get_diff(session, dataset):
+    """Returns the changes of the boxes of the dataset since the previous iteration of the session (PATH_PREVIOUS),
+    computing them if this process has not done so yet, or None if no previous iteration is given.
+    """
+    global DIFFS, DIFFS_LOCK
+    path_previous = session.get("path_previous", "")
+    if not path_previous:
+        return None
+    key = (session["path_annotations"], session["path_approved"], session["path_discarded"], path_previous)
+    mtime = os.stat(path_previous).st_mtime_ns
+    with DIFFS_LOCK:
+        entry = DIFFS.get(key)
+        # The changes refer to the positions of the images in the loaded dataset (and its new annotations)
+        if entry is None or entry[0] is not dataset or entry[1] != (mtime, dataset.version):
+            with metrics.span("diff"):
+                entry = DIFFS[key] = (dataset, (mtime, dataset.version), iteration_diff.diff_dataset(dataset, path_previous))
+    return entry[2]
+
+def changed_images(dataset, session):
+    """Returns the positions of the changed images if the session only visits these, otherwise None."""
+    if not session.get("changed_only"):
+        return None
+    diff = get_diff(session, dataset)
+    if diff is None or len(diff.changed) == 0:
+        return None
+    return diff.changed
+
+def navigation_positions(dataset, session, steps):
+    """Returns the positions of the images the given numbers of steps away from the current image (within
+    the changed images in "changed pages only" mode).
+    """
+    changed = changed_images(dataset, session)
+    if changed is None:
+        return [(session["img_idx"] + step) % len(dataset) for step in steps]
+    idx = np.searchsorted(changed, session["img_idx"])
+    # Not being a changed image, the current image lies between the changed images idx - 1 and idx
+    if idx == len(changed) or changed[idx] != session["img_idx"]:
+        return [int(changed[(idx + step - (step > 0)) % len(changed)]) for step in steps]
+    return [int(changed[(idx + step) % len(changed)]) for step in steps]
+
+def current_idx(dataset, session):
+    """Returns the position of the current image of the session, or None if there are no images."""
+    if len(dataset) == 0:
+        return None
+    return session["img_idx"] % len(dataset)
+
+def current_image(dataset, session):
+    idx = current_idx(dataset, session)
+    return "" if idx is None else dataset.image_name(idx)
+
+def next_image(dataset, session, step):
+    session["img_idx"] = navigation_positions(dataset, session, [step])[0]
+
+def next_undecided_image(dataset, session):
+    """Moves the session to the next image without decision in its review order (in "changed pages only"
+    mode, to the next changed image without decision).
+
+    Returns:
+        bool: False if all images have a decision (the session is left unchanged).
+    """
+    changed = changed_images(dataset, session)
+    if changed is not None:
+        start = np.searchsorted(changed, session["img_idx"], side="right")
+        for idx in itertools.chain(changed[start:], changed[:start]):
+            if dataset.image_decision(idx) == review_dataset.DECISION_NONE:
+                session["img_idx"] = int(idx)
+                return True
+        return False
+    idx = dataset.next_undecided(session["img_idx"], session.get("queue_order", "file"))
+    if idx is None:
+        return False
+    session["img_idx"] = idx
+    return True
+
+def prefetch_images(dataset, session):
+    """Decodes the images next to the current one in the background."""
+    global IMAGE_PREFETCH
+    if len(dataset) == 0:
+        return
+    steps = [step for distance in range(1, IMAGE_PREFETCH + 1) for step in (distance, -distance)]
+    image_names = dict.fromkeys(dataset.image_name(idx) for idx in navigation_positions(dataset, session, steps))
+    image_paths = [os.path.join(session["path_images"], image_name) for image_name in image_names]
+    if RENDER_MODE == "layout_image" and IMAGE_DELIVERY == "url":
+        # The browser requests the pages it has not cached yet
+        IMAGE_CACHE.prefetch(image_paths, loader=served_image_loader(session["path_images"], RENDER_SIZE, RENDER_FORMAT),
+                             tag=f"served|{RENDER_SIZE}|{RENDER_FORMAT}")
+    elif RENDER_MODE == "layout_image":
+        IMAGE_CACHE.prefetch(image_paths, loader=preview_loader(session["path_images"]), tag="preview")
+    else:
+        IMAGE_CACHE.prefetch(image_paths)
+
+def window_entry(dataset, session, idx):
+    """Renders an image of the navigation window (figure, table data and status) for the browser."""
+    image_name = dataset.image_name(idx)
+    return {
+        "image_name": image_name,
+        "figure": image_figure(dataset, session["path_images"], image_name, get_diff(session, dataset)).to_plotly_json(),
+        "table": dataset.image_annotations(image_name)[TABLE_COLS].to_dict("records"),
+        "status": check_status(dataset, session, idx)
+    }
+
+def window_keys(dataset, session):
+    """Returns the positions of the images of the navigation window around the current image of the session (in navigation order)."""
+    return list(dict.fromkeys(navigation_positions(dataset, session, range(-NAVIGATION_BEHIND, NAVIGATION_AHEAD + 1))))
+
+def refill_window(dataset, session, keys, patch=None):
+    """Moves the navigation window to the current image of the session.
+
+    Args:
+        keys (list): Positions of the images in the window as held by the browser.
+        patch (dash.Patch, optional): Patch of the window to extend. Defaults to a new one.
+
+    Returns:
+        tuple: A patch of the window ("store_window") that adds the missing images and removes the others, and the new keys.
+    """
+    new_keys = window_keys(dataset, session)
+    patch = patch if patch is not None else Patch()
+    for key in set(keys) - set(new_keys):
+        del patch["entries"][str(key)]
+    for key in new_keys:
+        if key not in keys:
+            patch["entries"][str(key)] = window_entry(dataset, session, key)
+    return patch, new_keys
+
+def shutdown():
+    global DATASETS, DATASETS_LOCK
+    with DATASETS_LOCK:
+        for entry in DATASETS.values():
+            with entry["lock"]:
+                if entry["dataset"] is not None:
+                    entry["dataset"].close()
+        DATASETS.clear()
+
+def shutdown_conversions():
+    CONVERSION_JOBS.shutdown()
 
 def format_traceback():
     return html.Pre(traceback.format_exc())
 
 
 # ===============================================================================================================================================
-#   MAIN
+#   APP
 # ===============================================================================================================================================
-if __name__ == "__main__":
-
-    # Create the Dash app
-    external_stylesheets = [dbc.themes.PULSE, "assets/styles.css"]
-    app = Dash(APP_TITLE, external_stylesheets=external_stylesheets)
-    app.title = APP_TITLE
+# Create the Dash app (app.server is the WSGI application, e.g. for "gunicorn app:server")
+external_stylesheets = [dbc.themes.PULSE, "assets/styles.css"]
+app = Dash(__name__, external_stylesheets=external_stylesheets)
+app.title = APP_TITLE
+server = app.server
+
+@app.server.route("/stats/image-cache")
+def image_cache_stats():
+    return IMAGE_CACHE.stats()
+
+def image_cache_metrics():
+    stats = IMAGE_CACHE.stats()
+    return {
+        "vizaod_image_cache_hits_total": ("counter", "Image cache hits.", stats["hits"]),
+        "vizaod_image_cache_misses_total": ("counter", "Image cache misses.", stats["misses"]),
+        "vizaod_image_cache_evictions_total": ("counter", "Image cache evictions.", stats["evictions"]),
+        "vizaod_image_cache_prefetches_total": ("counter", "Images prefetched in the background.", stats["prefetches"]),
+        "vizaod_image_cache_entries": ("gauge", "Entries in the image cache.", stats["entries"]),
+        "vizaod_image_cache_bytes": ("gauge", "Memory used by the image cache.", stats["bytes"])
+    }
+
+metrics.COLLECTORS.append(image_cache_metrics)
+
+@app.server.route(IMAGE_ROUTE + "<root_key>/<path:image_name>")
+def serve_image(root_key, image_name):
+    """Serves an image of an image directory (PATH_IMAGES or the one of a session, by its key, see IMAGE_ROOTS),
+    downscaled to "size" pixels on its longer side and / or transcoded to "format" (RENDER_FORMAT if only the
+    size is given), otherwise as it is.
+
+    The responses carry an ETag and the modification time of the file and may be cached by the browser (for good
+    if the URL holds the version of the file, see image_url). Conditional requests for an unchanged image are
+    answered with 304 Not Modified without reading the image.
+    """
+    path_images = image_root(root_key)
+    if path_images is None:
+        abort(404)
+    size = request.args.get("size", 0, type=int)
+    fmt = request.args.get("format", "") or (RENDER_FORMAT if size > 0 else "")
+    image_path = os.path.join(path_images, image_name)
+    # Only image files inside the image directory are served
+    inside = os.path.realpath(image_path).startswith(os.path.join(path_images, ""))
+    if not inside or os.path.splitext(image_name)[1].lower() not in precompute_images.IMAGE_EXTENSIONS \
+            or (fmt and fmt not in image_render.MIME_TYPES) or not os.path.isfile(image_path):
+        abort(404)
+
+    stat = os.stat(image_path)
+    etag = f"{stat.st_mtime_ns:x}-{stat.st_size:x}-{max(size, 0)}-{fmt}-{RENDER_QUALITY if fmt else 0}"
+    modified_since = request.if_modified_since
+    if request.if_none_match.contains_weak(etag) or \
+            (not request.if_none_match and modified_since is not None and modified_since.timestamp() >= int(stat.st_mtime)):
+        response = Response(status=304)
+    elif fmt:
+        data = IMAGE_CACHE.get(image_path, loader=served_image_loader(path_images, max(size, 0), fmt), tag=f"served|{max(size, 0)}|{fmt}")
+        if data is None:
+            abort(404)
+        response = Response(data, mimetype=image_render.MIME_TYPES[fmt])
+    else:
+        response = send_file(os.path.abspath(image_path), conditional=False, etag=False, max_age=IMAGE_MAX_AGE)
+
+    response.set_etag(etag)
+    response.last_modified = int(stat.st_mtime)
+    response.cache_control.public = True
+    response.cache_control.max_age = IMAGE_MAX_AGE
+    if "v" in request.args:
+        response.cache_control.immutable = True
+    return response
+
+# The metrics are collected per process (i.e. per worker when running with gunicorn)
+@app.server.route("/metrics")
+def metrics_endpoint():
+    return Response(metrics.render(), mimetype="text/plain; version=0.0.4")
+
+@app.server.before_request
+def metrics_begin_request():
+    metrics.begin_request()
+
+@app.server.after_request
+def metrics_end_request(response):
+    record = metrics.end_request(response.calculate_content_length() or 0, response.status_code)
+    if record is not None and METRICS_LOG:
+        print(metrics.log_line(record), flush=True)
+    return response
 
-    # ===============================================================================================================================================
-    #   APP LAYOUT
-    # ===============================================================================================================================================
-    navbar = dbc.Navbar(
+# ===============================================================================================================================================
+#   APP LAYOUT
+# ===============================================================================================================================================
+navbar = dbc.Navbar(
+    dbc.Container([
+        dbc.Row([
+            dbc.Col(
+                html.A(
+                    html.Img(
+                        src=app.get_asset_url("uos.png"),
+                        alt="Link to the GitHub repository containing the source code ...",
+                        height="40px"
+                    ),
+                    href="https://github.com/cslab-hub/vizaod"
+                )
+            ),
+            dbc.Col(
+                dbc.NavbarBrand(APP_TITLE)
+            ),
+            dbc.Col(
+                dbc.Button("Convert Annotations", id="button_open_modal_conversion", outline=True, color="light", className="me-1", style={"width": "200px"})
+            )
+        ], align="center")
+    ], fluid=True),
+    color="dark",
+    dark=True,
+    className="mb-5",
+)
+
+image_card = dbc.Card([
+    dbc.CardHeader(
+        html.H3("Image Name: \"\"", id="image_name")
+    ),
+    dbc.CardBody(
+        dcc.Graph(
+            id="image_graph",
+            figure=blank_figure(),
+            style={"height": "716px"}
+        ),
+        style={"padding": "0px"}
+    ),
+    dbc.CardFooter(
         dbc.Container([
             dbc.Row([
-                dbc.Col(
-                    html.A(
-                        html.Img(
-                            src=app.get_asset_url("uos.png"),
-                            alt="Link to the GitHub repository containing the source code ...",
-                            height="40px"
-                        ),
-                        href="https://github.com/cslab-hub/vizaod"
-                    )
-                ),
-                dbc.Col(
-                    dbc.NavbarBrand(APP_TITLE)
-                ),
-                dbc.Col(
-                    dbc.Button("Convert Annotations", id="button_open_modal_conversion", outline=True, color="light", className="me-1", style={"width": "200px"})
-                )
-            ], align="center")
-        ], fluid=True),
-        color="dark",
-        dark=True,
-        className="mb-5",
+                dbc.Col([
+                    dbc.Button("Previous image", id="button_previous", className="me-1", outline=True, color="primary", style={"width": "100%"}),
+                ], md=3),
+                dbc.Col([
+                    dbc.Badge("Not analysed", id="badge_analysed", color="secondary", pill=True, class_name="me-1", style={"width": "100%", "height": "100%", "font-size": "18px"})
+                ], md=3),
+                dbc.Col([
+                    dbc.Button("Next image", id="button_next", className="me-1", outline=True, color="primary", style={"width": "100%"})
+                ], md=3),
+                dbc.Col([
+                    dbc.Button("Next unreviewed", id="button_next_undecided", className="me-1", outline=True, color="primary", style={"width": "100%"})
+                ], md=3)
+            ], style={"height": "100%"}, justify="center", align="center")
+        ])
     )
+])
 
-    image_card = dbc.Card([
-        dbc.CardHeader(
-            html.H3("Image Name: \"" + CRT_IMG_NAME + "\"", id="image_name")
-        ),
-        dbc.CardBody(
-            dcc.Graph(
-                id="image_graph",
-                figure=blank_figure(),
-                style={"height": "716px"}
-            ),
-            style={"padding": "0px"}
-        ),
-        dbc.CardFooter(
-            dbc.Container([
-                dbc.Row([
-                    dbc.Col([
-                        dbc.Button("Previous image", id="button_previous", className="me-1", outline=True, color="primary", style={"width": "100%"}),
-                    ], md=4),
-                    dbc.Col([
-                        dbc.Badge("Not analysed", id="badge_analysed", color="secondary", pill=True, class_name="me-1", style={"width": "100%", "height": "100%", "font-size": "18px"})
-                    ], md=4),
-                    dbc.Col([
-                        dbc.Button("Next image", id="button_next", className="me-1", outline=True, color="primary", style={"width": "100%"})
-                    ], md=4)
-                ], style={"height": "100%"}, justify="center", align="center")
+config_card = dbc.Card([
+    dbc.CardHeader(html.H3("Configuration")),
+    dbc.CardBody([
+        dbc.Container([
+            dbc.Row([
+                dbc.Col("PATH_IMAGES", md=3),
+                dbc.Col(dcc.Input(id="input_path_images", value=PATH_IMAGES, style={"width": "100%"}), md=9)
+            ]),
+            dbc.Row([
+                dbc.Col("PATH_ANNOTATIONS", md=3),
+                dbc.Col(dcc.Input(id="input_path_annotations", value=PATH_ANNOTATIONS, style={"width": "100%"}), md=9)
+            ]),
+            dbc.Row([
+                dbc.Col("PATH_APPROVED", md=3),
+                dbc.Col(dcc.Input(id="input_path_approved", value=PATH_APPROVED, style={"width": "100%"}), md=9)
+            ]),
+            dbc.Row([
+                dbc.Col("PATH_DISCARDED", md=3),
+                dbc.Col(dcc.Input(id="input_path_discarded", value=PATH_DISCARDED, style={"width": "100%"}), md=9)
+            ]),
+            dbc.Row([
+                dbc.Col("PATH_PREVIOUS", md=3),
+                dbc.Col(dcc.Input(id="input_path_previous", value=PATH_PREVIOUS, style={"width": "100%"}), md=6),
+                dbc.Col(dbc.Switch(id="switch_changed_only", label="Changed pages only", value=False), md=3)
+            ]),
+            dbc.Row([
+                dbc.Col("REVIEW_ORDER", md=3),
+                dbc.Col(dcc.Dropdown(id="dropdown_queue_order", options=review_queue.QUEUE_ORDERS, value=REVIEW_QUEUE_ORDER, clearable=False), md=9)
             ])
+        ])
+    ]),
+    dbc.CardFooter(
+        dbc.ButtonGroup([
+            dbc.Button("Start", id="button_start", className="me-1", outline=True, color="primary", style={"width": "100%"}),
+            dbc.Button("Save progress", id="button_save", className="me-1", outline=True, color="primary", style={"width": "100%"})
+            # dbc.Button("Autosave progess: Disabled", id="button_autosave", className="me-1", outline=True, color="primary", style={"width": "100%"})
+        ], style={"width": "100%"})
+    )
+], style={"margin-bottom": "10px"})
+
+
+grid_card = dbc.Card([
+    dbc.CardHeader(
+        html.H3("Page 0 / 0", id="grid_page_label")
+    ),
+    dbc.CardBody(
+        dcc.Checklist(id="checklist_grid", options=[], value=[], className="grid-checklist"),
+        style={"padding": "10px"}
+    ),
+    dbc.CardFooter(
+        dbc.ButtonGroup([
+            dbc.Button("Previous page", id="button_grid_previous", className="me-1", outline=True, color="primary"),
+            dbc.Button("Select all", id="button_grid_select_all", className="me-1", outline=True, color="primary"),
+            dbc.Button("Approve selection", id="button_grid_approve", className="me-1", outline=True, color="success"),
+            dbc.Button("Discard selection", id="button_grid_discard", className="me-1", outline=True, color="danger"),
+            dbc.Button("Next page", id="button_grid_next", className="me-1", outline=True, color="primary")
+        ], style={"width": "100%"})
+    )
+])
+
+annotation_card = dbc.Card([
+    dbc.CardHeader(html.H3("Annotation Information")),
+    dbc.CardBody(
+        DataTable(
+            id="annotations_table",
+            columns=TABLE_COLS_SPECS,
+            editable=False
         )
-    ])
-    
-    config_card = dbc.Card([
-        dbc.CardHeader(html.H3("Configuration")),
-        dbc.CardBody([
+    ),
+    dbc.CardFooter(
+        dbc.ButtonGroup([
+            dbc.Button("Approve annotations", id="button_approve", className="me-1", outline=True, color="success"),
+            dbc.Button("Discard annotations", id="button_discard", className="me-1", outline=True, color="danger")
+        ], style={"width": "100%"})
+    )
+])
+
+app.layout = html.Div([
+    dcc.Store(id="store_session", storage_type="session"),
+    # Prerendered images around the current one for clientside navigation, keyed by position
+    dcc.Store(id="store_window", data={"entries": {}}),
+    dcc.Store(id="store_window_keys", data=[]),
+    dcc.Store(id="store_window_request"),
+    dcc.Interval(id="interval_watch", interval=WATCH_INTERVAL_MS),
+    navbar,
+    dbc.Container([
+        dbc.Row([
+            dbc.Alert(
+                "Alert Main",
+                id="alert_main",
+                is_open=False,
+                duration=5000,
+                color="danger"
+            ),
+        ]),
+        dbc.Row([
+            dbc.Col(
+                dbc.Tabs([
+                    dbc.Tab(image_card, label="Single image", tab_id="tab_single"),
+                    dbc.Tab(grid_card, label="Grid", tab_id="tab_grid")
+                ], id="tabs_review", active_tab="tab_single"),
+                md=6
+            ),
+            dbc.Col([
+                config_card,
+                annotation_card
+            ], md=6, style={"padding-left": "5px"})
+        ])
+    ], fluid=True, style={"margin-top": "-48px", "padding": "10px"}),
+    dbc.Modal([
+        dbc.ModalHeader(dbc.ModalTitle("Annotation Conversion")),
+        dbc.ModalBody([
             dbc.Container([
                 dbc.Row([
-                    dbc.Col("PATH_IMAGES", md=3),
-                    dbc.Col(dcc.Input(id="input_path_images", value=PATH_IMAGES, style={"width": "100%"}), md=9)
+                    dbc.Alert(
+                        "Alert Modal",
+                        id="alert_modal",
+                        is_open=False,
+                        duration=3000,
+                        color="danger"
+                    )
                 ]),
+                dbc.Row(
+                    "Here you can convert a JSON file containing the annotations for your dataset into a CSV file with the format we are using for this application. Note that only the conversion from the COCO JSON format is currently supported.",
+                    style={"margin-bottom": "20px", "margin-top": "0px"}
+                ),
+                html.Hr(),
                 dbc.Row([
-                    dbc.Col("PATH_ANNOTATIONS", md=3),
-                    dbc.Col(dcc.Input(id="input_path_annotations", value=PATH_ANNOTATIONS, style={"width": "100%"}), md=9)
+                    dbc.Col("Path to JSON file", md=3),
+                    dbc.Col(dcc.Input(id="input_path_json", value="demo/conversion/annotations.json", style={"width": "100%"}), md=9)
                 ]),
                 dbc.Row([
-                    dbc.Col("PATH_APPROVED", md=3),
-                    dbc.Col(dcc.Input(id="input_path_approved", value=PATH_APPROVED, style={"width": "100%"}), md=9)
+                    dbc.Col("Path to output file", md=3),
+                    dbc.Col(dcc.Input(id="input_path_csv", value="demo/conversion/annotations.csv", style={"width": "100%"}), md=9)
                 ]),
                 dbc.Row([
-                    dbc.Col("PATH_DISCARDED", md=3),
-                    dbc.Col(dcc.Input(id="input_path_discarded", value=PATH_DISCARDED, style={"width": "100%"}), md=9)
-                ])
-            ])
-        ]),
-        dbc.CardFooter(
-            # dbc.ButtonGroup([
-            dbc.Button("Start", id="button_start", className="me-1", outline=True, color="primary", style={"width": "100%"})
-                # dbc.Button("Save progess", id="button_save", className="me-1", outline=True, color="primary", style={"width": "100%"}),
-                # dbc.Button("Autosave progess: Disabled", id="button_autosave", className="me-1", outline=True, color="primary", style={"width": "100%"})
-            # ], style={"width": "100%"})
-        )
+                    dbc.Col("Output format", md=3),
+                    dbc.Col(dbc.RadioItems(
+                        id="radio_conversion_format",
+                        options=[
+                            {"label": "CSV", "value": "csv"},
+                            {"label": "Parquet", "value": "parquet"},
+                            {"label": "Feather", "value": "feather"}
+                        ],
+                        value="csv",
+                        inline=True
+                    ), md=9)
+                ]),
+                dbc.Row([
+                    dbc.Col("Conversion", md=3),
+                    dbc.Col(dbc.RadioItems(
+                        id="radio_conversion_method",
+                        options=[
+                            {"label": "Streaming (bounded memory, CSV only)", "value": "streaming"},
+                            {"label": "Columnar (vectorized, fast)", "value": "columnar"}
+                        ],
+                        value="streaming",
+                        inline=True
+                    ), md=9)
+                ], style={"margin-bottom": "10px"}),
+                dbc.Row([
+                    dbc.Button(dbc.Spinner("Generate CSV", id="spinner_conversion"), id="button_conversion", className="me-1", outline=True, color="primary", style={"width": "100%"}),
+                ]),
+                # Conversion jobs started in this tab, refreshed while any of them is unfinished
+                html.Div(id="conversion_jobs", style={"margin-top": "10px"}),
+                dcc.Store(id="store_conversion_jobs", data=[], storage_type="session"),
+                dcc.Interval(id="interval_conversion_jobs", interval=CONVERSION_POLL_MS, disabled=True),
+                dcc.ConfirmDialog(
+                    id="confirm_conversion",
+                    message="Do you really want to convert the annotations? This will overwrite the output file if it already exists!"
+                )
+            ], fluid=True, style={"padding": "10px"})
+        ])
+    ], id="modal_conversion", is_open=False, size="lg"),
+    dcc.ConfirmDialog(
+        id="confirm_start",
+        message="Do you really want to start?"
+    ),
+    dcc.ConfirmDialog(
+        id="confirm_save",
+        message="Do you really want to save your current progress? This will overwrite the csv files 'PATH_APPROVED' and 'PATH_DISCARDED' if they already exist!"
+    )
+], id="main_div")
+
+# ===============================================================================================================================================
+#   CALLBACKS
+# ===============================================================================================================================================
+@app.callback(
+    [
+        Output("image_graph", "figure", allow_duplicate=True),
+        Output("annotations_table", "data", allow_duplicate=True),
+        Output("image_name", "children", allow_duplicate=True),
+        Output("badge_analysed", "children", allow_duplicate=True),
+        Output("badge_analysed", "color", allow_duplicate=True),
+        Output("alert_main", "children", allow_duplicate=True),
+        Output("alert_main", "is_open", allow_duplicate=True),
+        Output("store_session", "data", allow_duplicate=True),
+        Output("store_window", "data", allow_duplicate=True),
+        Output("store_window_keys", "data", allow_duplicate=True)
+    ],
+    # With clientside navigation, "Previous" / "Next" are handled in the browser (see assets/navigation.js)
+    [Input(button, "n_clicks") for button in NAVIGATION_BUTTONS],
+    [
+        State("store_session", "data"),
+        State("store_window_keys", "data")
+    ],
+    prevent_initial_call=True
+)
+@metrics.instrumented("update_figure_and_annotations")
+def update_figure_and_annotations(*inputs):
+    global TABLE_COLS
+
+    *n_clicks, session, store_keys = inputs
+    store_keys = store_keys or []
+
+    if not session:
+        return [no_update, no_update, no_update, no_update, no_update, "WARNING: You haven't started yet!", True, no_update, no_update, no_update]
+
+    try:
+        dataset = get_dataset(session)
+    except Exception as e:
+        return [no_update, no_update, no_update, no_update, no_update, format_traceback(), True, no_update, no_update, no_update]
+
+    if len(dataset) == 0:
+        return [no_update, no_update, no_update, no_update, no_update, f"WARNING: There are no annotations contained in the '{session['path_annotations']}' file!", True, no_update, no_update, no_update]
+
+    cbcontext = [p["prop_id"] for p in callback_context.triggered][0]
+
+    # Do not update if we do not trigger any inputs
+    if cbcontext == ".":
+        raise PreventUpdate
+
+    decided_idx = session["img_idx"]
+
+    # Show previous image
+    if cbcontext == "button_previous.n_clicks":
+        next_image(dataset, session, -1)
+
+    # Show next image
+    elif cbcontext == "button_next.n_clicks":
+        next_image(dataset, session, 1)
+
+    # Show the next image without decision
+    elif cbcontext == "button_next_undecided.n_clicks":
+        if not next_undecided_image(dataset, session):
+            return [no_update, no_update, no_update, no_update, no_update, "All images have been reviewed!", True, no_update, no_update, no_update]
+
+    # Move the annotations to the approved annotations
+    elif cbcontext == "button_approve.n_clicks":
+        if session["path_approved"] == "":
+            return [no_update, no_update, no_update, no_update, no_update, f"WARNING: You can't approve any annotations when the path 'PATH_APPROVED' is not given!", True, no_update, no_update, no_update]
+        with metrics.span("decision"):
+            dataset.decide_idxs([current_idx(dataset, session)], review_dataset.DECISION_APPROVED, session["session_id"])
+        if not next_undecided_image(dataset, session):
+            next_image(dataset, session, 1)
+
+    # Move the annotations to the discarded annotations
+    elif cbcontext == "button_discard.n_clicks":
+        if session["path_discarded"] == "":
+            return [no_update, no_update, no_update, no_update, no_update, f"WARNING: You can't discard any annotations when the path 'PATH_DISCARDED' is not given!", True, no_update, no_update, no_update]
+        with metrics.span("decision"):
+            dataset.decide_idxs([current_idx(dataset, session)], review_dataset.DECISION_DISCARDED, session["session_id"])
+        if not next_undecided_image(dataset, session):
+            next_image(dataset, session, 1)
+
+    prefetch_images(dataset, session)
+
+    # Update the status of the decided image in the window and move the window along
+    window, keys = no_update, no_update
+    if NAVIGATION_MODE == "clientside":
+        window = Patch()
+        if cbcontext in ("button_approve.n_clicks", "button_discard.n_clicks") and decided_idx in store_keys:
+            window["entries"][str(decided_idx)]["status"] = check_status(dataset, session, decided_idx)
+        with metrics.span("window"):
+            window, keys = refill_window(dataset, session, store_keys, window)
+
+    image_name = current_image(dataset, session)
+    figure = image_figure(dataset, session["path_images"], image_name, get_diff(session, dataset))
+    with metrics.span("table"):
+        table = dataset.image_annotations(image_name)[TABLE_COLS].to_dict("records")
+    return [
+        figure,
+        table,
+        "Image Name: \"" + image_name + "\"",
+        *check_status(dataset, session, current_idx(dataset, session)),
+        no_update, no_update,
+        session,
+        window, keys
+    ]
+
+@app.callback(
+    [
+        Output("store_session", "data", allow_duplicate=True),
+        Output("alert_main", "children", allow_duplicate=True),
+        Output("alert_main", "is_open", allow_duplicate=True),
+        Output("store_window", "data", allow_duplicate=True),
+        Output("store_window_keys", "data", allow_duplicate=True)
+    ],
+    Input("interval_watch", "n_intervals"),
+    State("store_session", "data"),
+    prevent_initial_call=True
+)
+def cb_watch_annotations(n_intervals, session):
+    """Adds the images picked up since the session has last seen the dataset (see ReviewDataset.pick_up) to the session."""
+    if not session:
+        raise PreventUpdate
+    try:
+        dataset = get_dataset(session)
+    except Exception:
+        # Reported by the next callback the reviewer triggers
+        raise PreventUpdate
+    if len(dataset) == session["n_images"]:
+        raise PreventUpdate
+
+    # Only patch the counts, so that a concurrent navigation keeps its image
+    patch = Patch()
+    patch["n_images"] = len(dataset)
+    changed = changed_images(dataset, session)
+    if changed is not None:
+        patch["n_changed"] = len(changed)
+    alert = no_update
+    if len(dataset) > session["n_images"]:
+        alert = f"{len(dataset) - session['n_images']} new images have been added to the review."
+
+    # The prerendered images might show outdated annotations
+    window, keys = no_update, no_update
+    if NAVIGATION_MODE == "clientside":
+        window, keys = {"entries": {}}, []
+    return [patch, alert, alert is not no_update, window, keys]
+
+# ======================================================================================
+#   Callbacks related to the batch review grid
+# ======================================================================================
+@app.callback(
+    [
+        Output("checklist_grid", "options"),
+        Output("checklist_grid", "value"),
+        Output("grid_page_label", "children"),
+        Output("alert_main", "children", allow_duplicate=True),
+        Output("alert_main", "is_open", allow_duplicate=True),
+        Output("store_session", "data", allow_duplicate=True)
+    ],
+    [
+        Input("tabs_review", "active_tab"),
+        Input("button_grid_previous", "n_clicks"),
+        Input("button_grid_next", "n_clicks"),
+        Input("button_grid_approve", "n_clicks"),
+        Input("button_grid_discard", "n_clicks")
+    ],
+    [
+        State("checklist_grid", "value"),
+        State("store_session", "data")
+    ],
+    prevent_initial_call=True
+)
+def cb_update_grid(
+    active_tab,
+    n_clicks_previous,
+    n_clicks_next,
+    n_clicks_approve,
+    n_clicks_discard,
+    selection,
+    session
+):
+    if active_tab != "tab_grid":
+        raise PreventUpdate
+
+    if not session:
+        return [no_update, no_update, no_update, "WARNING: You haven't started yet!", True, no_update]
+
+    try:
+        dataset = get_dataset(session)
+    except Exception as e:
+        return [no_update, no_update, no_update, format_traceback(), True, no_update]
+
+    if len(dataset) == 0:
+        return [no_update, no_update, no_update, f"WARNING: There are no annotations contained in the '{session['path_annotations']}' file!", True, no_update]
+
+    cbcontext = [p["prop_id"] for p in callback_context.triggered][0]
+    n_pages = (len(dataset) + GRID_PAGE_SIZE - 1) // GRID_PAGE_SIZE
+    page = session.get("grid_page", 0) % n_pages
+
+    # Show the previous / next page
+    if cbcontext == "button_grid_previous.n_clicks":
+        page = (page - 1) % n_pages
+    elif cbcontext == "button_grid_next.n_clicks":
+        page = (page + 1) % n_pages
+
+    # Approve / discard all selected images at once
+    elif cbcontext in ("button_grid_approve.n_clicks", "button_grid_discard.n_clicks"):
+        if cbcontext == "button_grid_approve.n_clicks":
+            path, path_name, decision = session["path_approved"], "PATH_APPROVED", review_dataset.DECISION_APPROVED
+        else:
+            path, path_name, decision = session["path_discarded"], "PATH_DISCARDED", review_dataset.DECISION_DISCARDED
+        if path == "":
+            return [no_update, no_update, no_update, f"WARNING: You can't {'approve' if decision == review_dataset.DECISION_APPROVED else 'discard'} any annotations when the path '{path_name}' is not given!", True, no_update]
+        if selection:
+            dataset.decide_idxs(selection, decision, session["session_id"])
+
+    session["grid_page"] = page
+    return [
+        grid_options(dataset, session),
+        [],
+        f"Page {page + 1} / {n_pages}",
+        no_update, no_update,
+        session
+    ]
+
+@app.callback(
+    Output("checklist_grid", "value", allow_duplicate=True),
+    Input("button_grid_select_all", "n_clicks"),
+    State("checklist_grid", "options"),
+    prevent_initial_call=True
+)
+def cb_grid_select_all(n_clicks, options):
+    return [option["value"] for option in options]
+
+# ======================================================================================
+#   Callbacks related to the input paths in the configuration card
+# ======================================================================================
+@app.callback(
+    [
+        Output("input_path_approved", "value"),
+        Output("input_path_discarded", "value"),
+        Output("input_path_previous", "value")
+    ],
+        Input("input_path_annotations", "value")
+)
+def cb_update_path_inputs(
+    value
+):
+    cbcontext = [p["prop_id"] for p in callback_context.triggered][0]
+
+    # Do not update if we do not trigger any inputs
+    if cbcontext == ".":
+        raise PreventUpdate
+
+    if "initial" in value or "approved" in value or "discarded" in value:
+        return ["", "", ""]
+
+    base, extension = os.path.splitext(value)
+
+    # Compare "predictions_N" with the predictions of the previous iteration "predictions_N-1" (if present)
+    path_previous = ""
+    prefix, _, iteration = base.rpartition("_")
+    if prefix and iteration.isdigit() and int(iteration) > 0:
+        path_previous = f"{prefix}_{int(iteration) - 1}{extension}"
+        if not os.path.exists(path_previous):
+            path_previous = ""
+
+    # The decisions kept in an annotation database are exported to CSV files
+    if annotation_db.is_database(value):
+        extension = ".csv"
+    return [
+        base + "_approved" + extension,
+        base + "_discarded" + extension,
+        path_previous
+    ]
+
+# ======================================================================================
+#   Callbacks related to the conversion modal
+# ======================================================================================
+@app.callback(
+    Output("modal_conversion", "is_open"),
+    Input("button_open_modal_conversion", "n_clicks"),
+    State("modal_conversion", "is_open")
+)
+def cb_open_modal(n_clicks, is_open):
+    if n_clicks:
+        return not is_open
+    return is_open
+
+@app.callback(
+    Output("confirm_conversion", "displayed"),
+    Input("button_conversion", "n_clicks"),
+    prevent_initial_call=True
+)
+def cb_display_confirm_conversion(n_clicks):
+    return True
+
+@app.callback(
+    [
+        Output("input_path_csv", "value"),
+        Output("spinner_conversion", "children", allow_duplicate=True)
+    ],
+    Input("radio_conversion_format", "value"),
+    State("input_path_csv", "value"),
+    prevent_initial_call=True
+)
+def cb_update_conversion_format(fmt, input_path_csv):
+    return [
+        os.path.splitext(input_path_csv)[0] + convert_to_csv.OUTPUT_FORMATS[fmt],
+        f"Generate {fmt.capitalize() if fmt != 'csv' else 'CSV'}"
+    ]
+
+@app.callback(
+    [
+        Output("spinner_conversion", "children"),
+        Output("alert_modal", "children"),
+        Output("alert_modal", "is_open"),
+        Output("store_conversion_jobs", "data")
+    ],
+    Input("confirm_conversion", "submit_n_clicks"),
+    [
+        State("input_path_json", "value"),
+        State("input_path_csv", "value"),
+        State("radio_conversion_format", "value"),
+        State("radio_conversion_method", "value"),
+        State("store_conversion_jobs", "data")
+    ],
+    prevent_initial_call=True
+)
+@metrics.instrumented("conversion")
+def conversion(n_clicks, input_path_json, input_path_csv, fmt, method, job_ids):
+    if not os.path.exists(input_path_json):
+        return [no_update, f"The JSON file '{input_path_json}' does not exist!", True, no_update]
+    if not os.path.isdir(os.path.dirname(os.path.abspath(input_path_csv))):
+        return [no_update, f"The directory of the output file '{input_path_csv}' does not exist!", True, no_update]
+    if method == "streaming" and fmt != "csv":
+        return [no_update, "The streaming conversion only writes CSV files!", True, no_update]
+    try:
+        job_id = CONVERSION_JOBS.submit(input_path_json, input_path_csv, fmt, method)
+    except Exception as e:
+        return [no_update, format_traceback(), True, no_update]
+    return [no_update, no_update, no_update, [job_id] + (job_ids or [])]
+
+def conversion_job_row(job, cancel_requested):
+    """Returns the progress bar (or result) of a conversion job, with a button to cancel it while it can be cancelled."""
+    finished = job["state"] in conversion_jobs.FINISHED_STATES
+    if finished:
+        color = {conversion_jobs.DONE: "success", conversion_jobs.CANCELLED: "secondary"}.get(job["state"], "danger")
+        progress = dbc.Progress(value=100 if job["state"] == conversion_jobs.DONE else 0, color=color, style={"height": "6px"})
+    else:
+        progress = dbc.Progress(value=100 * job["fraction"], label=f"{job['fraction']:.0%}", striped=True, animated=True)
+    summary = conversion_jobs.job_summary(job) + (" (cancelling ...)" if cancel_requested and not finished else "")
+    if job["state"] == conversion_jobs.RUNNING and not conversion_jobs.cancellable(job):
+        summary += f" (the {job['method']} conversion cannot be cancelled while running)"
+    return html.Div([
+        dbc.Row([
+            dbc.Col(summary, md=10, style={"font-size": "small"}),
+            dbc.Col(dbc.Button("Cancel", id={"type": "button_cancel_conversion", "index": job["id"]}, size="sm", outline=True,
+                               color="danger", disabled=not conversion_jobs.cancellable(job) or cancel_requested, style={"width": "100%"}), md=2)
+        ], align="center"),
+        progress,
+        html.Pre(job["error"], style={"font-size": "x-small"}) if job["state"] == conversion_jobs.FAILED else None
     ], style={"margin-bottom": "10px"})
 
+@app.callback(
+    [
+        Output("conversion_jobs", "children"),
+        Output("interval_conversion_jobs", "disabled")
+    ],
+    [
+        Input("interval_conversion_jobs", "n_intervals"),
+        Input("store_conversion_jobs", "data")
+    ]
+)
+def cb_update_conversion_jobs(n_intervals, job_ids):
+    store = CONVERSION_JOBS.store
+    jobs = [job for job in map(store.poll, job_ids or []) if job is not None]
+    rows = [conversion_job_row(job, store.cancel_requested(job["id"])) for job in jobs]
+    return [rows, all(job["state"] in conversion_jobs.FINISHED_STATES for job in jobs)]
+
+@app.callback(
+    Output("interval_conversion_jobs", "n_intervals"),
+    Input({"type": "button_cancel_conversion", "index": ALL}, "n_clicks"),
+    State("interval_conversion_jobs", "n_intervals"),
+    prevent_initial_call=True
+)
+def cb_cancel_conversion(n_clicks, n_intervals):
+    # The buttons are recreated on every refresh, which triggers this callback without a click
+    if not callback_context.triggered[0]["value"]:
+        raise PreventUpdate
+    CONVERSION_JOBS.store.cancel(callback_context.triggered_id["index"])
+    return (n_intervals or 0) + 1
+
+# ======================================================================================
+#   Callbacks for start
+# ======================================================================================
+@app.callback(
+    [
+        Output("image_graph", "figure", allow_duplicate=True),
+        Output("annotations_table", "data", allow_duplicate=True),
+        Output("annotations_table", "style_data_conditional"),
+        Output("image_name", "children", allow_duplicate=True),
+        Output("badge_analysed", "children", allow_duplicate=True),
+        Output("badge_analysed", "color", allow_duplicate=True),
+        Output("alert_main", "children", allow_duplicate=True),
+        Output("alert_main", "is_open", allow_duplicate=True),
+        Output("store_session", "data", allow_duplicate=True),
+        Output("store_window", "data", allow_duplicate=True),
+        Output("store_window_keys", "data", allow_duplicate=True)
+    ],
+        Input("confirm_start", "submit_n_clicks"),
+    [
+        State("input_path_images", "value"),
+        State("input_path_annotations", "value"),
+        State("input_path_approved", "value"),
+        State("input_path_discarded", "value"),
+        State("input_path_previous", "value"),
+        State("switch_changed_only", "value"),
+        State("dropdown_queue_order", "value"),
+        State("store_session", "data")
+    ],
+    prevent_initial_call=True
+)
+@metrics.instrumented("cb_start_verifying")
+def cb_start_verifying(
+    submit_n_clicks,
+    input_path_images,
+    input_path_annotations,
+    input_path_approved,
+    input_path_discarded,
+    input_path_previous,
+    changed_only,
+    queue_order,
+    session
+):
+    global TABLE_COLS
+
+    path_err = False
+    path_err_msg = []
+
+    # Check if the given paths do exist
+    if not os.path.exists(input_path_images):
+        path_err = True
+        path_err_msg.append(f"PATH_IMAGES '{input_path_images}' does not exist!")
+
+    if not os.path.exists(input_path_annotations):
+        if path_err_msg:
+            path_err_msg.append(html.Hr())
+        path_err_msg.append(f"PATH_ANNOTATIONS '{input_path_annotations}' does not exist!")
+        path_err = True
+
+    if input_path_previous and not os.path.exists(input_path_previous):
+        if path_err_msg:
+            path_err_msg.append(html.Hr())
+        path_err_msg.append(f"PATH_PREVIOUS '{input_path_previous}' does not exist!")
+        path_err = True
+
+    if changed_only and not input_path_previous:
+        if path_err_msg:
+            path_err_msg.append(html.Hr())
+        path_err_msg.append("The review of the changed pages only requires the previous predictions 'PATH_PREVIOUS'!")
+        path_err = True
+
+    # Check the columns before loading the annotations: the review orders by score require a score column
+    if queue_order in review_queue.SCORE_ORDERS and os.path.exists(input_path_annotations):
+        read_columns = annotation_db.read_columns if annotation_db.is_database(input_path_annotations) else annotation_store.read_columns
+        if not any(column in review_queue.SCORE_COLUMNS for column in read_columns(input_path_annotations)):
+            if path_err_msg:
+                path_err_msg.append(html.Hr())
+            path_err_msg.append(f"The review order '{queue_order}' requires one of the columns {review_queue.SCORE_COLUMNS} in PATH_ANNOTATIONS!")
+            path_err = True
 
-    annotation_card = dbc.Card([
-        dbc.CardHeader(html.H3("Annotation Information")),
-        dbc.CardBody(
-            DataTable(
-                id="annotations_table",
-                columns=TABLE_COLS_SPECS,
-                editable=False
-            )
-        ),
-        dbc.CardFooter(
-            dbc.ButtonGroup([
-                dbc.Button("Approve annotations", id="button_approve", className="me-1", outline=True, color="success"),
-                dbc.Button("Discard annotations", id="button_discard", className="me-1", outline=True, color="danger")
-            ], style={"width": "100%"})
-        )
-    ])
+    if path_err:
+        return [no_update, no_update, no_update, no_update, no_update, no_update, path_err_msg, True, no_update, no_update, no_update]
+    register_image_root(input_path_images)
 
-    app.layout = html.Div([
-        navbar,
-        dbc.Container([
-            dbc.Row([
-                dbc.Alert(
-                    "Alert Main",
-                    id="alert_main",
-                    is_open=False,
-                    duration=5000,
-                    color="danger"
-                ),
-            ]),
-            dbc.Row([
-                dbc.Col(image_card, md=6),
-                dbc.Col([
-                    config_card,
-                    annotation_card
-                ], md=6, style={"padding-left": "5px"})
-            ])
-        ], fluid=True, style={"margin-top": "-48px", "padding": "10px"}),
-        dbc.Modal([
-            dbc.ModalHeader(dbc.ModalTitle("Annotation Conversion")),
-            dbc.ModalBody([
-                dbc.Container([
-                    dbc.Row([
-                        dbc.Alert(
-                            "Alert Modal",
-                            id="alert_modal",
-                            is_open=False,
-                            duration=3000,
-                            color="danger"
-                        )
-                    ]),
-                    dbc.Row(
-                        "Here you can convert a JSON file containing the annotations for your dataset into a CSV file with the format we are using for this application. Note that only the conversion from the COCO JSON format is currently supported.",
-                        style={"margin-bottom": "20px", "margin-top": "0px"}
-                    ),
-                    html.Hr(),
-                    dbc.Row([
-                        dbc.Col("Path to JSON file", md=3),
-                        dbc.Col(dcc.Input(id="input_path_json", value="demo/conversion/annotations.json", style={"width": "100%"}), md=9)
-                    ]),
-                    dbc.Row([
-                        dbc.Col("Path to CSV file", md=3),
-                        dbc.Col(dcc.Input(id="input_path_csv", value="demo/conversion/annotations.csv", style={"width": "100%"}), md=9)
-                    ], style={"margin-bottom": "10px"}),
-                    dbc.Row([
-                        dbc.Button(dbc.Spinner("Generate CSV", id="spinner_conversion"), id="button_conversion", className="me-1", outline=True, color="primary", style={"width": "100%"}),
-                    ]),
-                    dcc.ConfirmDialog(
-                        id="confirm_conversion",
-                        message="Do you really want to convert the annotations? This will overwrite the CSV file if it already exists!"
-                    )
-                ], fluid=True, style={"padding": "10px"})
-            ])
-        ], id="modal_conversion", is_open=False, size="lg"),
-        dcc.ConfirmDialog(
-            id="confirm_start",
-            message="Do you really want to start?"
-        ),
-        dcc.ConfirmDialog(
-            id="confirm_save",
-            message="Do you really want to save your current progress? This will overwrite the csv files 'PATH_APPROVED' and 'PATH_DISCARDED' if they already exist!"
-        )
-    ], id="main_div")
+    # Start a new session (keeping the id of this browser tab) on the given paths
+    session = new_session(
+        input_path_images,
+        input_path_annotations,
+        input_path_approved,
+        input_path_discarded,
+        session_id=session["session_id"] if session else None,
+        queue_order=queue_order,
+        path_previous=input_path_previous,
+        changed_only=changed_only
+    )
 
-    # ===============================================================================================================================================
-    #   CALLBACKS
-    # ===============================================================================================================================================
-    @app.callback(
+    # Load the annotations (unless already loaded by this process), the decisions of all sessions and the
+    # changes since the previous iteration, and start at the first image of the review order
+    alert = no_update
+    try:
+        dataset = get_dataset(session)
+        changed = get_diff(session, dataset).changed if session["changed_only"] else None
+        if changed is not None and len(changed) == 0:
+            alert = "There are no changed pages since the previous predictions, showing all pages."
+            session["changed_only"] = False
+        if changed is not None and len(changed) > 0:
+            session["img_idx"] = int(changed[-1])
+            if not next_undecided_image(dataset, session):
+                session["img_idx"] = int(changed[0])
+        elif session["queue_order"] != "file" and len(dataset) > 0:
+            session["img_idx"] = int(dataset.queue(session["queue_order"]).order[-1])
+            if not next_undecided_image(dataset, session):
+                session["img_idx"] = 0
+    except Exception as e:
+        return [no_update, no_update, no_update, no_update, no_update, no_update, format_traceback(), True, no_update, no_update, no_update]
+
+    session["n_images"] = len(dataset)
+    session["n_changed"] = len(changed) if session["changed_only"] else 0
+
+    # Set up the colors for the annotations table
+    table_colors = {}
+    for category, color in category_colors(dataset).items():
+        color = tuple([x * 255 for x in to_rgba(color, alpha=0.5 / 255)])
+        table_colors[category] = f"rgba{color}"
+
+    style_data_conditional = []
+    for category in dataset.categories:
+        style_data_conditional.append({
+            "if": {"filter_query": f"{{category}} = {category}"},
+            "backgroundColor": table_colors[category]
+        })
+
+    prefetch_images(dataset, session)
+
+    # Replace the window of the previous session
+    window, keys = no_update, no_update
+    if NAVIGATION_MODE == "clientside" and len(dataset) > 0:
+        with metrics.span("window"):
+            keys = window_keys(dataset, session)
+            window = {"entries": {str(key): window_entry(dataset, session, key) for key in keys}}
+
+    image_name = current_image(dataset, session)
+    figure = image_figure(dataset, session["path_images"], image_name, get_diff(session, dataset))
+    with metrics.span("table"):
+        table = dataset.image_annotations(image_name)[TABLE_COLS].to_dict("records")
+    return [
+        figure,
+        table,
+        style_data_conditional,
+        "Image Name: \"" + image_name + "\"",
+        *check_status(dataset, session, current_idx(dataset, session)),
+        alert, alert is not no_update,
+        session,
+        window, keys
+    ]
+
+# ======================================================================================
+#   Callbacks for clientside navigation
+# ======================================================================================
+if NAVIGATION_MODE == "clientside":
+    app.clientside_callback(
+        ClientsideFunction(namespace="vizaod", function_name="navigate"),
         [
             Output("image_graph", "figure", allow_duplicate=True),
             Output("annotations_table", "data", allow_duplicate=True),
             Output("image_name", "children", allow_duplicate=True),
             Output("badge_analysed", "children", allow_duplicate=True),
             Output("badge_analysed", "color", allow_duplicate=True),
-            Output("alert_main", "children", allow_duplicate=True),
-            Output("alert_main", "is_open", allow_duplicate=True)
+            Output("store_session", "data", allow_duplicate=True),
+            Output("store_window_request", "data")
         ],
         [
             Input("button_previous", "n_clicks"),
-            Input("button_next", "n_clicks"),
-            Input("button_approve", "n_clicks"),
-            Input("button_discard", "n_clicks")
+            Input("button_next", "n_clicks")
         ],
-        prevent_initial_call=True
-    )
-    def update_figure_and_annotations(
-        n_clicks_previous,
-        n_clicks_next,
-        n_clicks_approve,
-        n_clicks_discard
-    ):
-        global PATH_IMAGES, PATH_ANNOTATIONS, PATH_APPROVED, PATH_DISCARDED, \
-                ANNOTATIONS, APPROVED, DISCARDED, \
-                CRT_IMG_IDX, CRT_IMG_NAME, \
-                CATEGORIES, ANNOTATION_COLORS, TABLE_COLS, \
-                AUTOSAVE, INITIALIZED
-
-        if not INITIALIZED:
-            return [no_update, no_update, no_update, no_update, no_update, "WARNING: You haven't started yet!", True]
-
-        if len(ANNOTATIONS) == 0:
-            return [no_update, no_update, no_update, no_update, no_update, f"WARNING: There are no annotations contained in the '{PATH_ANNOTATIONS}' file!", True]
-
-        cbcontext = [p["prop_id"] for p in callback_context.triggered][0]
-
-        # Do not update if we do not trigger any inputs
-        if cbcontext == ".":
-            raise PreventUpdate
-
-        # Show previous image
-        if cbcontext == "button_previous.n_clicks":
-            next_image(-1)
-
-        # Show next image
-        elif cbcontext == "button_next.n_clicks":
-            next_image(1)
-
-        # Move the annotations to the approved CSV
-        elif cbcontext == "button_approve.n_clicks":
-            if PATH_APPROVED == "":
-                return [no_update, no_update, no_update, no_update, no_update, f"WARNING: You can't approve any annotations when the path 'PATH_APPROVED' is not given!", True]
-            APPROVED = pd.concat([APPROVED, ANNOTATIONS.loc[ANNOTATIONS["image_name"] == CRT_IMG_NAME]])
-            DISCARDED = DISCARDED.loc[DISCARDED["image_name"] != CRT_IMG_NAME]
-            if AUTOSAVE:
-                save_progress()
-            next_image(1)
-
-        # Move the annotations to the discarded CSV
-        elif cbcontext == "button_discard.n_clicks":
-            if PATH_DISCARDED == "":
-                return [no_update, no_update, no_update, no_update, no_update, f"WARNING: You can't discard any annotations when the path 'PATH_DISCARDED' is not given!", True]
-            DISCARDED = pd.concat([DISCARDED, ANNOTATIONS.loc[ANNOTATIONS["image_name"] == CRT_IMG_NAME]])
-            APPROVED = APPROVED.loc[APPROVED["image_name"] != CRT_IMG_NAME]
-            if AUTOSAVE:
-                save_progress()
-            next_image(1)
-
-        return [
-            image_figure(CRT_IMG_NAME), 
-            ANNOTATIONS.loc[ANNOTATIONS["image_name"] == CRT_IMG_NAME][TABLE_COLS].to_dict("records"),
-            "Image Name: \"" + CRT_IMG_NAME + "\"",
-            *check_status(CRT_IMG_NAME),
-            no_update, no_update
-        ]
-
-    # ======================================================================================
-    #   Callbacks related to the input paths in the configuration card
-    # ======================================================================================
-    @app.callback(
         [
-            Output("input_path_approved", "value"),
-            Output("input_path_discarded", "value")
+            State("store_window", "data"),
+            State("store_window_keys", "data"),
+            State("store_session", "data")
         ],
-            Input("input_path_annotations", "value")
-    )
-    def cb_update_path_inputs(
-        value
-    ):
-        cbcontext = [p["prop_id"] for p in callback_context.triggered][0]
-
-        # Do not update if we do not trigger any inputs
-        if cbcontext == ".":
-            raise PreventUpdate
-
-        if "initial" in value or "approved" in value or "discarded" in value:
-            return ["", ""]
-
-        return [
-            value[:-4] + "_approved.csv",
-            value[:-4] + "_discarded.csv"
-        ]
-
-    # ======================================================================================
-    #   Callbacks related to the conversion modal
-    # ======================================================================================
-    @app.callback(
-        Output("modal_conversion", "is_open"),
-        Input("button_open_modal_conversion", "n_clicks"),
-        State("modal_conversion", "is_open")
-    )
-    def cb_open_modal(n_clicks, is_open):
-        if n_clicks:
-            return not is_open
-        return is_open
-
-    @app.callback(
-        Output("confirm_conversion", "displayed"),
-        Input("button_conversion", "n_clicks"),
         prevent_initial_call=True
     )
-    def cb_display_confirm_conversion(n_clicks):
-        return True
 
-    @app.callback(
-        Output("spinner_conversion", "children"),
-        Input("confirm_conversion", "submit_n_clicks"),
-        [
-            State("input_path_json", "value"),
-            State("input_path_csv", "value")
-        ],
-        prevent_initial_call=True
-    )
-    def conversion(n_clicks, input_path_json, input_path_csv):
-        df = convert_to_csv.convert_coco_json_to_csv(input_path_json)
-        df.to_csv(input_path_csv, sep="|", index=False)
-        return no_update
-
-    # ======================================================================================
-    #   Callbacks for start
-    # ======================================================================================
-    @app.callback(
-        [
-            Output("image_graph", "figure", allow_duplicate=True),
-            Output("annotations_table", "data", allow_duplicate=True),
-            Output("annotations_table", "style_data_conditional"),
-            Output("image_name", "children", allow_duplicate=True),
-            Output("badge_analysed", "children", allow_duplicate=True),
-            Output("badge_analysed", "color", allow_duplicate=True),
-            Output("alert_main", "children", allow_duplicate=True),
-            Output("alert_main", "is_open", allow_duplicate=True)
-        ],
-            Input("confirm_start", "submit_n_clicks"),
-        [
-            State("input_path_images", "value"),
-            State("input_path_annotations", "value"),
-            State("input_path_approved", "value"),
-            State("input_path_discarded", "value")
-        ],
-        prevent_initial_call=True
-    )
-    def cb_start_verifying(
-        submit_n_clicks,
-        input_path_images,
-        input_path_annotations,
-        input_path_approved,
-        input_path_discarded
-    ):
-        global PATH_IMAGES, PATH_ANNOTATIONS, PATH_APPROVED, PATH_DISCARDED, \
-                ANNOTATIONS, APPROVED, DISCARDED, \
-                CRT_IMG_IDX, CRT_IMG_NAME, \
-                CATEGORIES, ANNOTATION_COLORS, TABLE_COLS, INITIALIZED
-
-        path_err = False
-        path_err_msg = []
-
-        # Check if the given paths do exist
-        if not os.path.exists(input_path_images):
-            path_err = True
-            path_err_msg.append(f"PATH_IMAGES '{input_path_images}' does not exist!")
-
-        if not os.path.exists(input_path_annotations):
-            if path_err_msg:
-                path_err_msg.append(html.Hr())
-            path_err_msg.append(f"PATH_ANNOTATIONS '{input_path_annotations}' does not exist!")
-            path_err = True
-
-        if path_err:
-            return [no_update, no_update, no_update, no_update, no_update, no_update, path_err_msg, True]
+@app.callback(
+    [
+        Output("store_window", "data", allow_duplicate=True),
+        Output("store_window_keys", "data", allow_duplicate=True),
+        Output("image_graph", "figure", allow_duplicate=True),
+        Output("annotations_table", "data", allow_duplicate=True),
+        Output("image_name", "children", allow_duplicate=True),
+        Output("badge_analysed", "children", allow_duplicate=True),
+        Output("badge_analysed", "color", allow_duplicate=True)
+    ],
+        Input("store_window_request", "data"),
+    [
+        State("store_session", "data"),
+        State("store_window_keys", "data")
+    ],
+    prevent_initial_call=True
+)
+def cb_refill_window(request, session, keys):
+    """Moves the window along when the browser is about to run out of prerendered images (or has run out of them)."""
+    if not request or not session or NAVIGATION_MODE != "clientside":
+        raise PreventUpdate
+
+    dataset = get_dataset(session)
+    if len(dataset) == 0:
+        raise PreventUpdate
+    # The browser may have moved on while the window was refilled, so fill it around its current image
+    session = dict(session, img_idx=request["idx"] % len(dataset))
+    window, keys = refill_window(dataset, session, keys or [])
+    prefetch_images(dataset, session)
+
+    if not request.get("render"):
+        return [window, keys, no_update, no_update, no_update, no_update, no_update]
+
+    image_name = current_image(dataset, session)
+    return [
+        window, keys,
+        image_figure(dataset, session["path_images"], image_name, get_diff(session, dataset)),
+        dataset.image_annotations(image_name)[TABLE_COLS].to_dict("records"),
+        "Image Name: \"" + image_name + "\"",
+        *check_status(dataset, session, current_idx(dataset, session))
+    ]
+
+@app.callback(
+    Output("image_graph", "figure", allow_duplicate=True),
+    Input("image_graph", "relayoutData"),
+    State("store_session", "data"),
+    prevent_initial_call=True
+)
+def cb_zoom(relayout_data, session):
+    if (RENDER_MODE != "layout_image" and not SEGMENTATION_OVERLAY) or not session or not relayout_data:
+        raise PreventUpdate
+
+    dataset = get_dataset(session)
+    image_name = current_image(dataset, session)
+    if not image_name:
+        raise PreventUpdate
+
+    patch = None
+    if RENDER_MODE == "layout_image":
+        patch = image_zoom_patch(session["path_images"], image_name, relayout_data)
+    if SEGMENTATION_OVERLAY:
+        patch = polygon_zoom_patch(dataset, session["path_images"], image_name, relayout_data, patch)
+    if patch is None:
+        raise PreventUpdate
+    return patch
+
+@app.callback(
+    Output("confirm_start", "displayed"),
+    Input("button_start", "n_clicks"),
+    prevent_initial_call=True
+)
+def cb_display_confirm_start(n_clicks):
+    return True
+
+# ======================================================================================
+#   Callbacks related to the save functionality
+# ======================================================================================
+@app.callback(
+    Output("confirm_save", "displayed"),
+    Input("button_save", "n_clicks"),
+    prevent_initial_call=True
+)
+def cb_display_confirm_save(n_clicks):
+    return True
+
+@app.callback(
+    [
+        Output("alert_main", "children", allow_duplicate=True),
+        Output("alert_main", "is_open", allow_duplicate=True)
+    ],
+        Input("confirm_save", "submit_n_clicks"),
+        State("store_session", "data"),
+    prevent_initial_call=True
+)
+def cb_save_progess(submit_n_clicks, session):
+    if not session:
+        return ["WARNING: You can't save your progess before having started!", True]
+    get_dataset(session).save_progress()
+    raise PreventUpdate
+
+# @app.callback(
+#     Output("button_autosave", "children"),
+#     Input("button_autosave", "n_clicks"),
+#     prevent_initial_call=True
+# )
+# def cb_toggle_autosave(n_clicks):
+#     global AUTOSAVE
+#     AUTOSAVE = not AUTOSAVE
+#     if AUTOSAVE:
+#         return "Autosave progress: Enabled"
+#     return "Autosave progress: Disabled"
+
+
+# Compact the decision journals into the files and cancel the running conversions when shutting down
+atexit.register(shutdown)
+atexit.register(shutdown_conversions)
 
-        # Save given variables
-        PATH_IMAGES = input_path_images
-        PATH_ANNOTATIONS = input_path_annotations
-        PATH_APPROVED = input_path_approved
-        PATH_DISCARDED = input_path_discarded
 
-        # Load annotations
-        try:
-            ANNOTATIONS = pd.read_csv(PATH_ANNOTATIONS, sep="|")
-        except Exception as e:
-            return [no_update, no_update, no_update, no_update, no_update, no_update, format_traceback(), True]
-        APPROVED = pd.DataFrame(columns=ANNOTATIONS.columns)
-        DISCARDED = pd.DataFrame(columns=ANNOTATIONS.columns)
-
-        # If existent, load approved / discarded annotations; otherwise use new dataframes
-        if os.path.exists(PATH_APPROVED):
-            try:
-                APPROVED = pd.read_csv(PATH_APPROVED, sep="|")
-            except pd.errors.EmptyDataError:
-                pass
-            except Exception as e:
-                return [no_update, no_update, no_update, no_update, no_update, no_update, format_traceback(), True]
-        else:
-            save_progress_approved()
-        if os.path.exists(PATH_DISCARDED):
-            try:
-                DISCARDED = pd.read_csv(PATH_DISCARDED, sep="|")
-            except pd.errors.EmptyDataError:
-                pass
-            except Exception as e:
-                return [no_update, no_update, no_update, no_update, no_update, no_update, format_traceback(), True]
-        else:
-            save_progress_discarded()
-
-        # Select first image
-        CRT_IMG_IDX = 0
-        CRT_IMG_NAME = ANNOTATIONS.loc[CRT_IMG_IDX, "image_name"]
-
-        # Get all categories and assign colors to them
-        CATEGORIES = list(ANNOTATIONS["category"].drop_duplicates())
-        ANNOTATION_COLORS = {category: COLORS[idx] for idx, category in enumerate(CATEGORIES)}
-
-        # Set up the colors for the annotations table
-        table_colors = {}
-        for category, color in ANNOTATION_COLORS.items():
-            color = tuple([x * 255 for x in to_rgba(color, alpha=0.5 / 255)])
-            table_colors[category] = f"rgba{color}"
-
-        style_data_conditional = []
-        for category in CATEGORIES:
-            style_data_conditional.append({
-                "if": {"filter_query": f"{{category}} = {category}"},
-                "backgroundColor": table_colors[category]
-            })
-        
-        INITIALIZED = True
-        
-        return [
-            image_figure(CRT_IMG_NAME),
-            ANNOTATIONS.loc[ANNOTATIONS["image_name"] == CRT_IMG_NAME][TABLE_COLS].to_dict("records"),
-            style_data_conditional,
-            "Image Name: \"" + CRT_IMG_NAME + "\"",
-            *check_status(CRT_IMG_NAME),
-            no_update, no_update
-        ]
-
-    @app.callback(
-        Output("confirm_start", "displayed"),
-        Input("button_start", "n_clicks"),
-        prevent_initial_call=True
-    )
-    def cb_display_confirm_start(n_clicks):
-        return True
-
-    # ======================================================================================
-    #   Callbacks related to the save functionality
-    # ======================================================================================
-    # @app.callback(
-    #     Output("confirm_save", "displayed"),
-    #     Input("button_save", "n_clicks"),
-    #     prevent_initial_call=True
-    # )
-    # def cb_display_confirm_save(n_clicks):
-    #     return True
-
-    # @app.callback(
-    #     [
-    #         Output("main_div", "children", allow_duplicate=True),
-    #         Output("alert_main", "children", allow_duplicate=True),
-    #         Output("alert_main", "is_open", allow_duplicate=True)
-    #     ],
-    #         Input("confirm_save", "submit_n_clicks"),
-    #     prevent_initial_call=True
-    # )
-    # def cb_save_progess(submit_n_clicks):
-    #     global INITIALIZED
-    #     if not INITIALIZED:
-    #         return [no_update, "WARNING: You can't save your progess before having started!", True]
-    #     save_progress()
-    #     raise PreventUpdate
-
-    # @app.callback(
-    #     Output("button_autosave", "children"),
-    #     Input("button_autosave", "n_clicks"),
-    #     prevent_initial_call=True
-    # )
-    # def cb_toggle_autosave(n_clicks):
-    #     global AUTOSAVE
-    #     AUTOSAVE = not AUTOSAVE
-    #     if AUTOSAVE:
-    #         return "Autosave progress: Enabled"
-    #     return "Autosave progress: Disabled"
+# ===============================================================================================================================================
+#   MAIN
+# ===============================================================================================================================================
+if __name__ == "__main__":
 
+    signal.signal(signal.SIGTERM, lambda signum, frame: sys.exit(0))
 
     # Run the app
     app.run_server(debug=False)
 
+
@@ -0,0 +1,61 @@
+// Clientside navigation (NAVIGATION_MODE = "clientside" in app.py): "Previous" / "Next" show the images
+// prerendered by the server into the "store_window" store without a round trip. The server is only asked
+// (through "store_window_request") to move the window along when few images are left ahead or behind,
+// or to render the image itself if the browser has already run out of prerendered images.
+window.dash_clientside = Object.assign({}, window.dash_clientside, {
+    vizaod: {
+        navigate: function(nClicksPrevious, nClicksNext, windowData, keys, session) {
+            const noUpdate = window.dash_clientside.no_update;
+            if (!session || !session.n_images) {
+                throw window.dash_clientside.PreventUpdate;
+            }
+
+            const triggered = window.dash_clientside.callback_context.triggered.map(t => t.prop_id);
+            const step = triggered.includes("button_previous.n_clicks") ? -1 : 1;
+            keys = keys || [];
+
+            // In "changed pages only" mode, the window holds the changed images in navigation order, so the
+            // next image is the next one in the window (if it is not, wait for the server to move the window)
+            let idx;
+            const n = session.changed_only ? session.n_changed : session.n_images;
+            if (session.changed_only) {
+                const current = keys.indexOf(session.img_idx);
+                const next = current + step;
+                if (current >= 0 && keys.length >= n) {
+                    idx = keys[(next % keys.length + keys.length) % keys.length];
+                } else if (current >= 0 && next >= 0 && next < keys.length) {
+                    idx = keys[next];
+                } else {
+                    return [noUpdate, noUpdate, noUpdate, noUpdate, noUpdate, noUpdate, {idx: session.img_idx, render: false, time: Date.now()}];
+                }
+            } else {
+                idx = ((session.img_idx + step) % n + n) % n;
+            }
+            const newSession = Object.assign({}, session, {img_idx: idx});
+
+            const entries = (windowData && windowData.entries) || {};
+            const entry = entries[String(idx)];
+
+            // Position of the new image in the window and the number of prerendered images ahead of it
+            const position = keys.indexOf(idx);
+            const ahead = position < 0 ? 0 : keys.length - 1 - position;
+            const margin = session.window_margin || 0;
+            const complete = keys.length >= n;
+            const refill = !entry || (!complete && (position < 1 || ahead < margin));
+            const request = refill ? {idx: idx, render: !entry, time: Date.now()} : noUpdate;
+
+            if (!entry) {
+                return [noUpdate, noUpdate, noUpdate, noUpdate, noUpdate, newSession, request];
+            }
+            return [
+                entry.figure,
+                entry.table,
+                "Image Name: \"" + entry.image_name + "\"",
+                entry.status[0],
+                entry.status[1],
+                newSession,
+                request
+            ];
+        }
+    }
+});
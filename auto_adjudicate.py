@@ -0,0 +1,163 @@
+import os
+import time
+import argparse
+
+from concurrent.futures import ProcessPoolExecutor
+
+import numpy as np
+from tqdm import tqdm
+
+import annotation_db
+import annotation_store
+import review_dataset
+from box_matching import box_iou, encode_boxes, group_pairs, image_chunks
+
+
+# Minimum IoU of a predicted and a reference box of the same category to count as a match
+IOU_THRESHOLD   = 0.9
+
+# Number of images compared per task of the process pool
+CHUNK_IMAGES    = 1 << 14
+
+# Session ID recorded with the automatic decisions in the journal / database
+SESSION_ID      = "auto_adjudicate"
+
+
+def matching_images(task):
+    """Compares the predicted and reference boxes of a range of images.
+
+    The boxes are grouped by image and category ("group" = image * n_categories + category). Within each
+    group, the IoU matrix of all predicted and reference boxes is computed at once (as flat pairs). An image
+    matches if every group has as many predicted as reference boxes and every predicted box overlaps a
+    reference box (and every reference box a predicted box) with an IoU of at least threshold.
+
+    Args:
+        task (tuple): The number of images and categories, the groups and boxes of the predicted and of the
+            reference annotations, and the IoU threshold.
+
+    Returns:
+        numpy.ndarray: Whether each image matches.
+    """
+    n_images, n_categories, pred_groups, pred_boxes, ref_groups, ref_boxes, threshold = task
+    n_groups = n_images * n_categories
+    pred_counts = np.bincount(pred_groups, minlength=n_groups)
+    ref_counts = np.bincount(ref_groups, minlength=n_groups)
+
+    # Pair every predicted box with all reference boxes of its group
+    pred_idx, ref_idx = group_pairs(pred_groups, ref_groups, n_groups)
+    matches = box_iou(pred_boxes[pred_idx], ref_boxes[ref_idx]) >= threshold
+
+    pred_matched = np.bincount(pred_idx[matches], minlength=len(pred_groups)) > 0
+    ref_matched = np.bincount(ref_idx[matches], minlength=len(ref_groups)) > 0
+    groups_matched = (pred_counts == ref_counts) \
+        & (np.bincount(pred_groups[~pred_matched], minlength=n_groups) == 0) \
+        & (np.bincount(ref_groups[~ref_matched], minlength=n_groups) == 0)
+    return groups_matched.reshape(n_images, n_categories).all(axis=1)
+
+
+def comparison_tasks(pred_images, pred_categories, pred_boxes, ref_images, ref_categories, ref_boxes, n_images, n_categories,
+                     threshold, chunk_images):
+    """Yields the tasks of matching_images for consecutive ranges of chunk_images images (boxes sorted by image)."""
+    for first_image, n_chunk_images, pred, ref in image_chunks(pred_images, ref_images, n_images, chunk_images):
+        yield (
+            n_chunk_images,
+            n_categories,
+            (pred_images[pred] - first_image) * n_categories + pred_categories[pred],
+            pred_boxes[pred],
+            (ref_images[ref] - first_image) * n_categories + ref_categories[ref],
+            ref_boxes[ref],
+            threshold
+        )
+
+
+def open_dataset(path_annotations, path_approved="", path_discarded=""):
+    if annotation_db.is_database(path_annotations):
+        return annotation_db.DatabaseReviewDataset(path_annotations, path_approved, path_discarded)
+    return review_dataset.ReviewDataset(path_annotations, path_approved, path_discarded)
+
+
+def auto_adjudicate(path_annotations, path_reference, path_approved="", path_discarded="", threshold=IOU_THRESHOLD,
+                    n_workers=None, chunk_images=CHUNK_IMAGES, dry_run=False, tqdm_progress_bar=False):
+    """Approves the images whose predicted annotations match the reference annotations, so that only the
+    disagreements are left for reviewing.
+
+    The images without decision whose boxes all match a reference box of the same category (see
+    matching_images) are approved through the dataset, i.e. in the decision journal (or database) that
+    running instances of the app pick up, and then in the file of approved annotations.
+
+    Args:
+        path_annotations (str): The annotations to review (PATH_ANNOTATIONS, any format the app reads).
+        path_reference (str): The reference annotations, e.g. "initial.csv" or an earlier approved file.
+        path_approved (str, optional): The approved annotations (PATH_APPROVED).
+        path_discarded (str, optional): The discarded annotations (PATH_DISCARDED).
+        threshold (float, optional): Minimum IoU of matching boxes. Defaults to IOU_THRESHOLD.
+        n_workers (int, optional): Number of worker processes. Defaults to the number of CPUs.
+        dry_run (bool, optional): Only count the matching images, without approving them. Defaults to False.
+
+    Returns:
+        dict: Number of "images", "boxes", "matching" images, newly "approved" images, images left for
+            reviewing ("disagreements") and the elapsed "seconds".
+    """
+    start = time.perf_counter()
+    dataset = open_dataset(path_annotations, path_approved, path_discarded)
+    try:
+        annotations, img_names, img_offsets, decisions = dataset.review_annotations()
+        reference = annotation_store.read_ui_annotations(path_reference)
+
+        (pred_images, pred_categories, pred_boxes, ref_images, ref_categories, ref_boxes, _,
+         n_categories) = encode_boxes(annotations, img_names, img_offsets, reference)
+        tasks = comparison_tasks(pred_images, pred_categories, pred_boxes, ref_images, ref_categories, ref_boxes,
+                                 len(img_names), n_categories, threshold, chunk_images)
+
+        n_chunks = -(-len(img_names) // chunk_images)
+        n_workers = min(n_workers or os.cpu_count(), n_chunks)
+        if n_workers <= 1:
+            results = [matching_images(task) for task in tqdm(tasks, total=n_chunks, disable=not tqdm_progress_bar)]
+        else:
+            with ProcessPoolExecutor(max_workers=n_workers) as executor:
+                results = list(tqdm(executor.map(matching_images, tasks), total=n_chunks, disable=not tqdm_progress_bar))
+        matching = np.concatenate(results) if results else np.zeros(0, dtype=bool)
+
+        approve = matching & (decisions == review_dataset.DECISION_NONE)
+        if not dry_run and approve.any():
+            dataset.decide_many(list(img_names[approve]), review_dataset.DECISION_APPROVED, SESSION_ID)
+    finally:
+        dataset.close()
+
+    return {
+        "images": len(img_names),
+        "boxes": len(annotations),
+        "matching": int(matching.sum()),
+        "approved": int(approve.sum()),
+        "disagreements": int(((decisions == review_dataset.DECISION_NONE) & ~approve).sum()),
+        "seconds": time.perf_counter() - start
+    }
+
+
+if __name__ == "__main__":
+
+    # Parse and check the input arguments
+    parser = argparse.ArgumentParser(description="Approves the images whose predicted boxes match a reference set (by IoU and " + \
+                                         "category), so that only the disagreements are left for reviewing in the app.")
+    parser.add_argument("-i", "--input-file", dest="input_file", type=str, help="Annotations to review (PATH_ANNOTATIONS).", required=True)
+    parser.add_argument("-r", "--reference-file", dest="reference_file", type=str, help="Reference annotations, e.g. 'initial.csv' " + \
+                            "or the approved annotations of an earlier iteration.", required=True)
+    parser.add_argument("-a", "--approved-file", dest="approved_file", type=str, default="", help="Approved annotations (PATH_APPROVED).")
+    parser.add_argument("-d", "--discarded-file", dest="discarded_file", type=str, default="", help="Discarded annotations (PATH_DISCARDED).")
+    parser.add_argument("-t", "--threshold", dest="threshold", type=float, default=IOU_THRESHOLD, help="Minimum IoU of matching boxes.")
+    parser.add_argument("-w", "--workers", dest="workers", type=int, help="Number of worker processes. Defaults to the number of CPUs.", required=False)
+    parser.add_argument("-n", "--dry-run", dest="dry_run", action="store_true", help="Only count the matching images.")
+    args = parser.parse_args()
+
+    for path in [args.input_file, args.reference_file]:
+        if not os.path.exists(path):
+            print(f"Annotation file '{path}' does not exist!")
+            exit()
+    if not args.dry_run and not annotation_db.is_database(args.input_file) and args.approved_file == "":
+        print("The approved annotations file (-a) is required to store the decisions!")
+        exit()
+
+    stats = auto_adjudicate(args.input_file, args.reference_file, args.approved_file, args.discarded_file, args.threshold,
+                            args.workers, dry_run=args.dry_run, tqdm_progress_bar=True)
+    print(f"Compared {stats['boxes']} boxes of {stats['images']} images in {stats['seconds']:.1f}s: {stats['matching']} images match " + \
+          f"the reference, {stats['approved']} approved{' (dry run)' if args.dry_run else ''}, {stats['disagreements']} left for reviewing.")
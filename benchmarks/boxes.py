@@ -0,0 +1,76 @@
+"""
+Compares drawing the boxes of a page as one layout shape per box against one line trace per category
+(see app.box_traces): the time to build the figure on the server and the size of the serialized figure.
+
+The client render time can only be measured in a browser: with --html, a page per box count and method
+is written that logs the time Plotly.newPlot takes to the browser console (and shows it in the title).
+
+Usage (from the repository root):
+
+    python -m benchmarks.boxes
+"""
+import os
+import time
+import argparse
+
+import pandas as pd
+import plotly.graph_objs as go
+import plotly.io as pio
+
+import app
+from benchmarks.navigation import synthetic_annotations
+
+
+def shape_figure(anns, annotation_colors):
+    """The boxes as layout shapes, as drawn before box_traces."""
+    fig = go.Figure()
+    for xmin, ymin, width, height, category in zip(anns["bbox_xmin"].values, anns["bbox_ymin"].values,
+                                                  anns["bbox_width"].values, anns["bbox_height"].values, anns["category"].values):
+        fig.add_shape(type="rect", x0=xmin, y0=ymin, x1=xmin + width, y1=ymin + height,
+                      line=dict(color=annotation_colors[category], width=3))
+    return fig
+
+
+def trace_figure(anns, annotation_colors):
+    fig = go.Figure()
+    fig.add_traces(app.box_traces(anns, list(annotation_colors)))
+    return fig
+
+
+def time_build(build, anns, annotation_colors, repeat):
+    start = time.perf_counter()
+    for _ in range(repeat):
+        fig = build(anns, annotation_colors)
+    return (time.perf_counter() - start) / repeat, len(pio.to_json(fig))
+
+
+def write_html(fig, path):
+    """Writes a page that measures how long the browser takes to render the figure."""
+    script = ("var gd = document.getElementById('{plot_id}'); var start = performance.now(); Plotly.newPlot(gd, gd.data, gd.layout).then(function() {"
+              "var ms = (performance.now() - start).toFixed(1); console.log('render [ms]', ms); document.title = ms + ' ms'; });")
+    fig.update_xaxes(range=[0, 1000]).update_yaxes(range=[1000, 0])
+    fig.write_html(path, include_plotlyjs="cdn", post_script=script)
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Benchmark of drawing the boxes of a page.")
+    parser.add_argument("-s", "--sizes", dest="sizes", type=int, nargs="+", default=[10, 100, 300], help="Numbers of boxes per page (building the shapes grows quadratically).")
+    parser.add_argument("-r", "--repeat", dest="repeat", type=int, default=10, help="Number of figures built per size.")
+    parser.add_argument("--html", dest="html", type=str, help="Directory to write the pages measuring the client render time to.")
+    args = parser.parse_args()
+
+    if args.html:
+        os.makedirs(args.html, exist_ok=True)
+
+    print(f"{'boxes':>8} {'shapes [ms]':>12} {'traces [ms]':>12} {'shapes [kB]':>12} {'traces [kB]':>12}")
+    for n_boxes in args.sizes:
+        anns = synthetic_annotations(n_boxes, boxes_per_image=n_boxes)
+        annotation_colors = {category: app.COLORS[idx] for idx, category in enumerate(anns["category"].unique())}
+        # Category IDs as in the datasets of the app (see review_dataset.build_image_index)
+        anns["category"] = pd.Categorical(anns["category"], categories=list(annotation_colors))
+        shape_time, shape_size = time_build(shape_figure, anns, annotation_colors, args.repeat)
+        trace_time, trace_size = time_build(trace_figure, anns, annotation_colors, args.repeat)
+        print(f"{n_boxes:>8} {shape_time * 1000:>12.2f} {trace_time * 1000:>12.2f} {shape_size / 1024:>12.1f} {trace_size / 1024:>12.1f}")
+        if args.html:
+            write_html(shape_figure(anns, annotation_colors), os.path.join(args.html, f"shapes_{n_boxes}.html"))
+            write_html(trace_figure(anns, annotation_colors), os.path.join(args.html, f"traces_{n_boxes}.html"))
@@ -0,0 +1,163 @@
+"""
+Generates a synthetic dataset at a configurable scale: a COCO JSON file, the matching pipe-separated
+CSV file (as written by convert_to_csv.py, columns HEADER_COLUMNS) and placeholder page images.
+
+The data is generated and written in chunks of images, so that datasets with millions of boxes can
+be generated in bounded memory. All placeholder images are hard links to one rendered page.
+
+Usage (from the repository root):
+
+    python -m benchmarks.generate -o /tmp/vizaod_10k -n 10000
+"""
+import os
+import shutil
+import argparse
+
+import cv2
+import numpy as np
+import pandas as pd
+
+from convert_to_csv import HEADER_COLUMNS
+
+
+CATEGORIES = ["text", "title", "list", "table", "figure"]
+IMAGE_WIDTH     = 612
+IMAGE_HEIGHT    = 792
+
+
+def placeholder_image(width=IMAGE_WIDTH, height=IMAGE_HEIGHT, seed=42):
+    """Renders a page-like placeholder image (grey text lines on white)."""
+    rng = np.random.default_rng(seed)
+    img = np.full((height, width, 3), 255, dtype=np.uint8)
+    for y in range(height // 12, height - height // 12, 14):
+        x1 = int(width * rng.uniform(0.5, 0.92))
+        cv2.rectangle(img, (width // 12, y), (x1, y + 6), (90, 90, 90), -1)
+    return img
+
+
+def generate_chunk(rng, first_image, n_images, first_annotation, boxes_per_image, width, height):
+    """Generates the annotations of n_images consecutive images with the columns HEADER_COLUMNS."""
+    counts = rng.poisson(boxes_per_image, size=n_images).clip(1)
+    image_ids = np.repeat(np.arange(first_image, first_image + n_images), counts) + 1
+    n = len(image_ids)
+    category_ids = rng.integers(0, len(CATEGORIES), size=n) + 1
+    xmin = rng.uniform(0, width * 0.8, size=n).round(2)
+    ymin = rng.uniform(0, height * 0.9, size=n).round(2)
+    bbox_width = np.minimum(rng.uniform(5, width * 0.6, size=n), width - xmin).round(2)
+    bbox_height = np.minimum(rng.uniform(5, height * 0.1, size=n), height - ymin).round(2)
+    xmax, ymax = xmin + bbox_width, ymin + bbox_height
+    segmentation = [str([[x0, y0, x1, y0, x1, y1, x0, y1]]) for x0, y0, x1, y1 in zip(xmin.tolist(), ymin.tolist(), xmax.tolist(), ymax.tolist())]
+    return pd.DataFrame({
+        "image_name": [f"page_{image_id:08d}.jpg" for image_id in image_ids],
+        "image_id": image_ids,
+        "image_width": width,
+        "image_height": height,
+        "annotation_id": np.arange(first_annotation, first_annotation + n) + 1,
+        "category": np.array(CATEGORIES, dtype=object)[category_ids - 1],
+        "category_id": category_ids,
+        "iscrowd": 0,
+        "bbox_xmin": xmin,
+        "bbox_ymin": ymin,
+        "bbox_xmax": xmax,
+        "bbox_ymax": ymax,
+        "bbox_width": bbox_width,
+        "bbox_height": bbox_height,
+        "bbox_area": bbox_width * bbox_height,
+        "segmentation": segmentation,
+        "segmentation_area": bbox_width * bbox_height
+    }, columns=HEADER_COLUMNS)
+
+
+def coco_images(df):
+    images = df.drop_duplicates("image_id")
+    return [
+        f'{{"id": {image_id}, "file_name": "{image_name}", "width": {width}, "height": {height}}}'
+        for image_id, image_name, width, height in zip(images["image_id"].tolist(), images["image_name"].tolist(),
+                                                      images["image_width"].tolist(), images["image_height"].tolist())
+    ]
+
+
+def coco_annotations(df):
+    return [
+        f'{{"id": {ann_id}, "image_id": {image_id}, "category_id": {category_id}, "iscrowd": {iscrowd}, '
+        f'"bbox": [{x!r}, {y!r}, {w!r}, {h!r}], "segmentation": {segmentation}, "area": {area!r}}}'
+        for ann_id, image_id, category_id, iscrowd, x, y, w, h, segmentation, area in zip(
+            df["annotation_id"].tolist(), df["image_id"].tolist(), df["category_id"].tolist(), df["iscrowd"].tolist(),
+            df["bbox_xmin"].tolist(), df["bbox_ymin"].tolist(), df["bbox_width"].tolist(), df["bbox_height"].tolist(),
+            df["segmentation"].tolist(), df["segmentation_area"].tolist())
+    ]
+
+
+def link_images(path_images, image_names, source):
+    """Creates the placeholder images as hard links to source (copies where hard links are not supported)."""
+    for image_name in image_names:
+        path = os.path.join(path_images, image_name)
+        if os.path.exists(path):
+            continue
+        try:
+            os.link(source, path)
+        except OSError:
+            shutil.copyfile(source, path)
+
+
+def generate_dataset(out_dir, n_boxes, boxes_per_image=20, n_image_files=None, width=IMAGE_WIDTH, height=IMAGE_HEIGHT,
+                     seed=42, chunk_images=1 << 14):
+    """Generates a synthetic dataset of about n_boxes boxes.
+
+    Args:
+        out_dir (str): Output directory, receiving "annotations.json", "annotations.csv" and the directory "images".
+        n_boxes (int): Approximate number of boxes (the number of boxes per image is Poisson distributed).
+        boxes_per_image (int, optional): Mean number of boxes per image. Defaults to 20.
+        n_image_files (int, optional): Only create the placeholder images of the first images. Defaults to all.
+
+    Returns:
+        dict: The paths ("json", "csv", "images") and the numbers of "images" and "boxes".
+    """
+    rng = np.random.default_rng(seed)
+    path_images = os.path.join(out_dir, "images")
+    os.makedirs(path_images, exist_ok=True)
+    path_json = os.path.join(out_dir, "annotations.json")
+    path_csv = os.path.join(out_dir, "annotations.csv")
+    path_placeholder = os.path.join(out_dir, "placeholder.jpg")
+    cv2.imwrite(path_placeholder, placeholder_image(width, height))
+
+    n_images = max(1, round(n_boxes / boxes_per_image))
+    n_image_files = n_images if n_image_files is None else min(n_image_files, n_images)
+    n_annotations = 0
+
+    # The images and annotations are written to separate files first and then joined into one JSON object
+    path_annotations_part = path_json + ".annotations"
+    with open(path_json, "w") as file_json, open(path_annotations_part, "w") as file_annotations, open(path_csv, "w", newline="") as file_csv:
+        file_json.write('{"info": {"description": "VizAOD benchmark dataset"}, "images": [')
+        for first_image in range(0, n_images, chunk_images):
+            df = generate_chunk(rng, first_image, min(chunk_images, n_images - first_image), n_annotations, boxes_per_image, width, height)
+            separator = ", " if first_image else ""
+            file_json.write(separator + ", ".join(coco_images(df)))
+            file_annotations.write(separator + ", ".join(coco_annotations(df)))
+            df.to_csv(file_csv, sep="|", index=False, header=first_image == 0)
+            if first_image < n_image_files:
+                link_images(path_images, df["image_name"].drop_duplicates()[:n_image_files - first_image], path_placeholder)
+            n_annotations += len(df)
+
+        file_json.write('], "annotations": [')
+        file_annotations.close()
+        with open(path_annotations_part, "r") as file:
+            shutil.copyfileobj(file, file_json, 16 << 20)
+        categories = ", ".join(f'{{"id": {idx + 1}, "name": "{name}", "supercategory": ""}}' for idx, name in enumerate(CATEGORIES))
+        file_json.write(f'], "categories": [{categories}]}}')
+    os.remove(path_annotations_part)
+
+    return {"json": path_json, "csv": path_csv, "images": path_images, "n_images": n_images, "n_boxes": n_annotations}
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Generates a synthetic COCO JSON / CSV dataset with placeholder images.")
+    parser.add_argument("-o", "--output-dir", dest="output_dir", type=str, help="Output directory.", required=True)
+    parser.add_argument("-n", "--n-boxes", dest="n_boxes", type=int, default=10_000, help="Number of boxes.")
+    parser.add_argument("-b", "--boxes-per-image", dest="boxes_per_image", type=int, default=20, help="Mean number of boxes per image.")
+    parser.add_argument("--image-files", dest="image_files", type=int, help="Only create the first IMAGE_FILES placeholder images. Defaults to all.")
+    parser.add_argument("--seed", dest="seed", type=int, default=42, help="Random seed.")
+    args = parser.parse_args()
+
+    dataset = generate_dataset(args.output_dir, args.n_boxes, args.boxes_per_image, args.image_files, seed=args.seed)
+    print(f"Wrote {dataset['n_boxes']} boxes of {dataset['n_images']} images to '{args.output_dir}'.")
@@ -0,0 +1,61 @@
+"""
+Measures the latency of a single "Next image" click (navigation and table data) for
+growing numbers of annotations. With the image index, the latency should stay flat.
+
+Usage (from the repository root):
+
+    python -m benchmarks.navigation
+"""
+import os
+import time
+import argparse
+import tempfile
+
+import numpy as np
+import pandas as pd
+
+import app
+import annotation_store
+import review_dataset
+
+
+def synthetic_annotations(n_boxes, boxes_per_image=10, seed=42):
+    rng = np.random.default_rng(seed)
+    n_images = max(1, n_boxes // boxes_per_image)
+    image_ids = rng.integers(0, n_images, size=n_boxes)
+    return pd.DataFrame({
+        "image_name": [f"image_{idx:08d}.jpg" for idx in image_ids],
+        "category": rng.choice(["text", "title", "list", "table", "figure"], size=n_boxes),
+        "bbox_xmin": rng.uniform(0, 500, size=n_boxes),
+        "bbox_ymin": rng.uniform(0, 700, size=n_boxes),
+        "bbox_width": rng.uniform(5, 300, size=n_boxes),
+        "bbox_height": rng.uniform(5, 100, size=n_boxes)
+    })
+
+
+def time_clicks(dataset, n_clicks):
+    session = app.new_session("", dataset.path_annotations, "", "")
+    start = time.perf_counter()
+    for _ in range(n_clicks):
+        app.next_image(dataset, session, 1)
+        dataset.image_annotations(app.current_image(dataset, session))[app.TABLE_COLS].to_dict("records")
+    return (time.perf_counter() - start) / n_clicks
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Benchmark of the navigation latency.")
+    parser.add_argument("-s", "--sizes", dest="sizes", type=int, nargs="+", default=[10_000, 100_000, 1_000_000], help="Numbers of boxes.")
+    parser.add_argument("-n", "--n-clicks", dest="n_clicks", type=int, default=200, help="Number of clicks per size.")
+    args = parser.parse_args()
+
+    print(f"{'boxes':>12} {'index build [s]':>16} {'click [ms]':>12}")
+    with tempfile.TemporaryDirectory() as tmp_dir:
+        for n_boxes in args.sizes:
+            df = synthetic_annotations(n_boxes)
+            start = time.perf_counter()
+            review_dataset.build_image_index(df)
+            build_time = time.perf_counter() - start
+            path = os.path.join(tmp_dir, f"annotations_{n_boxes}.parquet")
+            annotation_store.write_annotations(df, path)
+            dataset = review_dataset.ReviewDataset(path)
+            print(f"{n_boxes:>12} {build_time:>16.3f} {time_clicks(dataset, args.n_clicks) * 1000:>12.3f}")
@@ -0,0 +1,50 @@
+"""
+Compares the start-up time (loading the annotations and building the image index) and the memory
+held for the annotations of the pipe-separated CSV path against the memory-mapped Parquet and
+Feather paths.
+
+Usage (from the repository root):
+
+    python -m benchmarks.startup
+"""
+import os
+import time
+import argparse
+import tempfile
+
+import numpy as np
+
+import annotation_store
+import review_dataset
+from benchmarks.navigation import synthetic_annotations
+
+
+def with_segmentation(df, n_vertices=40, seed=42):
+    rng = np.random.default_rng(seed)
+    vertices = rng.uniform(0, 800, size=(len(df), n_vertices)).round(2)
+    df["segmentation"] = ["[[" + ", ".join(map(str, row)) + "]]" for row in vertices]
+    return df
+
+
+def time_startup(path):
+    start = time.perf_counter()
+    dataset = review_dataset.ReviewDataset(path)
+    return dataset, time.perf_counter() - start
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Benchmark of the start-up time per annotation file format.")
+    parser.add_argument("-s", "--sizes", dest="sizes", type=int, nargs="+", default=[100_000, 1_000_000], help="Numbers of boxes.")
+    args = parser.parse_args()
+
+    print(f"{'boxes':>12} {'format':>8} {'file [MB]':>10} {'start-up [s]':>13} {'resident [MB]':>14}")
+    with tempfile.TemporaryDirectory() as tmp_dir:
+        for n_boxes in args.sizes:
+            df = with_segmentation(synthetic_annotations(n_boxes))
+            for extension in [".csv", ".parquet", ".feather"]:
+                path = os.path.join(tmp_dir, f"annotations_{n_boxes}{extension}")
+                annotation_store.write_annotations(df, path)
+                size = os.path.getsize(path) / 2 ** 20
+                dataset, seconds = time_startup(path)
+                resident = (dataset.annotations.memory_usage(deep=True).sum() + dataset.row_ids.nbytes + dataset.img_offsets.nbytes) / 2 ** 20
+                print(f"{n_boxes:>12} {extension[1:]:>8} {size:>10.1f} {seconds:>13.3f} {resident:>14.1f}")
@@ -0,0 +1,194 @@
+"""
+Runs the benchmarks of the key paths of VizAOD on synthetic datasets (see benchmarks/generate.py) and
+writes the results as JSON, so that they can be compared across releases:
+
+    - conversion: COCO JSON to CSV with the columnar and the streaming converter
+    - start: cb_start_verifying (loading the annotations, building the image index and the first figure)
+    - navigation: next_image, image_figure and the table data per "Next" click
+    - decisions: approving / discarding images (journal appends) and save_progress
+    - adjudication: the IoU pre-pass of auto_adjudicate.py against the annotations themselves (all images match)
+    - the peak resident memory after each stage (each dataset size runs in a fresh process)
+
+Usage (from the repository root):
+
+    python -m benchmarks.suite -n 10000 100000 -o results.json
+"""
+import os
+import sys
+import json
+import time
+import platform
+import argparse
+import tempfile
+import subprocess
+import multiprocessing
+
+from concurrent.futures import ProcessPoolExecutor
+
+import numpy as np
+
+try:
+    import resource
+except ImportError:
+    # Not available on Windows, where the peak memory is not reported
+    resource = None
+
+import app
+import convert_to_csv
+import auto_adjudicate
+import review_dataset
+from benchmarks.generate import generate_dataset
+
+
+BENCHMARKS = ["conversion", "start", "navigation", "decisions", "adjudication"]
+
+
+def peak_memory_mb():
+    """Returns the peak resident memory of this process in MB (None where unknown)."""
+    if resource is None:
+        return None
+    peak = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    # Kilobytes on Linux, bytes on macOS
+    return peak / 2 ** 20 if sys.platform == "darwin" else peak / 2 ** 10
+
+
+def latency_stats(seconds):
+    milliseconds = np.asarray(seconds) * 1000
+    return {
+        "n": len(milliseconds),
+        "mean_ms": float(milliseconds.mean()),
+        "p50_ms": float(np.percentile(milliseconds, 50)),
+        "p95_ms": float(np.percentile(milliseconds, 95)),
+        "max_ms": float(milliseconds.max())
+    }
+
+
+def bench_conversion(dataset, tmp_dir):
+    results = {}
+    start = time.perf_counter()
+    df = convert_to_csv.convert_coco_json_to_columns(dataset["json"])
+    convert_to_csv.write_output(df, os.path.join(tmp_dir, "converted_columnar.csv"))
+    seconds = time.perf_counter() - start
+    results["columnar"] = {"seconds": seconds, "rows_per_second": len(df) / seconds}
+    del df
+    stats = convert_to_csv.convert_coco_json_to_csv_streaming(dataset["json"], os.path.join(tmp_dir, "converted_streaming.csv"))
+    results["streaming"] = {"seconds": stats["seconds"], "rows_per_second": stats["rows_per_second"]}
+    return results
+
+
+def start_session(dataset, tmp_dir):
+    """Starts a review session like the "Start" button, returning the session and the elapsed seconds."""
+    app.shutdown()
+    app.IMAGE_CACHE.clear()
+    start = time.perf_counter()
+    outputs = app.cb_start_verifying(
+        1,
+        dataset["images"],
+        dataset["csv"],
+        os.path.join(tmp_dir, "approved.csv"),
+        os.path.join(tmp_dir, "discarded.csv"),
+        "",
+        False,
+        "file",
+        None
+    )
+    seconds = time.perf_counter() - start
+    return outputs[8], seconds
+
+
+def bench_navigation(session, n_clicks):
+    dataset = app.get_dataset(session)
+    seconds = []
+    for _ in range(n_clicks):
+        start = time.perf_counter()
+        app.next_image(dataset, session, 1)
+        image_name = app.current_image(dataset, session)
+        app.image_figure(dataset, session["path_images"], image_name)
+        dataset.image_annotations(image_name)[app.TABLE_COLS].to_dict("records")
+        seconds.append(time.perf_counter() - start)
+    return latency_stats(seconds)
+
+
+def bench_decisions(session, n_decisions):
+    dataset = app.get_dataset(session)
+    seconds = []
+    for idx in range(n_decisions):
+        decision = review_dataset.DECISION_APPROVED if idx % 2 == 0 else review_dataset.DECISION_DISCARDED
+        start = time.perf_counter()
+        dataset.decide(app.current_image(dataset, session), decision, session["session_id"])
+        app.next_image(dataset, session, 1)
+        seconds.append(time.perf_counter() - start)
+    start = time.perf_counter()
+    dataset.save_progress()
+    return {"decide": latency_stats(seconds), "save_progress_seconds": time.perf_counter() - start}
+
+
+def bench_adjudication(dataset):
+    stats = auto_adjudicate.auto_adjudicate(dataset["csv"], dataset["csv"], dry_run=True)
+    return {"seconds": stats["seconds"], "boxes_per_second": stats["boxes"] / stats["seconds"], "matching": stats["matching"]}
+
+
+def run(n_boxes, data_dir, benchmarks, n_clicks, n_image_files):
+    """Generates a dataset of n_boxes boxes in data_dir and runs the given benchmarks on it."""
+    start = time.perf_counter()
+    dataset = generate_dataset(data_dir, n_boxes, n_image_files=n_image_files)
+    results = {"n_boxes": dataset["n_boxes"], "n_images": dataset["n_images"], "generate_seconds": time.perf_counter() - start}
+
+    with tempfile.TemporaryDirectory() as tmp_dir:
+        # Register the image directories of the sessions in the temporary directory, not in the working directory
+        app.IMAGE_ROOTS_DIR = os.path.join(tmp_dir, "image_roots")
+        if "conversion" in benchmarks:
+            results["conversion"] = bench_conversion(dataset, tmp_dir)
+            results["conversion"]["peak_memory_mb"] = peak_memory_mb()
+        if {"start", "navigation", "decisions"} & set(benchmarks):
+            session, seconds = start_session(dataset, tmp_dir)
+            results["start"] = {"seconds": seconds, "peak_memory_mb": peak_memory_mb()}
+            if "navigation" in benchmarks:
+                results["navigation"] = bench_navigation(session, n_clicks)
+                results["navigation"]["peak_memory_mb"] = peak_memory_mb()
+            if "decisions" in benchmarks:
+                results["decisions"] = bench_decisions(session, n_clicks)
+                results["decisions"]["peak_memory_mb"] = peak_memory_mb()
+            app.shutdown()
+        if "adjudication" in benchmarks:
+            results["adjudication"] = bench_adjudication(dataset)
+            results["adjudication"]["peak_memory_mb"] = peak_memory_mb()
+    return results
+
+
+def environment():
+    try:
+        commit = subprocess.run(["git", "rev-parse", "HEAD"], capture_output=True, text=True, check=True).stdout.strip()
+    except (OSError, subprocess.CalledProcessError):
+        commit = None
+    return {
+        "commit": commit,
+        "timestamp": time.strftime("%Y-%m-%dT%H:%M:%S%z"),
+        "python": platform.python_version(),
+        "platform": platform.platform(),
+        "cpus": os.cpu_count()
+    }
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Benchmark suite of the key paths on synthetic datasets.")
+    parser.add_argument("-n", "--n-boxes", dest="n_boxes", type=int, nargs="+", default=[10_000, 100_000], help="Dataset sizes (numbers of boxes).")
+    parser.add_argument("-b", "--benchmarks", dest="benchmarks", type=str, nargs="+", choices=BENCHMARKS, default=BENCHMARKS, help="Benchmarks to run.")
+    parser.add_argument("-c", "--clicks", dest="clicks", type=int, default=100, help="Number of clicks / decisions per dataset.")
+    parser.add_argument("-d", "--data-dir", dest="data_dir", type=str, help="Directory to keep the generated datasets in. Defaults to a temporary directory.")
+    parser.add_argument("-o", "--output", dest="output", type=str, default="benchmark_results.json", help="Output JSON file.")
+    args = parser.parse_args()
+
+    report = {"environment": environment(), "results": []}
+    with tempfile.TemporaryDirectory() as tmp_dir:
+        for n_boxes in args.n_boxes:
+            data_dir = os.path.join(args.data_dir or tmp_dir, f"boxes_{n_boxes}")
+            # Only the images visited by the navigation and decision benchmarks are needed
+            with ProcessPoolExecutor(max_workers=1, mp_context=multiprocessing.get_context("spawn")) as executor:
+                results = executor.submit(run, n_boxes, data_dir, args.benchmarks, args.clicks, 2 * args.clicks + app.IMAGE_PREFETCH + 1).result()
+            report["results"].append(results)
+            print(json.dumps(results))
+
+    with open(args.output, "w") as file:
+        json.dump(report, file, indent=2)
+    print(f"Wrote the results to '{args.output}'.")
@@ -0,0 +1,90 @@
+import numpy as np
+
+
+def box_corners(annotations):
+    """Returns the boxes of the annotations as (x0, y0, x1, y1) rows."""
+    x0 = annotations["bbox_xmin"].to_numpy(dtype=np.float64)
+    y0 = annotations["bbox_ymin"].to_numpy(dtype=np.float64)
+    return np.column_stack([x0, y0, x0 + annotations["bbox_width"].to_numpy(dtype=np.float64), y0 + annotations["bbox_height"].to_numpy(dtype=np.float64)])
+
+
+def box_iou(boxes_a, boxes_b):
+    """Returns the IoU of each pair of boxes (rows of boxes_a and boxes_b, as (x0, y0, x1, y1))."""
+    width = np.clip(np.minimum(boxes_a[:, 2], boxes_b[:, 2]) - np.maximum(boxes_a[:, 0], boxes_b[:, 0]), 0, None)
+    height = np.clip(np.minimum(boxes_a[:, 3], boxes_b[:, 3]) - np.maximum(boxes_a[:, 1], boxes_b[:, 1]), 0, None)
+    intersection = width * height
+    area_a = (boxes_a[:, 2] - boxes_a[:, 0]) * (boxes_a[:, 3] - boxes_a[:, 1])
+    area_b = (boxes_b[:, 2] - boxes_b[:, 0]) * (boxes_b[:, 3] - boxes_b[:, 1])
+    union = area_a + area_b - intersection
+    return np.divide(intersection, union, out=np.zeros_like(intersection), where=union > 0)
+
+
+def group_pairs(groups_a, groups_b, n_groups):
+    """Returns all pairs of boxes of a and b in the same group (e.g. image and category) as flat index arrays.
+
+    Grouping keeps the number of pairs close to the number of boxes: only the boxes of one category on
+    one page are compared with each other.
+
+    Returns:
+        tuple: The indexes into a and into b of each pair.
+    """
+    order_b = np.argsort(groups_b, kind="stable")
+    counts_b = np.bincount(groups_b, minlength=n_groups)
+    starts_b = np.cumsum(counts_b) - counts_b
+    n_pairs = counts_b[groups_a]
+    idx_a = np.repeat(np.arange(len(groups_a)), n_pairs)
+    idx_b = np.arange(n_pairs.sum()) - np.repeat(np.cumsum(n_pairs) - n_pairs - starts_b[groups_a], n_pairs)
+    return idx_a, order_b[idx_b]
+
+
+def image_chunks(images_a, images_b, n_images, chunk_images):
+    """Splits two sets of boxes sorted by image position into ranges of chunk_images images.
+
+    Yields:
+        tuple: The first image and number of images of each range and the slices of a and b belonging to it.
+    """
+    bounds = np.arange(0, n_images + chunk_images, chunk_images).clip(None, n_images)
+    bounds_a = np.searchsorted(images_a, bounds)
+    bounds_b = np.searchsorted(images_b, bounds)
+    for chunk, first_image in enumerate(range(0, n_images, chunk_images)):
+        yield first_image, min(chunk_images, n_images - first_image), \
+            slice(bounds_a[chunk], bounds_a[chunk + 1]), slice(bounds_b[chunk], bounds_b[chunk + 1])
+
+
+def encode_boxes(annotations, img_names, img_offsets, other):
+    """Encodes the boxes of a dataset (grouped by image, see ReviewDataset.review_annotations) and of other
+    annotations for matching: the images by their position in the dataset and the categories of both by
+    one set of codes, in which boxes without category have their own (last) code. The boxes of other images
+    than those of the dataset are left out.
+
+    Returns:
+        tuple: The image positions, category codes and boxes of the dataset, the same for the other boxes
+            (sorted by image position), the rows of the other annotations they belong to and the number of categories.
+    """
+    # The image names of the dataset are interned by position (see review_dataset.build_image_index); only the
+    # unique image names and categories of the other annotations are looked up, the dataset keeps its IDs
+    img_index = annotations["image_name"].cat.categories
+    other_names = other["image_name"].astype("category")
+    other_images = img_index.get_indexer(other_names.cat.categories)[other_names.cat.codes.to_numpy()]
+    other_images[other_names.cat.codes.to_numpy() < 0] = -1
+    other_rows = np.flatnonzero(other_images >= 0)
+    other_rows = other_rows[np.argsort(other_images[other_rows], kind="stable")]
+    other_categories = other["category"].astype("category").iloc[other_rows]
+    categories = annotations["category"].cat.categories
+    new_categories = other_categories.cat.categories
+    categories = categories.append(new_categories[~new_categories.isin(categories)])
+    codes = categories.get_indexer(new_categories)[other_categories.cat.codes.to_numpy()]
+    # A missing category has the code -1, which would put the box into the group of the last category of the previous
+    # image (the boxes are grouped by image * n_categories + category), so these boxes get the code after the categories
+    n_categories = len(categories) + 1
+    dataset_codes = annotations["category"].cat.codes.to_numpy(dtype=np.int64)
+    return (
+        np.repeat(np.arange(len(img_names)), np.diff(img_offsets)),
+        np.where(dataset_codes < 0, n_categories - 1, dataset_codes),
+        box_corners(annotations),
+        other_images[other_rows].astype(np.int64),
+        np.where(other_categories.cat.codes.to_numpy() < 0, n_categories - 1, codes).astype(np.int64),
+        box_corners(other.iloc[other_rows]),
+        other_rows,
+        n_categories
+    )
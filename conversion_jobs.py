@@ -0,0 +1,299 @@
+import os
+import json
+import time
+import uuid
+import argparse
+import functools
+import threading
+import traceback
+
+from concurrent.futures import ProcessPoolExecutor
+from concurrent.futures.process import BrokenProcessPool
+
+import convert_to_csv
+
+
+# States of a conversion job; a job in one of FINISHED_STATES does not change anymore
+QUEUED      = "queued"
+RUNNING     = "running"
+DONE        = "done"
+FAILED      = "failed"
+CANCELLED   = "cancelled"
+FINISHED_STATES = {DONE, FAILED, CANCELLED}
+
+# Minimum number of seconds between two progress updates written to the job store
+PROGRESS_INTERVAL = 0.5
+
+# Conversion methods that can be cancelled while running. The columnar conversion parses the JSON file at once
+# and only checks for cancellation before and after that, so its jobs can only be cancelled while queued
+CANCELLABLE_METHODS = {"streaming"}
+
+
+class JobCancelled(Exception):
+    pass
+
+
+def remove_file(path):
+    try:
+        os.remove(path)
+    except FileNotFoundError:
+        pass
+
+
+def process_alive(pid):
+    """Returns whether the process with the given ID is running (only checked on POSIX systems, elsewhere it is assumed to be)."""
+    if os.name != "posix":
+        return True
+    try:
+        os.kill(pid, 0)
+    except ProcessLookupError:
+        return False
+    except PermissionError:
+        pass
+    return True
+
+
+def partial_output(job):
+    """Returns the temporary file a job writes its output to (see run_job)."""
+    root, extension = os.path.splitext(job["output"])
+    return f"{root}.{job['id']}.part{extension}"
+
+
+def cancellable(job):
+    """Returns whether a job can (still) be cancelled, see CANCELLABLE_METHODS."""
+    return job["state"] == QUEUED or (job["state"] == RUNNING and job["method"] in CANCELLABLE_METHODS)
+
+
+class JobStore:
+    """Local, disk-backed store of conversion jobs.
+
+    Every job is a JSON file "<job_id>.json" in the store directory, replaced atomically on every update, so
+    that all processes (the worker processes and every worker of the app server) see the same jobs. After
+    its creation, a job is only updated by the process running it; cancelling a job creates the marker file
+    "<job_id>.cancel" that the running process checks.
+    """
+
+    def __init__(self, directory):
+        self.directory = directory
+        os.makedirs(directory, exist_ok=True)
+
+    def _path(self, job_id, extension=".json"):
+        return os.path.join(self.directory, job_id + extension)
+
+    def _write(self, job):
+        tmp_path = self._path(job["id"], f".{os.getpid()}.{threading.get_ident()}.tmp")
+        with open(tmp_path, "w") as file:
+            json.dump(job, file)
+        os.replace(tmp_path, self._path(job["id"]))
+
+    def create(self, input_path, output_path, fmt="csv", method="streaming"):
+        """Creates a queued job converting the COCO JSON file input_path into output_path and returns it."""
+        job = {
+            "id": uuid.uuid4().hex,
+            "input": input_path,
+            "output": output_path,
+            "format": fmt,
+            "method": method,
+            "state": QUEUED,
+            "created": time.time(),
+            "started": None,
+            "finished": None,
+            "fraction": 0.0,
+            "rows": 0,
+            "rows_per_second": 0.0,
+            "error": None
+        }
+        self._write(job)
+        return job
+
+    def get(self, job_id):
+        """Returns the job with the given ID, or None if it does not exist."""
+        try:
+            with open(self._path(job_id), "r") as file:
+                return json.load(file)
+        except (FileNotFoundError, ValueError):
+            return None
+
+    def update(self, job_id, **fields):
+        job = self.get(job_id)
+        job.update(fields)
+        self._write(job)
+        return job
+
+    def poll(self, job_id):
+        """Returns the job with the given ID like get, marking it as failed first if it is running but the
+        process running it has exited (e.g. killed or out of memory), or None if it does not exist.
+        """
+        job = self.get(job_id)
+        if job is not None and job["state"] == RUNNING and job.get("pid") is not None and not process_alive(job["pid"]):
+            remove_file(partial_output(job))
+            job = self.update(job_id, state=FAILED, finished=time.time(), error=f"The worker process {job['pid']} has exited unexpectedly.")
+        return job
+
+    def jobs(self):
+        """Returns all jobs (see poll), the most recent first."""
+        jobs = [self.poll(name[:-5]) for name in os.listdir(self.directory) if name.endswith(".json")]
+        return sorted((job for job in jobs if job is not None), key=lambda job: job["created"], reverse=True)
+
+    def cancel(self, job_id):
+        """Requests the cancellation of a job (taking effect at its next progress update)."""
+        job = self.get(job_id)
+        if job is not None and job["state"] not in FINISHED_STATES:
+            open(self._path(job_id, ".cancel"), "a").close()
+
+    def cancel_requested(self, job_id):
+        return os.path.exists(self._path(job_id, ".cancel"))
+
+    def remove(self, job_id):
+        remove_file(self._path(job_id))
+        remove_file(self._path(job_id, ".cancel"))
+
+
+class ProgressReporter:
+    """Progress callback of the converters writing the progress of a job to the store (at most every
+    PROGRESS_INTERVAL seconds) and raising JobCancelled once the job has been cancelled."""
+
+    def __init__(self, store, job_id):
+        self.store = store
+        self.job_id = job_id
+        self.start = time.time()
+        self.last_update = 0.0
+
+    def __call__(self, fraction, rows):
+        if self.store.cancel_requested(self.job_id):
+            raise JobCancelled()
+        now = time.time()
+        if now - self.last_update >= PROGRESS_INTERVAL:
+            self.last_update = now
+            self.store.update(self.job_id, fraction=fraction, rows=rows, rows_per_second=rows / max(now - self.start, 1e-9))
+
+
+def run_job(directory, job_id):
+    """Runs a conversion job of the store in the given directory (in a worker process).
+
+    The output is written to a temporary file next to the output file, which replaces the output file once
+    the conversion has finished, so that a cancelled or failed conversion leaves the output file untouched.
+    """
+    store = JobStore(directory)
+    job = store.get(job_id)
+    if job is None:
+        return
+    if store.cancel_requested(job_id):
+        store.update(job_id, state=CANCELLED, finished=time.time())
+        return
+
+    reporter = ProgressReporter(store, job_id)
+    store.update(job_id, state=RUNNING, started=reporter.start, pid=os.getpid())
+    tmp_path = partial_output(job)
+    try:
+        if job["method"] == "streaming":
+            stats = convert_to_csv.convert_coco_json_to_csv_streaming(job["input"], tmp_path, progress_callback=reporter)
+            rows = stats["rows"]
+        else:
+            df = convert_to_csv.convert_coco_json_to_columns(job["input"], progress_callback=reporter)
+            convert_to_csv.write_output(df, tmp_path, job["format"])
+            rows = len(df)
+        os.replace(tmp_path, job["output"])
+    except JobCancelled:
+        remove_file(tmp_path)
+        store.update(job_id, state=CANCELLED, finished=time.time())
+        return
+    except Exception:
+        remove_file(tmp_path)
+        store.update(job_id, state=FAILED, finished=time.time(), error=traceback.format_exc())
+        return
+
+    finished = time.time()
+    store.update(job_id, state=DONE, finished=finished, fraction=1.0, rows=rows, rows_per_second=rows / max(finished - reporter.start, 1e-9))
+
+
+class JobRunner:
+    """Runs the jobs of a store in a pool of worker processes, several conversions in parallel."""
+
+    def __init__(self, store, n_workers=2):
+        self.store = store
+        self.n_workers = n_workers
+        self._executor = None
+        self._futures = {}
+        self._lock = threading.Lock()
+
+    def submit(self, input_path, output_path, fmt="csv", method="streaming"):
+        """Creates a job and queues it for the worker processes, returning its ID."""
+        job = self.store.create(input_path, output_path, fmt, method)
+        with self._lock:
+            # Started on the first job, so that the worker processes are not forked before they are needed
+            if self._executor is None:
+                self._executor = ProcessPoolExecutor(max_workers=self.n_workers)
+            try:
+                future = self._executor.submit(run_job, self.store.directory, job["id"])
+            except BrokenProcessPool:
+                # A worker process has died (see _job_done), which makes the pool unusable
+                self._executor.shutdown(wait=False)
+                self._executor = ProcessPoolExecutor(max_workers=self.n_workers)
+                future = self._executor.submit(run_job, self.store.directory, job["id"])
+            future.add_done_callback(functools.partial(self._job_done, job["id"]))
+            self._futures[job["id"]] = future
+            self._futures = {job_id: future for job_id, future in self._futures.items() if not future.done()}
+        return job["id"]
+
+    def _job_done(self, job_id, future):
+        """Marks a job as failed if it has not finished in its worker process (e.g. the process was killed or ran
+        out of memory, which breaks the pool)."""
+        if future.cancelled() or future.exception() is None:
+            return
+        job = self.store.get(job_id)
+        if job is not None and job["state"] not in FINISHED_STATES:
+            error = "".join(traceback.format_exception(type(future.exception()), future.exception(), future.exception().__traceback__))
+            remove_file(partial_output(job))
+            self.store.update(job_id, state=FAILED, finished=time.time(), error=error)
+
+    def shutdown(self):
+        """Cancels the unfinished jobs of this runner and stops the worker processes."""
+        with self._lock:
+            for job_id in self._futures:
+                self.store.cancel(job_id)
+            if self._executor is not None:
+                self._executor.shutdown(wait=True, cancel_futures=True)
+                self._executor = None
+            for job_id, future in self._futures.items():
+                job = self.store.get(job_id)
+                if future.cancelled() and job is not None and job["state"] == QUEUED:
+                    self.store.update(job_id, state=CANCELLED, finished=time.time())
+            self._futures = {}
+
+
+def job_summary(job):
+    """Returns a one-line description of the state and progress of a job."""
+    if job["state"] == QUEUED:
+        return f"Queued: {job['input']}"
+    if job["state"] == RUNNING:
+        return f"Converting {job['input']}: {job['fraction']:.0%} done, {job['rows']:,} rows ({job['rows_per_second']:,.0f} rows/s)"
+    if job["state"] == DONE:
+        return f"Wrote {job['rows']:,} rows to {job['output']} in {job['finished'] - job['started']:.1f}s ({job['rows_per_second']:,.0f} rows/s)"
+    if job["state"] == CANCELLED:
+        return f"Cancelled: {job['input']}"
+    return f"Failed: {job['input']}"
+
+
+if __name__ == "__main__":
+
+    # Parse and check the input arguments
+    parser = argparse.ArgumentParser(description="Lists and cancels the conversion jobs of the VizAOD application.")
+    parser.add_argument("-j", "--jobs-dir", dest="jobs_dir", type=str, default=".vizaod_jobs", help="Directory of the job store " + \
+                            "(CONVERSION_JOBS_DIR of the app).")
+    parser.add_argument("-c", "--cancel", dest="cancel", type=str, nargs="+", default=[], help="IDs of the jobs to cancel.")
+    parser.add_argument("-p", "--prune", dest="prune", action="store_true", help="Remove the finished jobs from the store.")
+    args = parser.parse_args()
+
+    if not os.path.isdir(args.jobs_dir):
+        print(f"Job directory '{args.jobs_dir}' does not exist!")
+        exit()
+
+    store = JobStore(args.jobs_dir)
+    for job_id in args.cancel:
+        store.cancel(job_id)
+    for job in store.jobs():
+        if args.prune and job["state"] in FINISHED_STATES:
+            store.remove(job["id"])
+            continue
+        print(f"{job['id']}  {job['state']:<9}  {job_summary(job)}")
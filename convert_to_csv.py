@@ -1,13 +1,19 @@
 import pandas as pd
+import numpy as np
 import json
 import argparse
 import os
+import time
+import tempfile
 
 from io import StringIO
-from csv import writer
+from csv import writer, reader
+from operator import itemgetter
 
 from tqdm import tqdm
 
+import annotation_store
+
 
 HEADER_COLUMNS = [
     "image_name",
@@ -29,6 +35,32 @@ HEADER_COLUMNS = [
     "segmentation_area"
 ]
 
+# Output formats and their file extensions (Parquet and Feather require pyarrow)
+OUTPUT_FORMATS = {
+    "csv": ".csv",
+    "parquet": ".parquet",
+    "feather": ".feather"
+}
+
+# Fraction of the streaming conversion spent reading the JSON file (the rest sorts the buckets), for progress reporting
+READ_FRACTION = 0.8
+
+
+def output_format(output_file):
+    """Infers the output format from the file extension (defaulting to the pipe-separated CSV)."""
+    return annotation_store.file_format(output_file)
+
+
+def write_output(df, output_file, fmt=None):
+    """Writes the converted annotations as pipe-separated CSV, Parquet or Feather file.
+
+    Args:
+        df (pandas.DataFrame): The converted annotations.
+        output_file (str): Path to the output file.
+        fmt (str, optional): One of OUTPUT_FORMATS. Defaults to the format given by the file extension.
+    """
+    annotation_store.write_annotations(df, output_file, fmt)
+
 
 def convert_coco_json_to_csv(input_json_file, tqdm_progress_bar=False):
     """_summary_
@@ -111,6 +143,311 @@ def convert_coco_json_to_csv(input_json_file, tqdm_progress_bar=False):
     return df
 
 
+def convert_coco_json_to_columns(input_json_file, progress_callback=None):
+    """Converts COCO JSON annotations to the CSV columns using vectorized NumPy operations.
+
+    The annotation fields are extracted into arrays once; sorting by image, the lookup of image and
+    category attributes and the derived bbox columns are computed on whole arrays instead of per row.
+
+    Args:
+        input_json_file (str): Path to the COCO JSON file.
+        progress_callback (callable, optional): Called as progress_callback(fraction, rows) after loading the JSON
+            file and after the conversion (not in between, the JSON file is parsed at once). Defaults to None.
+
+    Returns:
+        pandas.DataFrame: The annotations with the columns HEADER_COLUMNS, sorted by image ID.
+    """
+    with open(input_json_file, "r") as file:
+        json_dict = json.load(file)
+    images = json_dict["images"]
+    annotations = json_dict["annotations"]
+    categories = json_dict["categories"]
+    n_annotations = len(annotations)
+    if progress_callback is not None:
+        progress_callback(0.6, n_annotations)
+
+    # Image and category attributes, sorted by their IDs for the lookups below
+    image_ids = np.fromiter(map(itemgetter("id"), images), dtype=np.int64, count=len(images))
+    image_order = np.argsort(image_ids, kind="stable")
+    image_ids = image_ids[image_order]
+    image_names = np.array([images[idx]["file_name"] for idx in image_order], dtype=object)
+    image_widths = np.fromiter((images[idx]["width"] for idx in image_order), dtype=np.int64, count=len(images))
+    image_heights = np.fromiter((images[idx]["height"] for idx in image_order), dtype=np.int64, count=len(images))
+    category_ids = np.fromiter(map(itemgetter("id"), categories), dtype=np.int64, count=len(categories))
+    category_order = np.argsort(category_ids, kind="stable")
+    category_ids = category_ids[category_order]
+    category_names = np.array([categories[idx]["name"] for idx in category_order], dtype=object)
+
+    # Annotation fields, sorted by image ID (keeping the order of the annotations within an image)
+    ann_image_ids = np.fromiter(map(itemgetter("image_id"), annotations), dtype=np.int64, count=n_annotations)
+    order = np.argsort(ann_image_ids, kind="stable")
+    ann_image_ids = ann_image_ids[order]
+    image_pos = np.minimum(np.searchsorted(image_ids, ann_image_ids), max(len(image_ids) - 1, 0))
+    known = image_ids[image_pos] == ann_image_ids if len(image_ids) else np.zeros(n_annotations, dtype=bool)
+    order, ann_image_ids, image_pos = order[known], ann_image_ids[known], image_pos[known]
+
+    ann_ids = np.fromiter(map(itemgetter("id"), annotations), dtype=np.int64, count=n_annotations)[order]
+    ann_category_ids = np.fromiter(map(itemgetter("category_id"), annotations), dtype=np.int64, count=n_annotations)[order]
+    iscrowd = np.fromiter(map(itemgetter("iscrowd"), annotations), dtype=np.int64, count=n_annotations)[order]
+    area = np.fromiter(map(itemgetter("area"), annotations), dtype=np.float64, count=n_annotations)[order]
+    bbox = np.array(list(map(itemgetter("bbox"), annotations)), dtype=np.float64).reshape(n_annotations, 4)[order]
+    segmentation = [str(annotations[idx]["segmentation"]) for idx in order]
+    category_pos = np.searchsorted(category_ids, ann_category_ids)
+    if progress_callback is not None:
+        progress_callback(0.8, n_annotations)
+
+    return pd.DataFrame({
+        "image_name": image_names[image_pos],
+        "image_id": ann_image_ids,
+        "image_width": image_widths[image_pos],
+        "image_height": image_heights[image_pos],
+        "annotation_id": ann_ids,
+        "category": category_names[category_pos],
+        "category_id": ann_category_ids,
+        "iscrowd": iscrowd,
+        "bbox_xmin": bbox[:, 0],
+        "bbox_ymin": bbox[:, 1],
+        "bbox_xmax": bbox[:, 0] + bbox[:, 2],
+        "bbox_ymax": bbox[:, 1] + bbox[:, 3],
+        "bbox_width": bbox[:, 2],
+        "bbox_height": bbox[:, 3],
+        "bbox_area": bbox[:, 2] * bbox[:, 3],
+        "segmentation": segmentation,
+        "segmentation_area": area
+    }, columns=HEADER_COLUMNS)
+
+
+class JsonStreamReader:
+    """Incremental reader for a JSON file whose top level is an object.
+
+    Only one element of the top-level arrays is held in memory at a time; the file is read in chunks.
+    """
+
+    def __init__(self, file, chunk_size=1 << 20):
+        self.file = file
+        self.chunk_size = chunk_size
+        self.decoder = json.JSONDecoder()
+        self.buffer = ""
+        self.pos = 0
+        self.eof = False
+        self.bytes_read = 0
+
+    def _fill(self, size):
+        if self.eof:
+            return False
+        chunk = self.file.read(size)
+        if not chunk:
+            self.eof = True
+            return False
+        self.bytes_read += len(chunk.encode("utf-8"))
+        self.buffer = self.buffer[self.pos:] + chunk
+        self.pos = 0
+        return True
+
+    def _peek(self):
+        while True:
+            while self.pos < len(self.buffer) and self.buffer[self.pos] in " \t\n\r":
+                self.pos += 1
+            if self.pos < len(self.buffer):
+                return self.buffer[self.pos]
+            if not self._fill(self.chunk_size):
+                raise ValueError("Unexpected end of the JSON file!")
+
+    def _expect(self, char):
+        if self._peek() != char:
+            raise ValueError(f"Expected '{char}' at position {self.bytes_read - len(self.buffer) + self.pos} of the JSON file!")
+        self.pos += 1
+
+    def _value(self):
+        self._peek()
+        size = self.chunk_size
+        while True:
+            try:
+                value, end = self.decoder.raw_decode(self.buffer, self.pos)
+                # A number at the end of the buffer might continue in the next chunk
+                if end < len(self.buffer) or self.eof:
+                    self.pos = end
+                    return value
+            except json.JSONDecodeError:
+                if self.eof:
+                    raise
+            self._fill(size)
+            size *= 2
+
+    def items(self, array_keys):
+        """Yields (key, value) pairs of the top-level object.
+
+        Args:
+            array_keys (iterable): Keys of top-level arrays whose elements are yielded one by one as (key, element).
+        """
+        self._expect("{")
+        if self._peek() == "}":
+            return
+        while True:
+            key = self._value()
+            self._expect(":")
+            if key in array_keys and self._peek() == "[":
+                self.pos += 1
+                if self._peek() == "]":
+                    self.pos += 1
+                else:
+                    while True:
+                        yield key, self._value()
+                        if self._peek() == "]":
+                            self.pos += 1
+                            break
+                        self._expect(",")
+            else:
+                yield key, self._value()
+            if self._peek() == "}":
+                return
+            self._expect(",")
+
+
+def convert_coco_json_to_csv_streaming(input_json_file, output_csv_file, tqdm_progress_bar=False, chunk_size=1 << 20, bucket_size=64 << 20,
+                                       progress_callback=None):
+    """Converts COCO JSON annotations to the CSV format in bounded memory.
+
+    The JSON file is parsed incrementally. The annotations are partitioned into temporary bucket files
+    by the rank of their image ID and every bucket is sorted on its own (an external sort), so the rows
+    are grouped and ordered by image ID even if the annotations in the JSON file are not. Only the
+    images and categories (not the annotations) are held in memory.
+
+    Args:
+        input_json_file (str): Path to the COCO JSON file.
+        output_csv_file (str): Path to the CSV file that is written.
+        tqdm_progress_bar (bool, optional): Whether to show a progress bar. Defaults to False.
+        chunk_size (int, optional): Number of characters read from the JSON file at once. Defaults to 1 MiB.
+        bucket_size (int, optional): Approximate size in bytes of the annotations sorted in memory at once. Defaults to 64 MiB.
+        progress_callback (callable, optional): Called as progress_callback(fraction, rows) with the fraction of the work
+            done and the number of annotations read, once per chunk read and once per bucket written. Exceptions raised
+            by it abort the conversion (e.g. to cancel it). Defaults to None.
+
+    Returns:
+        dict: Number of rows written, skipped annotations (unknown image ID), seconds and rows per second.
+    """
+    start = time.perf_counter()
+    file_size = os.path.getsize(input_json_file)
+    n_buckets = max(1, min(256, file_size // bucket_size))
+
+    id_to_category = {}
+    images = {}
+    id_to_rank = None
+    images_per_bucket = 1
+    seq = 0
+    skipped = 0
+
+    output_dir = os.path.dirname(os.path.abspath(output_csv_file))
+    with tempfile.TemporaryDirectory(dir=output_dir) as tmp_dir, open(input_json_file, "r") as file:
+        bucket_files = [open(os.path.join(tmp_dir, f"bucket_{idx}.csv"), "w", newline="") for idx in range(n_buckets)]
+        bucket_writers = [writer(bucket_file, delimiter="|") for bucket_file in bucket_files]
+        spill_file = None
+
+        def bucket_ranks():
+            nonlocal id_to_rank, images_per_bucket
+            id_to_rank = {image_id: rank for rank, image_id in enumerate(sorted(images))}
+            images_per_bucket = max(1, -(-len(images) // n_buckets))
+
+        def write_bucketed(row):
+            nonlocal skipped
+            rank = id_to_rank.get(row[0])
+            if rank is None:
+                skipped += 1
+                return
+            row[0] = rank
+            bucket_writers[rank // images_per_bucket].writerow(row)
+
+        stream = JsonStreamReader(file, chunk_size)
+        bytes_reported = 0
+        progress = tqdm(total=file_size, unit="B", unit_scale=True) if tqdm_progress_bar else None
+        for key, value in stream.items(("images", "annotations", "categories")):
+            if key == "categories":
+                id_to_category[value["id"]] = value["name"]
+            elif key == "images":
+                images[value["id"]] = (value["file_name"], value["width"], value["height"])
+            elif key == "annotations":
+                bbox = value["bbox"]
+                row = [
+                    value["image_id"],                          # rank of the image (replaced when bucketing)
+                    seq,                                        # position in the JSON file
+                    value["id"],                                # annotation_id
+                    value["category_id"],                       # category_id
+                    value["iscrowd"],                           # iscrowd
+                    bbox[0],                                    # bbox_xmin
+                    bbox[1],                                    # bbox_ymin
+                    bbox[0] + bbox[2],                          # bbox_xmax
+                    bbox[1] + bbox[3],                          # bbox_ymax
+                    bbox[2],                                    # bbox_width
+                    bbox[3],                                    # bbox_height
+                    bbox[2] * bbox[3],                          # bbox_area
+                    value["segmentation"],                      # segmentation
+                    value["area"]                               # segmentation_area
+                ]
+                seq += 1
+                if images and spill_file is None:
+                    # The images are known: bucket the annotation right away
+                    if id_to_rank is None:
+                        bucket_ranks()
+                    write_bucketed(row)
+                else:
+                    # The images follow the annotations: spill the annotation and bucket it later
+                    if spill_file is None:
+                        spill_file = open(os.path.join(tmp_dir, "spill.csv"), "w+", newline="")
+                        spill_writer = writer(spill_file, delimiter="|")
+                    spill_writer.writerow(row)
+            if progress is not None:
+                progress.update(stream.bytes_read - progress.n)
+            if progress_callback is not None and stream.bytes_read != bytes_reported:
+                # Reading and bucketing the annotations takes most of the time, sorting the buckets the rest
+                bytes_reported = stream.bytes_read
+                progress_callback(READ_FRACTION * bytes_reported / max(file_size, 1), seq)
+        if progress is not None:
+            progress.close()
+
+        if spill_file is not None:
+            bucket_ranks()
+            spill_file.seek(0)
+            for row in reader(spill_file, delimiter="|"):
+                row[0] = int(row[0])
+                write_bucketed(row)
+            spill_file.close()
+        for bucket_file in bucket_files:
+            bucket_file.close()
+
+        # Sort every bucket by image and write the final rows
+        n_rows = 0
+        image_by_rank = sorted(images.items())
+        with open(output_csv_file, "w", newline="") as output:
+            csv_writer = writer(output, delimiter="|")
+            csv_writer.writerow(HEADER_COLUMNS)
+            for idx in range(n_buckets):
+                with open(os.path.join(tmp_dir, f"bucket_{idx}.csv"), "r", newline="") as bucket_file:
+                    rows = list(reader(bucket_file, delimiter="|"))
+                rows.sort(key=lambda row: (int(row[0]), int(row[1])))
+                for row in rows:
+                    image_id, (file_name, width, height) = image_by_rank[int(row[0])]
+                    csv_writer.writerow([
+                        file_name,                              # image_name
+                        image_id,                               # image_id
+                        width,                                  # image_width
+                        height,                                 # image_height
+                        row[2],                                 # annotation_id
+                        id_to_category[int(row[3])],            # category
+                        *row[3:]                                # category_id ... segmentation_area
+                    ])
+                n_rows += len(rows)
+                if progress_callback is not None:
+                    progress_callback(READ_FRACTION + (1 - READ_FRACTION) * (idx + 1) / n_buckets, seq)
+
+    seconds = time.perf_counter() - start
+    return {
+        "rows": n_rows,
+        "skipped": skipped,
+        "seconds": seconds,
+        "rows_per_second": n_rows / seconds if seconds > 0 else float("inf")
+    }
+
+
 # For usage as a standalone script
 if __name__ == "__main__":
     
@@ -119,6 +456,12 @@ if __name__ == "__main__":
     parser.add_argument("-i", "--input-json-file", dest="input_json_file", type=str, help="Input JSON file.", required=True)
     parser.add_argument("-o", "--output-csv-file", dest="output_csv_file", type=str, help="Output CSV file. Defaults to the " + \
                             "name of the input JSON file (with .csv extension instead of .json)", required=False)
+    parser.add_argument("-s", "--streaming", dest="streaming", action="store_true", help="Parse the JSON file incrementally " + \
+                            "and write the rows straight to the CSV file in bounded memory (for very large files).")
+    parser.add_argument("-c", "--columnar", dest="columnar", action="store_true", help="Use the vectorized columnar " + \
+                            "conversion (fast, but holds the whole JSON file in memory).")
+    parser.add_argument("-f", "--format", dest="format", type=str, choices=list(OUTPUT_FORMATS), help="Output format. " + \
+                            "Defaults to the extension of the output file (csv if unknown). Parquet and Feather imply --columnar.", required=False)
     args = parser.parse_args()
     input_json_file = args.input_json_file
     output_csv_file = args.output_csv_file
@@ -128,7 +471,12 @@ if __name__ == "__main__":
         exit()
 
     if not output_csv_file:
-        output_csv_file = f"{input_json_file[:-5]}.csv"
+        output_csv_file = f"{input_json_file[:-5]}{OUTPUT_FORMATS[args.format or 'csv']}"
+    fmt = args.format or output_format(output_csv_file)
+
+    if args.streaming and fmt != "csv":
+        print(f"The streaming conversion only writes CSV files, not '{fmt}'!")
+        exit()
 
     print(f"Converting annotations from '{input_json_file}' to '{output_csv_file}' ...")
 
@@ -136,7 +484,21 @@ if __name__ == "__main__":
         print(f"WARNING: This will overwrite the contents of '{output_csv_file}'!")
         input("Press ENTER to contine, CTRL+C to cancel ...")
 
+    if args.streaming:
+        stats = convert_coco_json_to_csv_streaming(input_json_file, output_csv_file, True)
+        print(f"Wrote {stats['rows']} rows in {stats['seconds']:.1f}s ({stats['rows_per_second']:.0f} rows/s).")
+        if stats["skipped"]:
+            print(f"WARNING: Skipped {stats['skipped']} annotations referring to unknown image IDs!")
+        exit()
+
+    if args.columnar or fmt != "csv":
+        start = time.perf_counter()
+        df = convert_coco_json_to_columns(input_json_file)
+        write_output(df, output_csv_file, fmt)
+        seconds = time.perf_counter() - start
+        print(f"Wrote {len(df)} rows in {seconds:.1f}s ({len(df) / max(seconds, 1e-9):.0f} rows/s).")
+        exit()
+
     df = convert_coco_json_to_csv(input_json_file, True)
 
     df.to_csv(output_csv_file, sep="|", index=False)
-
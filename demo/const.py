@@ -10,6 +10,9 @@ PATH_MODEL          = os.path.join(PATH_SSOD, "model")
 PATH_IMAGES         = os.path.join(PATH_SSOD, "images")
 PATH_INITIAL        = os.path.join(PATH_MODEL, "initial.csv")
 
+# ".csv", ".parquet" or ".feather"
+PREDICTIONS_EXTENSION = ".csv"
+
 N_SAMPLES       = 18
 N_INITIAL       = 10
 N_PER_ITERATION = 4
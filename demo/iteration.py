@@ -5,19 +5,22 @@ Used for the demonstration video. Fakes an iteration step, "predicting" correct
 which can later be approved or discarded by the tool.
 """
 import os
+import sys
 import pandas as pd
 import numpy as np
 
 from const import *
 
-subsample = pd.read_csv(PATH_SUBSAMPLE, sep="|", low_memory=False)
-initial = pd.read_csv(PATH_INITIAL, sep="|", low_memory=False)
+sys.path.append(os.path.join(os.path.dirname(os.path.abspath(__file__)), ".."))
+from annotation_store import read_annotations, write_annotations
 
-# Initial and approved contain images already labeled
-labeled = initial
+subsample = read_annotations(PATH_SUBSAMPLE)
+
+# Initial and approved contain images already labeled (only their image names are needed)
+labeled = read_annotations(PATH_INITIAL, columns=["image_name"])
 next_idx = 0
 for approved in sorted([os.path.join(PATH_MODEL, f) for f in os.listdir(PATH_MODEL) if "approved" in f], key=lambda x: int(x.split("_")[1])):
-    labeled = pd.concat([labeled, pd.read_csv(approved, sep="|")])
+    labeled = pd.concat([labeled, read_annotations(approved, columns=["image_name"])])
     next_idx += 1
 
 # Sample from the remaining images
@@ -38,4 +41,4 @@ drop_indices = np.random.choice(index_altered, 10, replace=False)
 next_sample = next_sample.drop(drop_indices).reset_index(drop=True)
 
 # Save next sample (fake iteration)
-next_sample.to_csv(os.path.join(PATH_MODEL, f"predictions_{next_idx}.csv"), sep="|", index=False)
+write_annotations(next_sample, os.path.join(PATH_MODEL, f"predictions_{next_idx}{PREDICTIONS_EXTENSION}"))
@@ -0,0 +1,133 @@
+import os
+import threading
+
+from collections import OrderedDict
+from concurrent.futures import ThreadPoolExecutor
+
+import cv2
+
+
+def load_image(image_path):
+    """Reads an image from disk and converts it to RGB.
+
+    Args:
+        image_path (str): Path to the image.
+
+    Returns:
+        numpy.ndarray: The RGB image or None if it could not be read.
+    """
+    img = cv2.imread(image_path)
+    if img is None:
+        return None
+    return cv2.cvtColor(img, cv2.COLOR_BGR2RGB)
+
+
+def value_size(value):
+    """Estimates the memory used by a cached value (decoded arrays and encoded bytes)."""
+    if value is None:
+        return 0
+    if hasattr(value, "nbytes"):
+        return value.nbytes
+    return len(value)
+
+
+class ImageCache:
+    """Bounded, memory-capped LRU cache for page images keyed by path and mtime.
+
+    Neighbouring images can be prefetched by a thread pool. Requests for an image that is still
+    being prefetched wait for the running load instead of decoding it a second time.
+    """
+
+    def __init__(self, max_bytes=1 << 30, n_workers=2):
+        self.max_bytes = max_bytes
+        self.n_bytes = 0
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+        self.prefetches = 0
+        self._entries = OrderedDict()
+        self._pending = {}
+        self._lock = threading.Lock()
+        self._executor = ThreadPoolExecutor(max_workers=n_workers, thread_name_prefix="image_cache")
+
+    @staticmethod
+    def key(image_path, tag=""):
+        try:
+            mtime = os.stat(image_path).st_mtime_ns
+        except OSError:
+            return None
+        return (image_path, mtime, tag)
+
+    def get(self, image_path, loader=load_image, tag=""):
+        """Returns the cached value for the given image, loading (and caching) it on a miss.
+
+        Args:
+            image_path (str): Path to the image.
+            loader (callable, optional): Function computing the value from the path. Defaults to load_image.
+            tag (str, optional): Distinguishes several values (e.g. resolutions) cached for the same image.
+
+        Returns:
+            The value returned by the loader or None if the image does not exist.
+        """
+        key = self.key(image_path, tag)
+        if key is None:
+            return None
+        with self._lock:
+            if key in self._entries:
+                self._entries.move_to_end(key)
+                self.hits += 1
+                return self._entries[key]
+            future = self._pending.get(key)
+            if future is not None:
+                self.hits += 1
+            else:
+                self.misses += 1
+        if future is not None:
+            return future.result()
+        return self._load(key, loader)
+
+    def prefetch(self, image_paths, loader=load_image, tag=""):
+        """Loads the given images in the background unless they are cached or already being loaded."""
+        for image_path in image_paths:
+            key = self.key(image_path, tag)
+            if key is None:
+                continue
+            with self._lock:
+                if key in self._entries or key in self._pending:
+                    continue
+                self.prefetches += 1
+                self._pending[key] = self._executor.submit(self._load, key, loader)
+
+    def stats(self):
+        with self._lock:
+            return {
+                "entries": len(self._entries),
+                "bytes": self.n_bytes,
+                "max_bytes": self.max_bytes,
+                "hits": self.hits,
+                "misses": self.misses,
+                "evictions": self.evictions,
+                "prefetches": self.prefetches
+            }
+
+    def clear(self):
+        with self._lock:
+            self._entries.clear()
+            self.n_bytes = 0
+
+    def _load(self, key, loader):
+        value = None
+        try:
+            value = loader(key[0])
+        finally:
+            size = value_size(value)
+            with self._lock:
+                self._pending.pop(key, None)
+                if value is not None and size <= self.max_bytes and key not in self._entries:
+                    self._entries[key] = value
+                    self.n_bytes += size
+                    while self.n_bytes > self.max_bytes:
+                        _, evicted = self._entries.popitem(last=False)
+                        self.n_bytes -= value_size(evicted)
+                        self.evictions += 1
+        return value
@@ -0,0 +1,145 @@
+import math
+import base64
+
+import cv2
+import numpy as np
+
+
+MIME_TYPES = {
+    "jpg": "image/jpeg",
+    "webp": "image/webp"
+}
+
+QUALITY_FLAGS = {
+    "jpg": cv2.IMWRITE_JPEG_QUALITY,
+    "webp": cv2.IMWRITE_WEBP_QUALITY
+}
+
+
+class EncodedImage:
+    """Compressed (part of a) page image together with the region it covers in original pixels."""
+
+    __slots__ = ("source", "x", "y", "width", "height", "scale")
+
+    def __init__(self, source, x, y, width, height, scale):
+        self.source = source
+        self.x = x
+        self.y = y
+        self.width = width
+        self.height = height
+        self.scale = scale
+
+    @property
+    def nbytes(self):
+        return len(self.source)
+
+    def layout_image(self):
+        """Returns the image as a Plotly layout image placed on the original-pixel axes."""
+        return dict(
+            source=self.source,
+            xref="x",
+            yref="y",
+            x=self.x,
+            y=self.y,
+            sizex=self.width,
+            sizey=self.height,
+            sizing="stretch",
+            layer="below",
+            visible=True
+        )
+
+
+def pyramid_level(size, target_size):
+    """Returns the coarsest pyramid level (downscaled by 2 ** level) that still has at least target_size pixels.
+
+    Args:
+        size (int): Size of the (region of the) image in original pixels.
+        target_size (int): Number of pixels needed for displaying it.
+
+    Returns:
+        int: The pyramid level.
+    """
+    if size <= target_size:
+        return 0
+    return int(math.floor(math.log2(size / target_size)))
+
+
+def downscale(img, level):
+    if level == 0:
+        return img
+    height, width = img.shape[:2]
+    return cv2.resize(img, (max(1, width >> level), max(1, height >> level)), interpolation=cv2.INTER_AREA)
+
+
+def resize_to(img, target_size):
+    """Downscales the image so that its longer side has target_size pixels.
+
+    Returns:
+        tuple: The (possibly unchanged) image and the scale (original pixels per resulting pixel).
+    """
+    height, width = img.shape[:2]
+    scale = max(height, width) / target_size
+    if scale <= 1:
+        return img, 1.0
+    level = pyramid_level(max(height, width), target_size)
+    img = downscale(img, level)
+    img = cv2.resize(img, (max(1, round(width / scale)), max(1, round(height / scale))), interpolation=cv2.INTER_AREA)
+    return img, scale
+
+
+def data_uri(buffer, fmt="jpg"):
+    """Returns the data URI of an encoded image."""
+    return f"data:{MIME_TYPES[fmt]};base64," + base64.b64encode(buffer).decode("ascii")
+
+
+def encode_bytes(img, fmt="jpg", quality=85):
+    """Compresses an RGB image and returns the encoded file content."""
+    ok, buffer = cv2.imencode("." + fmt, cv2.cvtColor(img, cv2.COLOR_RGB2BGR), [QUALITY_FLAGS[fmt], quality])
+    if not ok:
+        raise ValueError(f"Could not encode the image as '{fmt}'!")
+    return buffer.tobytes()
+
+
+def encode(img, fmt="jpg", quality=85):
+    """Compresses an RGB image and returns it as a data URI."""
+    return data_uri(encode_bytes(img, fmt, quality), fmt)
+
+
+def render_preview(img, target_size, fmt="jpg", quality=85):
+    """Encodes the whole page with target_size pixels on its longer side."""
+    height, width = img.shape[:2]
+    img, scale = resize_to(img, target_size)
+    return EncodedImage(encode(img, fmt, quality), 0, 0, width, height, scale)
+
+
+def render_region(img, x0, y0, x1, y1, target_size, fmt="jpg", quality=85, pixel_scale=(1.0, 1.0)):
+    """Encodes the region [x0, x1) x [y0, y1) (in original pixels) of the page with target_size pixels.
+
+    The image can also be a downscaled version of the page (e.g. a pyramid level), with pixel_scale
+    original pixels per pixel of the image in x and y direction.
+    """
+    scale_x, scale_y = pixel_scale
+    x0, y0 = int(math.floor(x0 / scale_x)), int(math.floor(y0 / scale_y))
+    x1, y1 = int(math.ceil(x1 / scale_x)), int(math.ceil(y1 / scale_y))
+    crop, scale = resize_to(img[y0:y1, x0:x1], target_size)
+    return EncodedImage(encode(crop, fmt, quality), x0 * scale_x, y0 * scale_y, (x1 - x0) * scale_x, (y1 - y0) * scale_y, scale * max(scale_x, scale_y))
+
+
+def render_thumbnail(img, boxes, colors, target_size, fmt="jpg", quality=85, thickness=2):
+    """Encodes the page with target_size pixels on its longer side and the given boxes drawn onto it.
+
+    Args:
+        img (numpy.ndarray): The RGB image.
+        boxes (numpy.ndarray): Boxes as rows (xmin, ymin, width, height) in original pixels.
+        colors (list): RGB color (tuple of ints) of each box.
+
+    Returns:
+        EncodedImage: The thumbnail.
+    """
+    height, width = img.shape[:2]
+    thumbnail, scale = resize_to(img, target_size)
+    # Draw onto a copy (resize_to returns small images unchanged)
+    thumbnail = thumbnail.copy()
+    for (x, y, w, h), color in zip(np.asarray(boxes, dtype=np.float64) / scale, colors):
+        cv2.rectangle(thumbnail, (int(round(x)), int(round(y))), (int(round(x + w)), int(round(y + h))), color, thickness)
+    return EncodedImage(encode(thumbnail, fmt, quality), 0, 0, width, height, scale)
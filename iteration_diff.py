@@ -0,0 +1,203 @@
+import os
+import time
+import argparse
+
+import numpy as np
+
+import annotation_db
+import annotation_store
+import review_dataset
+from box_matching import box_iou, encode_boxes, group_pairs, image_chunks
+
+
+# Change of a box between two iterations of predictions
+UNCHANGED   = 0
+MOVED       = 1
+ADDED       = 2
+REMOVED     = 3
+STATUS_NAMES = {UNCHANGED: "unchanged", MOVED: "moved", ADDED: "added", REMOVED: "removed"}
+
+# Boxes of the same category with an IoU of at least MATCH_IOU are the same box in both iterations; with
+# an IoU of at least UNCHANGED_IOU it has not changed, otherwise it has moved (or been resized)
+MATCH_IOU       = 0.5
+UNCHANGED_IOU   = 0.95
+
+# Number of images matched at once (bounds the memory of the box pairs)
+CHUNK_IMAGES    = 1 << 14
+
+
+def match_boxes(groups_a, boxes_a, groups_b, boxes_b, n_groups, min_iou):
+    """Matches the boxes of a and b one-to-one within their groups, preferring the pairs with the highest IoU.
+
+    All pairs of a group with an IoU of at least min_iou are candidates. In each round, the pairs whose boxes
+    are each other's best candidate are matched and the candidates of the matched boxes are dropped, until
+    no candidates are left. This yields the same matching as greedily taking the pair with the highest IoU
+    (ties broken by position), but every round is vectorized; a few rounds suffice in practice.
+
+    Returns:
+        tuple: The matched box of b for each box of a (-1 if none) and its IoU, and the matched box of a for each box of b.
+    """
+    idx_a, idx_b = group_pairs(groups_a, groups_b, n_groups)
+    iou = box_iou(boxes_a[idx_a], boxes_b[idx_b])
+    candidates = iou >= min_iou
+    idx_a, idx_b, iou = idx_a[candidates], idx_b[candidates], iou[candidates]
+
+    partner_a = np.full(len(groups_a), -1, dtype=np.int64)
+    partner_b = np.full(len(groups_b), -1, dtype=np.int64)
+    partner_iou = np.zeros(len(groups_a))
+    while len(idx_a):
+        # Best candidate of each box (highest IoU, then lowest position)
+        best_a = np.full(len(groups_a), -1, dtype=np.int64)
+        order = np.lexsort((idx_b, -iou, idx_a))
+        first = np.r_[True, idx_a[order][1:] != idx_a[order][:-1]]
+        best_a[idx_a[order][first]] = idx_b[order][first]
+        best_b = np.full(len(groups_b), -1, dtype=np.int64)
+        order = np.lexsort((idx_a, -iou, idx_b))
+        first = np.r_[True, idx_b[order][1:] != idx_b[order][:-1]]
+        best_b[idx_b[order][first]] = idx_a[order][first]
+
+        mutual = (best_a[idx_a] == idx_b) & (best_b[idx_b] == idx_a)
+        partner_a[idx_a[mutual]] = idx_b[mutual]
+        partner_b[idx_b[mutual]] = idx_a[mutual]
+        partner_iou[idx_a[mutual]] = iou[mutual]
+        remaining = (partner_a[idx_a] < 0) & (partner_b[idx_b] < 0)
+        idx_a, idx_b, iou = idx_a[remaining], idx_b[remaining], iou[remaining]
+    return partner_a, partner_iou, partner_b
+
+
+class IterationDiff:
+    """The changes of the predicted boxes of a dataset since a previous iteration of predictions.
+
+    Holds the status of each box of the dataset (grouped by image like the dataset) and the boxes of the
+    previous iteration that have moved or been removed (grouped by image position in the dataset).
+    """
+
+    def __init__(self, img_names, img_index, img_offsets, status, previous_offsets, previous_boxes, previous_status, n_removed_other):
+        self.img_names = img_names
+        # Lookup from image name to position, shared with the dataset (see review_dataset.build_image_index)
+        self.img_index = img_index
+        self.img_offsets = img_offsets
+        self.status = status
+        self.previous_offsets = previous_offsets
+        self.previous_boxes = previous_boxes
+        self.previous_status = previous_status
+        # Boxes of the previous iteration on images without predictions in this one
+        self.n_removed_other = n_removed_other
+
+        n_images = len(img_names)
+        changed = np.bincount(np.repeat(np.arange(n_images), np.diff(img_offsets)), weights=status != UNCHANGED, minlength=n_images) > 0
+        changed |= np.bincount(np.repeat(np.arange(n_images), np.diff(previous_offsets)), weights=previous_status == REMOVED, minlength=n_images) > 0
+        # Positions of the images with any change, in the order of the dataset
+        self.changed = np.flatnonzero(changed)
+
+    def image_changes(self, image_name):
+        """Returns the changes of an image: the status of its boxes (in the order of the dataset) and the boxes
+        of the previous iteration (as (x0, y0, x1, y1) rows) with their status, or None if the image is unknown.
+        """
+        try:
+            idx = self.img_index.get_loc(image_name)
+        except KeyError:
+            return None
+        previous = slice(self.previous_offsets[idx], self.previous_offsets[idx + 1])
+        return self.status[self.img_offsets[idx]:self.img_offsets[idx + 1]], self.previous_boxes[previous], self.previous_status[previous]
+
+    def stats(self):
+        """Returns the number of boxes by status and of (changed) images."""
+        counts = np.bincount(self.status, minlength=len(STATUS_NAMES))
+        return {
+            "images": len(self.img_names),
+            "changed_images": len(self.changed),
+            "unchanged": int(counts[UNCHANGED]),
+            "moved": int(counts[MOVED]),
+            "added": int(counts[ADDED]),
+            "removed": int((self.previous_status == REMOVED).sum()) + self.n_removed_other
+        }
+
+
+def diff_annotations(annotations, img_names, img_offsets, previous, match_iou=MATCH_IOU, unchanged_iou=UNCHANGED_IOU, chunk_images=CHUNK_IMAGES):
+    """Matches the boxes of a dataset with those of the previous iteration and classifies them as unchanged,
+    moved, added or removed (boxes of another category count as removed and added).
+
+    Args:
+        annotations (pandas.DataFrame): The annotations of the dataset, grouped by image (see ReviewDataset.review_annotations).
+        img_names (numpy.ndarray): The image names of the dataset.
+        img_offsets (numpy.ndarray): The row offsets of the annotations of each image.
+        previous (pandas.DataFrame): The annotations of the previous iteration (UI_COLUMNS).
+
+    Returns:
+        IterationDiff: The changes.
+    """
+    images, categories, boxes, previous_images, previous_categories, previous_boxes, previous_rows, n_categories = \
+        encode_boxes(annotations, img_names, img_offsets, previous)
+
+    status = np.full(len(images), ADDED, dtype=np.int8)
+    previous_status = np.full(len(previous_images), REMOVED, dtype=np.int8)
+    for first_image, n_images, current, former in image_chunks(images, previous_images, len(img_names), chunk_images):
+        partner, iou, previous_partner = match_boxes(
+            (images[current] - first_image) * n_categories + categories[current], boxes[current],
+            (previous_images[former] - first_image) * n_categories + previous_categories[former], previous_boxes[former],
+            n_images * n_categories, match_iou
+        )
+        chunk_status = np.where(partner < 0, ADDED, np.where(iou >= unchanged_iou, UNCHANGED, MOVED)).astype(np.int8)
+        status[current] = chunk_status
+        previous_status[former] = np.where(previous_partner < 0, REMOVED, chunk_status[previous_partner.clip(0, None)])
+
+    previous_offsets = np.zeros(len(img_names) + 1, dtype=np.int64)
+    np.cumsum(np.bincount(previous_images, minlength=len(img_names)), out=previous_offsets[1:])
+    return IterationDiff(img_names, annotations["image_name"].cat.categories, img_offsets, status, previous_offsets, previous_boxes, previous_status, len(previous) - len(previous_rows))
+
+
+def read_iteration(path):
+    """Reads the annotations of an iteration (any annotation file or database) grouped by image.
+
+    Returns:
+        tuple: The annotations (UI_COLUMNS), the image names and the row offsets of their annotations.
+    """
+    if annotation_db.is_database(path):
+        dataset = annotation_db.DatabaseReviewDataset(path)
+        try:
+            annotations, img_names, img_offsets, _ = dataset.review_annotations()
+        finally:
+            dataset.close()
+        return annotations, img_names, img_offsets
+    annotations, _, img_names, img_offsets, _ = review_dataset.build_image_index(annotation_store.read_ui_annotations(path))
+    return annotations, img_names, img_offsets
+
+
+def diff_dataset(dataset, path_previous, match_iou=MATCH_IOU, unchanged_iou=UNCHANGED_IOU):
+    """Compares the annotations of a (loaded) review dataset with the previous iteration, see diff_annotations."""
+    annotations, img_names, img_offsets, _ = dataset.review_annotations()
+    return diff_annotations(annotations, img_names, img_offsets, read_iteration(path_previous)[0], match_iou, unchanged_iou)
+
+
+def diff_iterations(path_previous, path_current, match_iou=MATCH_IOU, unchanged_iou=UNCHANGED_IOU):
+    """Compares two iterations of predictions (e.g. predictions_0.csv and predictions_1.csv), see diff_annotations."""
+    annotations, img_names, img_offsets = read_iteration(path_current)
+    previous = read_iteration(path_previous)[0]
+    return diff_annotations(annotations, img_names, img_offsets, previous, match_iou, unchanged_iou)
+
+
+if __name__ == "__main__":
+
+    # Parse and check the input arguments
+    parser = argparse.ArgumentParser(description="Compares the predicted boxes of two iterations and lists the changed images.")
+    parser.add_argument("-p", "--previous-file", dest="previous_file", type=str, help="Predictions of the previous iteration.", required=True)
+    parser.add_argument("-i", "--input-file", dest="input_file", type=str, help="Predictions of the current iteration.", required=True)
+    parser.add_argument("-o", "--output-file", dest="output_file", type=str, help="Write the names of the changed images to this file.", required=False)
+    parser.add_argument("--match-iou", dest="match_iou", type=float, default=MATCH_IOU, help="Minimum IoU of the same box in both iterations.")
+    parser.add_argument("--unchanged-iou", dest="unchanged_iou", type=float, default=UNCHANGED_IOU, help="Minimum IoU of an unchanged box.")
+    args = parser.parse_args()
+
+    for path in [args.previous_file, args.input_file]:
+        if not os.path.exists(path):
+            print(f"Annotation file '{path}' does not exist!")
+            exit()
+
+    start = time.perf_counter()
+    diff = diff_iterations(args.previous_file, args.input_file, args.match_iou, args.unchanged_iou)
+    stats = diff.stats()
+    print(f"Compared the iterations in {time.perf_counter() - start:.1f}s: {stats['changed_images']} of {stats['images']} images changed, " + \
+          f"{stats['unchanged']} boxes unchanged, {stats['moved']} moved, {stats['added']} added, {stats['removed']} removed.")
+    if args.output_file:
+        with open(args.output_file, "w") as file:
+            file.writelines(f"{image_name}\n" for image_name in diff.img_names[diff.changed])
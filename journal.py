@@ -0,0 +1,161 @@
+import os
+import csv
+import time
+import threading
+
+from contextlib import contextmanager
+
+try:
+    import fcntl
+except ImportError:
+    # Not available on Windows, where the journal can only be shared between the threads of one process
+    fcntl = None
+
+
+APPROVED    = "approved"
+DISCARDED   = "discarded"
+
+
+def journal_path(path_approved, path_discarded=""):
+    """Returns the path of the decision journal belonging to the given files of approved / discarded annotations
+    (next to the file of approved annotations, if given), so that reviews writing to other files do not share it.
+    """
+    return os.path.splitext(path_approved or path_discarded)[0] + ".journal"
+
+
+class DecisionJournal:
+    """Durable append-only journal of review decisions.
+
+    Every decision is stored as a pipe-separated record "image_name|decision|timestamp|session_id". Records
+    are handed to the OS immediately and fsync'd in batches (every batch_size records or sync_interval
+    seconds, whatever comes first). Replaying the journal yields the latest decision per image.
+
+    The journal can be shared by several processes: appending, reading and truncating are serialized by
+    a lock file, and a truncation replaces the journal file so that other processes can notice it (see reopen).
+    """
+
+    def __init__(self, path, batch_size=16, sync_interval=2.0):
+        self.path = path
+        self.batch_size = batch_size
+        self.sync_interval = sync_interval
+        self._lock = threading.RLock()
+        self._depth = 0
+        # Incremented whenever the journal file is (re)opened, i.e. after it has been replaced
+        self.generation = 0
+        self._lock_file = open(path + ".lock", "a")
+        self._open()
+
+    def _open(self):
+        self._file = open(self.path, "a", newline="", encoding="utf-8")
+        self._writer = csv.writer(self._file, delimiter="|")
+        self.generation += 1
+        self._unsynced = 0
+        self._last_sync = time.monotonic()
+
+    @contextmanager
+    def locked(self):
+        """Holds the journal exclusively, across the threads of this process and (where supported) across processes."""
+        with self._lock:
+            if self._depth == 0 and fcntl is not None:
+                fcntl.flock(self._lock_file, fcntl.LOCK_EX)
+            self._depth += 1
+            try:
+                yield
+            finally:
+                self._depth -= 1
+                if self._depth == 0 and fcntl is not None:
+                    fcntl.flock(self._lock_file, fcntl.LOCK_UN)
+
+    def append(self, image_name, decision, session_id=""):
+        self.extend([image_name], decision, session_id)
+
+    def extend(self, image_names, decision, session_id=""):
+        """Appends the same decision for several images as one batch."""
+        timestamp = time.time()
+        with self.locked():
+            self.reopen()
+            for image_name in image_names:
+                self._writer.writerow([image_name, decision, timestamp, session_id])
+            self._file.flush()
+            self._unsynced += len(image_names)
+            if self._unsynced >= self.batch_size or time.monotonic() - self._last_sync >= self.sync_interval:
+                self._sync()
+
+    def read(self, offset=0):
+        """Reads the records appended after the given byte offset.
+
+        Args:
+            offset (int, optional): Byte offset returned by a previous call. Defaults to the start of the journal.
+
+        Returns:
+            tuple: The (image_name, decision) of each record in the order they were appended and the
+                byte offset after the last complete record.
+        """
+        with self.locked():
+            self._file.flush()
+            with open(self.path, "rb") as file:
+                file.seek(offset)
+                data = file.read()
+        # Leave a trailing record without line break (only partially written before a crash) for later
+        end = data.rfind(b"\n") + 1
+        records = []
+        for record in csv.reader(data[:end].decode("utf-8").splitlines(), delimiter="|"):
+            # Skip records that were only partially written before a crash
+            if len(record) not in (3, 4) or record[1] not in (APPROVED, DISCARDED):
+                continue
+            records.append((record[0], record[1]))
+        return records, offset + end
+
+    def replay(self):
+        """Reads the journal from disk.
+
+        Returns:
+            dict: The latest decision for each image name contained in the journal.
+        """
+        records, _ = self.read()
+        return dict(records)
+
+    def reopen(self):
+        """Reopens the journal if another process has replaced it (i.e. truncated it) in the meantime.
+
+        Returns:
+            bool: Whether the journal had been replaced.
+        """
+        with self.locked():
+            try:
+                replaced = os.stat(self.path).st_ino != os.fstat(self._file.fileno()).st_ino
+            except FileNotFoundError:
+                replaced = True
+            if replaced:
+                self._file.close()
+                self._open()
+            return replaced
+
+    def sync(self):
+        with self.locked():
+            self._sync()
+
+    def truncate(self):
+        """Empties the journal; to be called (holding the lock) once its decisions are persisted elsewhere."""
+        with self.locked():
+            tmp_path = self.path + ".tmp"
+            with open(tmp_path, "w") as file:
+                os.fsync(file.fileno())
+            self._file.close()
+            os.replace(tmp_path, self.path)
+            self._open()
+
+    def close(self):
+        if self._lock_file.closed:
+            return
+        with self.locked():
+            if not self._file.closed:
+                self._sync()
+                self._file.close()
+        self._lock_file.close()
+
+    def _sync(self):
+        self._file.flush()
+        os.fsync(self._file.fileno())
+        self._unsynced = 0
+        self._last_sync = time.monotonic()
@@ -0,0 +1,144 @@
+import time
+import json
+import threading
+
+from contextlib import contextmanager
+from functools import wraps
+
+
+# Upper bounds of the histogram buckets for durations (seconds) and response sizes (bytes)
+SECONDS_BUCKETS = [0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0, 30.0]
+BYTES_BUCKETS   = [1 << 10, 4 << 10, 16 << 10, 64 << 10, 256 << 10, 1 << 20, 4 << 20, 16 << 20]
+
+
+class Histogram:
+    """Prometheus histogram with labels (cumulative buckets, sum and count per label set)."""
+
+    def __init__(self, name, documentation, labelnames, buckets):
+        self.name = name
+        self.documentation = documentation
+        self.labelnames = tuple(labelnames)
+        self.buckets = list(buckets) + [float("inf")]
+        self._values = {}
+        self._lock = threading.Lock()
+
+    def observe(self, value, *labels):
+        with self._lock:
+            counts = self._values.get(labels)
+            if counts is None:
+                counts = self._values[labels] = [[0] * len(self.buckets), 0.0, 0]
+            for idx, bound in enumerate(self.buckets):
+                if value <= bound:
+                    counts[0][idx] += 1
+                    break
+            counts[1] += value
+            counts[2] += 1
+
+    def render(self):
+        lines = [f"# HELP {self.name} {self.documentation}", f"# TYPE {self.name} histogram"]
+        with self._lock:
+            values = {labels: ([*counts[0]], counts[1], counts[2]) for labels, counts in self._values.items()}
+        for labels, (buckets, total, count) in sorted(values.items()):
+            label_text = ",".join(f'{name}="{value}"' for name, value in zip(self.labelnames, labels))
+            cumulative = 0
+            for bound, bucket in zip(self.buckets, buckets):
+                cumulative += bucket
+                le = "+Inf" if bound == float("inf") else repr(bound)
+                lines.append(f'{self.name}_bucket{{{label_text}{"," if label_text else ""}le="{le}"}} {cumulative}')
+            lines.append(f"{self.name}_sum{{{label_text}}} {total}")
+            lines.append(f"{self.name}_count{{{label_text}}} {count}")
+        return lines
+
+
+REQUEST_SECONDS = Histogram("vizaod_callback_seconds", "Duration of the requests handled by a callback.", ["callback"], SECONDS_BUCKETS)
+PHASE_SECONDS   = Histogram("vizaod_callback_phase_seconds", "Duration of the phases of a callback (\"dash\" is the "
+                            "remaining time of the request, mostly response serialization).", ["callback", "phase"], SECONDS_BUCKETS)
+RESPONSE_BYTES  = Histogram("vizaod_callback_response_bytes", "Size of the responses of a callback.", ["callback"], BYTES_BUCKETS)
+HISTOGRAMS      = [REQUEST_SECONDS, PHASE_SECONDS, RESPONSE_BYTES]
+
+# Functions returning additional metrics as {name: (type, documentation, value)}, e.g. the image cache counters
+COLLECTORS = []
+
+# The callback (and the durations of its phases) being handled by the current thread
+_local = threading.local()
+
+
+def instrumented(name):
+    """Decorator marking a callback, so that its requests and the spans within it are recorded under name."""
+    def decorator(func):
+        @wraps(func)
+        def wrapper(*args, **kwargs):
+            _local.callback = name
+            _local.phases = {}
+            _local.spans = []
+            start = time.perf_counter()
+            try:
+                return func(*args, **kwargs)
+            finally:
+                _local.callback = None
+                _local.finished = (name, _local.phases, time.perf_counter() - start)
+        return wrapper
+    return decorator
+
+
+@contextmanager
+def span(phase):
+    """Times a phase of the callback handled by the current thread, excluding the phases nested in it
+    (outside of callbacks, nothing is recorded). Can also be used as a decorator.
+    """
+    callback = getattr(_local, "callback", None)
+    if callback is None:
+        yield
+        return
+    start = time.perf_counter()
+    _local.spans.append(0.0)
+    try:
+        yield
+    finally:
+        elapsed = time.perf_counter() - start
+        seconds = elapsed - _local.spans.pop()
+        if _local.spans:
+            _local.spans[-1] += elapsed
+        PHASE_SECONDS.observe(seconds, callback, phase)
+        _local.phases[phase] = _local.phases.get(phase, 0.0) + seconds
+
+
+def begin_request():
+    _local.finished = None
+    _local.request_start = time.perf_counter()
+
+
+def end_request(n_bytes, status=200):
+    """Records the request handled by an instrumented callback (if any).
+
+    Returns:
+        dict: The record of the request (callback, seconds, bytes, status and phases) or None.
+    """
+    finished = getattr(_local, "finished", None)
+    if finished is None:
+        return None
+    _local.finished = None
+    callback, phases, callback_seconds = finished
+    seconds = time.perf_counter() - _local.request_start
+    phases = dict(phases)
+    phases["dash"] = max(0.0, seconds - callback_seconds)
+    PHASE_SECONDS.observe(phases["dash"], callback, "dash")
+    REQUEST_SECONDS.observe(seconds, callback)
+    RESPONSE_BYTES.observe(n_bytes, callback)
+    return {"callback": callback, "seconds": round(seconds, 6), "bytes": n_bytes, "status": status,
+            "phases": {phase: round(value, 6) for phase, value in phases.items()}}
+
+
+def log_line(record):
+    return json.dumps(dict(record, time=time.time(), event="callback"))
+
+
+def render():
+    """Returns all metrics in the Prometheus text exposition format."""
+    lines = []
+    for histogram in HISTOGRAMS:
+        lines.extend(histogram.render())
+    for collector in COLLECTORS:
+        for name, (metric_type, documentation, value) in collector().items():
+            lines.extend([f"# HELP {name} {documentation}", f"# TYPE {name} {metric_type}", f"{name} {value}"])
+    return "\n".join(lines) + "\n"
@@ -0,0 +1,187 @@
+import os
+import json
+import time
+import argparse
+
+from concurrent.futures import ProcessPoolExecutor
+
+import cv2
+from tqdm import tqdm
+
+import image_render
+from image_cache import load_image
+
+
+# Name of the directory (inside the image directory) holding the precomputed images by default
+CACHE_DIRNAME   = ".vizaod_cache"
+IMAGE_EXTENSIONS = [".jpg", ".jpeg", ".png", ".tif", ".tiff", ".bmp", ".webp"]
+
+# Defaults matching RENDER_SIZE, GRID_THUMBNAIL_SIZE, RENDER_FORMAT and RENDER_QUALITY of the app
+PREVIEW_SIZE    = 1024
+THUMBNAIL_SIZE  = 256
+FORMAT          = "jpg"
+QUALITY         = 85
+LEVEL_QUALITY   = 95
+
+
+def default_cache_dir(path_images):
+    return os.path.join(path_images, CACHE_DIRNAME)
+
+
+def artifact_dir(cache_dir, path_images, image_path):
+    """Returns the directory holding the precomputed images of the given image."""
+    return os.path.join(cache_dir, os.path.relpath(image_path, path_images))
+
+
+def list_images(path_images, cache_dir):
+    """Walks the image directory (skipping the cache directory) and returns the paths of all images."""
+    cache_dir = os.path.abspath(cache_dir)
+    image_paths = []
+    for root, dirs, files in os.walk(path_images):
+        dirs[:] = sorted(d for d in dirs if os.path.abspath(os.path.join(root, d)) != cache_dir)
+        image_paths.extend(os.path.join(root, f) for f in sorted(files) if os.path.splitext(f)[1].lower() in IMAGE_EXTENSIONS)
+    return image_paths
+
+
+def read_artifacts(cache_dir, path_images, image_path):
+    """Reads the metadata of the precomputed images of an image.
+
+    Returns:
+        dict: The metadata (see precompute) or None if there are no precomputed images or they are outdated.
+    """
+    out_dir = artifact_dir(cache_dir, path_images, image_path)
+    try:
+        with open(os.path.join(out_dir, "meta.json"), "r") as file:
+            meta = json.load(file)
+        stat = os.stat(image_path)
+    except (OSError, ValueError):
+        return None
+    if meta.get("mtime_ns") != stat.st_mtime_ns or meta.get("size") != stat.st_size:
+        return None
+    meta["dir"] = out_dir
+    return meta
+
+
+def write_image(path, img, fmt, quality):
+    """Atomically writes an RGB image."""
+    tmp_path = path + ".tmp." + fmt
+    if not cv2.imwrite(tmp_path, cv2.cvtColor(img, cv2.COLOR_RGB2BGR), [image_render.QUALITY_FLAGS[fmt], quality]):
+        raise ValueError(f"Could not write '{path}'!")
+    os.replace(tmp_path, path)
+
+
+def precompute(task):
+    """Precomputes the pyramid levels, the preview and the thumbnail of one image (run in a worker process).
+
+    The pyramid levels are downscaled by 2 ** level until the longer side is not larger than the preview.
+    Images whose mtime and size match the metadata of a previous run (with the same settings) are skipped.
+
+    Args:
+        task (tuple): The image path, the image directory, the cache directory, the settings and whether to recompute.
+
+    Returns:
+        str: "done", "skipped" or "failed".
+    """
+    image_path, path_images, cache_dir, settings, force = task
+    if not force:
+        meta = read_artifacts(cache_dir, path_images, image_path)
+        if meta is not None and all(meta.get(key) == value for key, value in settings.items()):
+            return "skipped"
+
+    stat = os.stat(image_path)
+    img = load_image(image_path)
+    if img is None:
+        return "failed"
+    height, width = img.shape[:2]
+    fmt = settings["format"]
+    out_dir = artifact_dir(cache_dir, path_images, image_path)
+    os.makedirs(out_dir, exist_ok=True)
+
+    levels = []
+    level_img = img
+    while max(level_img.shape[:2]) > settings["preview_size"]:
+        level_img = image_render.downscale(level_img, 1)
+        levels.append(f"level_{len(levels) + 1}.{fmt}")
+        write_image(os.path.join(out_dir, levels[-1]), level_img, fmt, LEVEL_QUALITY)
+
+    preview, preview_scale = image_render.resize_to(img, settings["preview_size"])
+    write_image(os.path.join(out_dir, f"preview.{fmt}"), preview, fmt, settings["quality"])
+    thumbnail, thumbnail_scale = image_render.resize_to(img, settings["thumbnail_size"])
+    write_image(os.path.join(out_dir, f"thumbnail.{fmt}"), thumbnail, fmt, settings["quality"])
+
+    # The metadata is written last, so that incomplete outputs are recomputed
+    meta = dict(
+        settings,
+        mtime_ns=stat.st_mtime_ns,
+        size=stat.st_size,
+        width=width,
+        height=height,
+        levels=levels,
+        preview=f"preview.{fmt}",
+        preview_scale=preview_scale,
+        thumbnail=f"thumbnail.{fmt}",
+        thumbnail_scale=thumbnail_scale
+    )
+    tmp_path = os.path.join(out_dir, "meta.json.tmp")
+    with open(tmp_path, "w") as file:
+        json.dump(meta, file)
+    os.replace(tmp_path, os.path.join(out_dir, "meta.json"))
+    return "done"
+
+
+def init_worker():
+    # One OpenCV thread per process, the parallelism comes from the process pool
+    cv2.setNumThreads(1)
+
+
+def precompute_images(path_images, cache_dir=None, n_workers=None, preview_size=PREVIEW_SIZE, thumbnail_size=THUMBNAIL_SIZE,
+                      fmt=FORMAT, quality=QUALITY, force=False, tqdm_progress_bar=False):
+    """Precomputes the pyramid levels, previews and thumbnails of all images in a directory with a process pool.
+
+    Args:
+        path_images (str): The image directory (walked recursively).
+        cache_dir (str, optional): Output directory. Defaults to the CACHE_DIRNAME directory inside path_images.
+        n_workers (int, optional): Number of worker processes. Defaults to the number of CPUs.
+        force (bool, optional): Recompute the images even if they are up to date. Defaults to False.
+
+    Returns:
+        dict: Number of images that were "done", "skipped" or "failed" and the elapsed "seconds".
+    """
+    start = time.perf_counter()
+    cache_dir = cache_dir or default_cache_dir(path_images)
+    settings = dict(preview_size=preview_size, thumbnail_size=thumbnail_size, format=fmt, quality=quality)
+    tasks = [(image_path, path_images, cache_dir, settings, force) for image_path in list_images(path_images, cache_dir)]
+    n_workers = n_workers or os.cpu_count()
+
+    stats = {"done": 0, "skipped": 0, "failed": 0}
+    with ProcessPoolExecutor(max_workers=n_workers, initializer=init_worker) as executor:
+        results = executor.map(precompute, tasks, chunksize=max(1, min(64, len(tasks) // (4 * n_workers))))
+        for result in tqdm(results, total=len(tasks), disable=not tqdm_progress_bar):
+            stats[result] += 1
+    stats["seconds"] = time.perf_counter() - start
+    return stats
+
+
+if __name__ == "__main__":
+
+    # Parse and check the input arguments
+    parser = argparse.ArgumentParser(description="Precomputes downscaled pyramid levels, previews and thumbnails of the images for the app.")
+    parser.add_argument("-i", "--input-dir", dest="input_dir", type=str, help="Image directory (PATH_IMAGES).", required=True)
+    parser.add_argument("-o", "--output-dir", dest="output_dir", type=str, help=f"Cache directory. Defaults to '{CACHE_DIRNAME}' " + \
+                            "inside the image directory, where the app finds it automatically.", required=False)
+    parser.add_argument("-w", "--workers", dest="workers", type=int, help="Number of worker processes. Defaults to the number of CPUs.", required=False)
+    parser.add_argument("--preview-size", dest="preview_size", type=int, default=PREVIEW_SIZE, help="Longer side of the previews (RENDER_SIZE).")
+    parser.add_argument("--thumbnail-size", dest="thumbnail_size", type=int, default=THUMBNAIL_SIZE, help="Longer side of the thumbnails (GRID_THUMBNAIL_SIZE).")
+    parser.add_argument("--format", dest="format", type=str, choices=list(image_render.MIME_TYPES), default=FORMAT, help="Image format (RENDER_FORMAT).")
+    parser.add_argument("--quality", dest="quality", type=int, default=QUALITY, help="Quality of the previews and thumbnails (RENDER_QUALITY).")
+    parser.add_argument("-f", "--force", dest="force", action="store_true", help="Recompute all images, even if they are up to date.")
+    args = parser.parse_args()
+
+    if not os.path.isdir(args.input_dir):
+        print(f"Image directory '{args.input_dir}' does not exist!")
+        exit()
+
+    stats = precompute_images(args.input_dir, args.output_dir, args.workers, args.preview_size, args.thumbnail_size,
+                              args.format, args.quality, args.force, True)
+    n_images = stats["done"] + stats["skipped"] + stats["failed"]
+    print(f"Processed {n_images} images in {stats['seconds']:.1f}s ({stats['done']} computed, {stats['skipped']} up to date, {stats['failed']} failed).")
@@ -0,0 +1,509 @@
+import os
+import re
+import time
+import threading
+
+import numpy as np
+import pandas as pd
+
+import journal
+import review_queue
+import annotation_store
+
+
+# Review decision of an image; the approved / discarded annotations are only assembled from the
+# decisions when being exported
+DECISION_NONE       = 0
+DECISION_APPROVED   = 1
+DECISION_DISCARDED  = 2
+
+JOURNAL_DECISIONS = {
+    DECISION_APPROVED: journal.APPROVED,
+    DECISION_DISCARDED: journal.DISCARDED
+}
+DECISION_CODES = {decision: code for code, decision in JOURNAL_DECISIONS.items()}
+
+# Minimum number of seconds between two checks for new annotations (see ReviewDataset.pick_up)
+PICK_UP_INTERVAL = 2.0
+
+
+def build_image_index(annotations):
+    """Reorders the annotations so that the annotations of each image are contiguous (keeping the order
+    in which the images first appear) and builds the image index used for navigation and lookups.
+
+    The image names and categories of the reordered annotations are interned: the codes of the image names
+    are the positions of the images and the codes of the categories number them in the order in which they
+    first appear, so that lookups and filters work on integers and strings are only needed for display.
+
+    Returns:
+        tuple: The reordered annotations, the position of each of their rows in the annotation file, the
+            ordered unique image names, the row offsets of their annotations and the lookup from image name
+            to position (a pandas.Index, see ReviewDataset.image_idx).
+    """
+    codes, uniques = pd.factorize(annotations["image_name"])
+    order = np.argsort(codes, kind="stable")
+    img_names = np.asarray(uniques, dtype=object)
+    img_offsets = np.zeros(len(img_names) + 1, dtype=np.int64)
+    np.cumsum(np.bincount(codes, minlength=len(img_names)), out=img_offsets[1:])
+    annotations = annotations.iloc[order].reset_index(drop=True)
+    category_codes, categories = pd.factorize(annotations["category"])
+    annotations = annotations.assign(
+        image_name=pd.Categorical.from_codes(codes[order], categories=pd.Index(img_names, dtype=object)),
+        category=pd.Categorical.from_codes(category_codes, categories=pd.Index(np.asarray(categories, dtype=object), dtype=object))
+    )
+    return annotations, order, img_names, img_offsets, annotations["image_name"].cat.categories
+
+
+def later_iterations(path_annotations):
+    """Returns the predictions of the iterations after the one of the given file, i.e. for "predictions_N.csv"
+    the files "predictions_M.csv" with M > N in the same directory, ordered by M.
+    """
+    directory, name = os.path.split(path_annotations)
+    base, extension = os.path.splitext(name)
+    prefix, _, iteration = base.rpartition("_")
+    if not prefix or not iteration.isdigit():
+        return []
+    pattern = re.compile(re.escape(prefix) + r"_(\d+)" + re.escape(extension) + "$")
+    iterations = []
+    for entry in os.scandir(directory or "."):
+        match = pattern.match(entry.name)
+        if match and int(match.group(1)) > int(iteration) and entry.is_file():
+            iterations.append((int(match.group(1)), os.path.join(directory, entry.name)))
+    return [path for _, path in sorted(iterations)]
+
+
+def merge_image_index(annotations, row_sources, row_ids, img_names, img_offsets, new_annotations, new_source, new_row_ids):
+    """Merges new annotations into the annotations grouped by image (see build_image_index). The images keep
+    their positions and the new images are appended in the order in which they first appear.
+
+    Returns:
+        tuple: The merged annotations, the source and the position in it of each of their rows, the image names
+            and the row offsets of their annotations.
+    """
+    img_index = annotations["image_name"].cat.categories
+    names = new_annotations["image_name"].astype("category")
+    # Only the unique names of the new annotations are looked up
+    positions = img_index.get_indexer(names.cat.categories)[names.cat.codes.to_numpy()]
+    unknown = positions < 0
+    codes, uniques = pd.factorize(names.cat.codes.to_numpy()[unknown])
+    positions[unknown] = len(img_names) + codes
+    img_names = np.concatenate([img_names, np.asarray(names.cat.categories[uniques], dtype=object)])
+
+    # New categories get the next IDs, in the order in which they first appear
+    categories = annotations["category"].cat.categories
+    new_categories = pd.Index(pd.unique(new_annotations["category"].dropna().astype(object)), dtype=object)
+    categories = categories.append(new_categories[~new_categories.isin(categories)])
+
+    codes = np.concatenate([np.repeat(np.arange(len(img_offsets) - 1), np.diff(img_offsets)), positions])
+    order = np.argsort(codes, kind="stable")
+    img_offsets = np.zeros(len(img_names) + 1, dtype=np.int64)
+    np.cumsum(np.bincount(codes, minlength=len(img_names)), out=img_offsets[1:])
+    # The image names are concatenated as their IDs, the categories with the same IDs in both
+    merged = pd.concat([
+        annotations.assign(image_name=codes[:len(annotations)], category=annotations["category"].cat.set_categories(categories)),
+        new_annotations.assign(image_name=positions, category=new_annotations["category"].astype(pd.CategoricalDtype(categories)))
+    ], ignore_index=True).iloc[order].reset_index(drop=True)
+    merged["image_name"] = pd.Categorical.from_codes(merged["image_name"].to_numpy(), categories=pd.Index(img_names, dtype=object))
+    return (
+        merged,
+        np.concatenate([row_sources, np.full(len(new_annotations), new_source, dtype=row_sources.dtype)])[order],
+        np.concatenate([row_ids, np.asarray(new_row_ids, dtype=np.int64)])[order],
+        img_names,
+        img_offsets
+    )
+
+
+def write_file(df, path):
+    """Atomically replaces the annotation file at path (CSV, Parquet or Feather) with the given dataframe."""
+    tmp_path = path + ".tmp"
+    annotation_store.write_annotations(df, tmp_path, annotation_store.file_format(path))
+    fd = os.open(tmp_path, os.O_RDONLY)
+    try:
+        os.fsync(fd)
+    finally:
+        os.close(fd)
+    os.replace(tmp_path, path)
+
+
+def concat_annotations(frames):
+    """Concatenates annotation dataframes, skipping empty ones so that the column dtypes are kept."""
+    frames = [df for df in frames if len(df)] or frames[-1:]
+    return pd.concat(frames, ignore_index=True)
+
+
+class ReviewDataset:
+    """Annotations of one annotation file and their review decisions, shared by all review sessions.
+
+    The annotations (only the columns needed for reviewing) and the image index are only replaced when new
+    annotations are picked up (see pick_up): rows appended to the annotation file and, with watch, the
+    predictions of later iterations. The images keep their positions, new images are appended. The decisions
+    are shared between processes through the decision journal: each process appends its decisions to it and
+    applies the records appended by the others (see refresh).
+    """
+
+    def __init__(self, path_annotations, path_approved="", path_discarded="", autosave=True, watch=False):
+        self.path_annotations = path_annotations
+        self.path_approved = path_approved
+        self.path_discarded = path_discarded
+        self.autosave = autosave
+        self.watch = watch
+        self.mtime = os.stat(path_annotations).st_mtime_ns
+        self.journal = None
+        self._journal_offset = 0
+        self._journal_generation = 0
+        self._lock = threading.RLock()
+        # Incremented whenever new annotations have been picked up
+        self.version = 0
+        self._stale = False
+        self._last_pick_up = time.monotonic()
+
+        # Load only the columns needed for reviewing; complete rows are read from the sources when exporting
+        annotations = annotation_store.read_ui_annotations(path_annotations)
+        self.sources = [annotation_store.AnnotationSource(path_annotations, len(annotations))]
+        self.source_mtimes = [self.mtime]
+        self.source_n_rows = [len(annotations)]
+        self.annotations, self.row_ids, self.img_names, self.img_offsets, self.img_index = build_image_index(annotations)
+        # Source (index into sources) of each row
+        self.row_sources = np.zeros(len(self.row_ids), dtype=np.int16)
+        # Category names by ID (the codes of the category column)
+        self.categories = list(self.annotations["category"].cat.categories)
+        # Review queues by order, built on first use and then updated with the decisions
+        self.queues = {}
+        self.decisions = np.zeros(len(self.img_names), dtype=np.int8)
+        if watch:
+            for path in later_iterations(path_annotations):
+                self._add_source(path)
+        self.load_decisions()
+
+        # Recover the decisions of an interrupted session and compact them into the files
+        if path_approved != "" or path_discarded != "":
+            self.journal = journal.DecisionJournal(journal.journal_path(path_approved, path_discarded))
+            self._journal_generation = self.journal.generation
+            missing = any(path != "" and not os.path.exists(path) for path in (path_approved, path_discarded))
+            with self.journal.locked():
+                if self._apply_journal() or missing:
+                    self._save_progress()
+
+    def __len__(self):
+        return len(self.img_names)
+
+    def image_idx(self, image_name):
+        """Returns the position of an image, or None if the image is not part of the annotations."""
+        try:
+            return self.img_index.get_loc(image_name)
+        except KeyError:
+            return None
+
+    def is_stale(self):
+        """Whether the annotation files have changed (other than by appending rows) since they were loaded."""
+        return self._stale or os.stat(self.path_annotations).st_mtime_ns != self.mtime
+
+    def pick_up(self):
+        """Loads the rows appended to the annotation files and (with watch) the predictions of the iterations
+        written since, and merges them into the image index, the review queues and the decisions. Checks at
+        most every PICK_UP_INTERVAL seconds; files rewritten rather than appended to make the dataset stale.
+
+        Returns:
+            int: The number of new images.
+        """
+        if time.monotonic() - self._last_pick_up < PICK_UP_INTERVAL:
+            return 0
+        with self._lock:
+            self._last_pick_up = time.monotonic()
+            n_images = len(self.img_names)
+            for source_idx, source in enumerate(self.sources):
+                try:
+                    mtime = os.stat(source.path).st_mtime_ns
+                except FileNotFoundError:
+                    self._stale = True
+                    return 0
+                if mtime == self.source_mtimes[source_idx]:
+                    continue
+                data = source.read_appended()
+                if data is None:
+                    self._stale = True
+                    return 0
+                if data:
+                    new_annotations = annotation_store.parse_ui_rows(source.header, data)
+                    n_rows = self.source_n_rows[source_idx]
+                    self._merge(new_annotations, source_idx, np.arange(n_rows, n_rows + len(new_annotations)))
+                self.source_mtimes[source_idx] = mtime
+            self.mtime = self.source_mtimes[0]
+            if self.watch:
+                known = {source.path for source in self.sources}
+                for path in later_iterations(self.path_annotations):
+                    if path not in known:
+                        self._add_source(path)
+            if len(self.img_names) > n_images:
+                self._apply_new_decisions(n_images)
+            return len(self.img_names) - n_images
+
+    def _add_source(self, path):
+        """Loads the annotations of another file (the predictions of a later iteration) and merges them."""
+        annotations = annotation_store.read_ui_annotations(path)
+        self.sources.append(annotation_store.AnnotationSource(path, len(annotations)))
+        self.source_mtimes.append(os.stat(path).st_mtime_ns)
+        self.source_n_rows.append(0)
+        self._merge(annotations, len(self.sources) - 1, np.arange(len(annotations)))
+
+    def _merge(self, annotations, source_idx, row_ids):
+        with self._lock:
+            n_images = len(self.img_names)
+            self.annotations, self.row_sources, self.row_ids, self.img_names, self.img_offsets = merge_image_index(
+                self.annotations, self.row_sources, self.row_ids, self.img_names, self.img_offsets, annotations, source_idx, row_ids
+            )
+            self.img_index = self.annotations["image_name"].cat.categories
+            self.categories = list(self.annotations["category"].cat.categories)
+            self.decisions = np.concatenate([self.decisions, np.zeros(len(self.img_names) - n_images, dtype=np.int8)])
+            self.source_n_rows[source_idx] += len(annotations)
+            # The review queues are rebuilt on their next use
+            self.queues = {}
+            self.version += 1
+
+    def _apply_new_decisions(self, first_new):
+        """Applies the decisions of the images from position first_new on (new images) found in the files of
+        approved / discarded annotations and in the journal.
+        """
+        with self._lock:
+            for name, decision in [("discarded_other", DECISION_DISCARDED), ("approved_other", DECISION_APPROVED)]:
+                other = getattr(self, name)
+                if len(other) == 0:
+                    continue
+                idxs = self.img_index.get_indexer(other["image_name"])
+                self.decisions[idxs[idxs >= 0]] = decision
+                setattr(self, name, other.loc[idxs < 0])
+            if self.journal is not None:
+                with self.journal.locked():
+                    # The records applied so far have skipped the new images (unless the journal has been replaced)
+                    self.journal.reopen()
+                    if self.journal.generation == self._journal_generation:
+                        records, _ = self.journal.read(0)
+                        for idx, (_, decision) in zip(self._record_idxs(records), records):
+                            if idx >= first_new:
+                                self.decisions[idx] = DECISION_CODES[decision]
+                    self._apply_journal()
+
+    def image_name(self, idx):
+        return self.img_names[idx]
+
+    def next_undecided(self, idx, queue_order="file"):
+        """Returns the position of the first image without decision after idx in the given review order
+        (wrapping around), or None.
+        """
+        return self.queue(queue_order).next(idx)
+
+    def queue(self, queue_order="file"):
+        """Returns the review queue of the images without decision in the given order (see review_queue.QUEUE_ORDERS)."""
+        with self._lock:
+            queue = self.queues.get(queue_order)
+            if queue is None:
+                queue = review_queue.ReviewQueue(self._queue_order(queue_order), self.decisions == DECISION_NONE)
+                self.queues[queue_order] = queue
+            return queue
+
+    def _queue_order(self, queue_order):
+        counts = np.diff(self.img_offsets)
+        min_scores = max_scores = rarity = None
+        if len(counts) and queue_order in ("lowest_score", "highest_score"):
+            scores = self.box_scores()
+            if scores is not None:
+                min_scores = np.minimum.reduceat(scores, self.img_offsets[:-1])
+                max_scores = np.maximum.reduceat(scores, self.img_offsets[:-1])
+        if len(counts) and queue_order == "rare_categories":
+            codes = self.annotations["category"].cat.codes.to_numpy()
+            rarity = np.minimum.reduceat(np.bincount(codes)[codes], self.img_offsets[:-1])
+        return review_queue.priority_order(queue_order, counts, min_scores, max_scores, rarity)
+
+    def box_scores(self):
+        """Reads the scores of the boxes (in the order of annotations), or returns None if there is no score column."""
+        scores = np.full(len(self.row_ids), np.nan)
+        found = False
+        for source_idx, source in enumerate(self.sources):
+            columns = annotation_store.read_columns(source.path)
+            column = next((column for column in review_queue.SCORE_COLUMNS if column in columns), None)
+            if column is None:
+                continue
+            found = True
+            rows = self.row_sources == source_idx
+            source_scores = annotation_store.read_annotations(source.path, columns=[column])[column].to_numpy(dtype=np.float64)
+            scores[rows] = source_scores[self.row_ids[rows]]
+        return scores if found else None
+
+    def complete_rows(self, rows, columns=None):
+        """Reads the complete rows (all columns of their annotation file) of the given rows of annotations (in that order)."""
+        sources, positions = self.row_sources[rows], self.row_ids[rows]
+        if len(self.sources) == 1:
+            return self.sources[0].rows(positions, columns)
+        frames, order = [], []
+        for source_idx in np.unique(sources):
+            selected = np.flatnonzero(sources == source_idx)
+            frames.append(self.sources[source_idx].rows(positions[selected], columns))
+            order.append(selected)
+        if not frames:
+            return self.sources[0].rows(positions, columns)
+        df = pd.concat(frames, ignore_index=True)
+        return df.iloc[np.argsort(np.concatenate(order), kind="stable")].reset_index(drop=True)
+
+    def review_annotations(self):
+        """Returns the annotations needed for reviewing (UI_COLUMNS) of all images, grouped by image, with the
+        image names, the row offsets of their annotations and their decisions.
+        """
+        with self._lock:
+            return self.annotations, self.img_names, self.img_offsets, self.decisions.copy()
+
+    def image_annotations(self, image_name):
+        with self._lock:
+            idx = self.image_idx(image_name)
+            if idx is None:
+                return self.annotations.iloc[0:0]
+            return self.annotations.iloc[self.img_offsets[idx]:self.img_offsets[idx + 1]]
+
+    def image_segmentations(self, image_name):
+        """Returns the segmentations of the annotations of an image (in the order of image_annotations) or
+        None if the annotation file has no segmentation column.
+        """
+        with self._lock:
+            idx = self.image_idx(image_name)
+            if idx is None:
+                return []
+            rows = slice(self.img_offsets[idx], self.img_offsets[idx + 1])
+            try:
+                rows = self.complete_rows(rows, columns=["segmentation"])
+            except (ValueError, KeyError):
+                return None
+        return list(rows["segmentation"])
+
+    def decision(self, image_name):
+        idx = self.image_idx(image_name)
+        return DECISION_NONE if idx is None else self.image_decision(idx)
+
+    def image_decision(self, idx):
+        """Returns the decision of the image at the given position."""
+        with self._lock:
+            return self.decisions[idx]
+
+    def decide(self, image_name, decision, session_id=""):
+        """Records the decision for an image (and appends it to the journal with autosave)."""
+        self.decide_many([image_name], decision, session_id)
+
+    def decide_many(self, image_names, decision, session_id=""):
+        """Records the same decision for several images, appending them to the journal as one batch."""
+        idxs = self.img_index.get_indexer(image_names)
+        if (idxs < 0).any():
+            raise KeyError(f"Unknown images: {list(np.asarray(image_names, dtype=object)[idxs < 0][:5])}")
+        self.decide_idxs(idxs, decision, session_id)
+
+    def decide_idxs(self, idxs, decision, session_id=""):
+        """Records the same decision for the images at the given positions (see decide_many); the image names
+        are only looked up for the journal.
+        """
+        idxs = [int(idx) for idx in idxs]
+        with self._lock:
+            self.decisions[idxs] = decision
+            for queue in self.queues.values():
+                queue.update(idxs, decision == DECISION_NONE)
+            if self.autosave and self.journal is not None:
+                self.journal.extend(self.img_names[idxs], JOURNAL_DECISIONS[decision], session_id)
+
+    def load_decisions(self):
+        """(Re)loads the decisions from the files of approved / discarded annotations (approvals take precedence)."""
+        self.decisions = np.zeros(len(self.img_names), dtype=np.int8)
+        self.approved_other = pd.DataFrame()
+        self.discarded_other = pd.DataFrame()
+        if os.path.exists(self.path_discarded):
+            self.discarded_other = self._load_decisions(self.path_discarded, DECISION_DISCARDED)
+        if os.path.exists(self.path_approved):
+            self.approved_other = self._load_decisions(self.path_approved, DECISION_APPROVED)
+        for queue in self.queues.values():
+            queue.rebuild(self.decisions == DECISION_NONE)
+
+    def _load_decisions(self, path, decision):
+        """Marks the images contained in a file of approved / discarded annotations in decisions.
+
+        Returns:
+            pandas.DataFrame: The rows of images that are not part of the annotations.
+        """
+        try:
+            image_names = annotation_store.read_interned(path, "image_name")
+        except pd.errors.EmptyDataError:
+            return pd.DataFrame()
+        # Only the unique names are looked up, the rows are mapped through their codes
+        positions = self.img_index.get_indexer(image_names.cat.categories)
+        self.decisions[positions[positions >= 0]] = decision
+        known = positions[image_names.cat.codes.to_numpy()] >= 0
+        if known.all():
+            return pd.DataFrame()
+        return annotation_store.read_annotations(path).loc[~known]
+
+    def refresh(self):
+        """Applies the decisions other processes have appended to the journal since the last refresh."""
+        if self.journal is None:
+            return
+        with self._lock, self.journal.locked():
+            self._apply_journal()
+
+    def _apply_journal(self):
+        """Applies the journal records not seen yet; must be called holding the journal lock.
+
+        Returns:
+            int: The number of applied records.
+        """
+        self.journal.reopen()
+        if self.journal.generation != self._journal_generation:
+            # Another process has compacted the journal into the files in the meantime
+            self.load_decisions()
+            self._journal_offset = 0
+            self._journal_generation = self.journal.generation
+        records, self._journal_offset = self.journal.read(self._journal_offset)
+        idxs = []
+        for idx, (_, decision) in zip(self._record_idxs(records), records):
+            if idx >= 0:
+                self.decisions[idx] = DECISION_CODES[decision]
+                idxs.append(idx)
+        for queue in self.queues.values():
+            queue.update(idxs, False)
+        return len(records)
+
+    def _record_idxs(self, records):
+        """Returns the positions of the images of journal records (-1 for unknown images)."""
+        if not records:
+            return np.zeros(0, dtype=np.int64)
+        return self.img_index.get_indexer([image_name for image_name, _ in records])
+
+    def decided_annotations(self, decision):
+        """Returns the complete rows (all columns of the annotation file) of the images with the given decision."""
+        with self._lock:
+            rows = np.repeat(self.decisions == decision, np.diff(self.img_offsets))
+            return self.complete_rows(rows)
+
+    def approved_annotations(self):
+        return concat_annotations([self.approved_other, self.decided_annotations(DECISION_APPROVED)])
+
+    def discarded_annotations(self):
+        return concat_annotations([self.discarded_other, self.decided_annotations(DECISION_DISCARDED)])
+
+    def save_progress(self):
+        """Writes the approved / discarded annotations of all sessions (and processes) and empties the journal."""
+        with self._lock:
+            if self.journal is None:
+                self._save_progress()
+                return
+            with self.journal.locked():
+                self._apply_journal()
+                self._save_progress()
+
+    def _save_progress(self):
+        if self.path_approved != "":
+            write_file(self.approved_annotations(), self.path_approved)
+        if self.path_discarded != "":
+            write_file(self.discarded_annotations(), self.path_discarded)
+        if self.journal is not None:
+            self.journal.truncate()
+            self._journal_offset = 0
+            self._journal_generation = self.journal.generation
+
+    def close(self):
+        with self._lock:
+            if self.journal is not None:
+                self.save_progress()
+                self.journal.close()
@@ -0,0 +1,128 @@
+import threading
+
+import numpy as np
+
+
+# Orders in which the images without decision are reviewed
+QUEUE_ORDERS = ["file", "fewest_boxes", "most_boxes", "lowest_score", "highest_score", "rare_categories"]
+
+# Columns holding the confidence of the predicted annotations (the first one present is used) and the orders requiring one
+SCORE_COLUMNS = ["score", "confidence"]
+SCORE_ORDERS = ["lowest_score", "highest_score"]
+
+
+class FenwickTree:
+    """Binary indexed tree over 0 / 1 values: updates, prefix sums and the k-th set position in O(log n)."""
+
+    def __init__(self, values):
+        self.n = len(values)
+        # tree[i] holds the sum of values[i - lowbit(i), i) (1-based), built from the prefix sums in O(n)
+        prefix = np.concatenate([[0], np.cumsum(values, dtype=np.int64)])
+        idx = np.arange(1, self.n + 1)
+        self.tree = [0] + (prefix[idx] - prefix[idx - (idx & -idx)]).tolist()
+        self.total = int(prefix[-1])
+        self.top = 1 << (self.n.bit_length() - 1) if self.n else 0
+
+    def add(self, pos, delta):
+        self.total += delta
+        pos += 1
+        while pos <= self.n:
+            self.tree[pos] += delta
+            pos += pos & -pos
+
+    def prefix(self, pos):
+        """Returns the sum of the values before pos."""
+        total = 0
+        while pos > 0:
+            total += self.tree[pos]
+            pos -= pos & -pos
+        return total
+
+    def find(self, k):
+        """Returns the position of the k-th (1-based) set value."""
+        pos = 0
+        step = self.top
+        while step:
+            if pos + step <= self.n and self.tree[pos + step] < k:
+                pos += step
+                k -= self.tree[pos]
+            step >>= 1
+        return pos
+
+
+class ReviewQueue:
+    """The images without decision in a review order, maintained incrementally as decisions are made.
+
+    Finding the next image without decision after any image (wrapping around) takes O(log n).
+    """
+
+    def __init__(self, order, undecided):
+        """
+        Args:
+            order (numpy.ndarray): Positions of the images (in the annotation file) in review order.
+            undecided (numpy.ndarray): Whether each image (by position) has no decision yet.
+        """
+        self.order = np.asarray(order, dtype=np.int64)
+        self.rank = np.empty_like(self.order)
+        self.rank[self.order] = np.arange(len(self.order))
+        self._lock = threading.Lock()
+        self.rebuild(undecided)
+
+    def __len__(self):
+        return self.tree.total
+
+    def rebuild(self, undecided):
+        with self._lock:
+            self.undecided = np.array(undecided, dtype=bool)
+            self.tree = FenwickTree(self.undecided[self.order])
+
+    def update(self, idxs, undecided):
+        """Marks the images at the given positions as (un)decided."""
+        with self._lock:
+            for idx in idxs:
+                if self.undecided[idx] != undecided:
+                    self.undecided[idx] = undecided
+                    self.tree.add(int(self.rank[idx]), 1 if undecided else -1)
+
+    def next(self, idx):
+        """Returns the position of the first image without decision following idx in review order (wrapping around), or None."""
+        with self._lock:
+            if self.tree.total == 0:
+                return None
+            k = self.tree.prefix(int(self.rank[idx]) + 1)
+            return int(self.order[self.tree.find(k + 1 if k < self.tree.total else 1)])
+
+    def first(self):
+        """Returns the position of the first image without decision in review order, or None."""
+        with self._lock:
+            if self.tree.total == 0:
+                return None
+            return int(self.order[self.tree.find(1)])
+
+
+def priority_order(queue_order, counts, min_scores=None, max_scores=None, rarity=None):
+    """Returns the positions of the images in the given review order (ties keep the order of the file).
+
+    Args:
+        queue_order (str): One of QUEUE_ORDERS.
+        counts (numpy.ndarray): Number of boxes of each image.
+        min_scores (numpy.ndarray, optional): Lowest score of the boxes of each image (for "lowest_score").
+        max_scores (numpy.ndarray, optional): Highest score of the boxes of each image (for "highest_score").
+        rarity (numpy.ndarray, optional): Number of boxes (in all images) of the rarest category of each image (for "rare_categories").
+    """
+    if queue_order == "file":
+        return np.arange(len(counts))
+    if queue_order == "fewest_boxes":
+        key = counts
+    elif queue_order == "most_boxes":
+        key = -counts
+    elif queue_order in SCORE_ORDERS:
+        scores = min_scores if queue_order == "lowest_score" else max_scores
+        if scores is None:
+            raise ValueError(f"The review order '{queue_order}' requires one of the columns {SCORE_COLUMNS}!")
+        key = scores if queue_order == "lowest_score" else -scores
+    elif queue_order == "rare_categories":
+        key = rarity
+    else:
+        raise ValueError(f"Unknown review order '{queue_order}'!")
+    return np.argsort(key, kind="stable")
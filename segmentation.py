@@ -0,0 +1,123 @@
+import numpy as np
+
+
+class ImagePolygons:
+    """The segmentation polygons of all annotations of one page, closed (first vertex repeated at the end)
+    and concatenated, with the vertex offsets, bounds and category of each polygon.
+    """
+
+    __slots__ = ("points", "offsets", "bounds", "categories")
+
+    def __init__(self, points, offsets, bounds, categories):
+        self.points = points
+        self.offsets = offsets
+        self.bounds = bounds
+        self.categories = categories
+
+    @property
+    def nbytes(self):
+        return self.points.nbytes + self.offsets.nbytes + self.bounds.nbytes + self.categories.nbytes
+
+    def __len__(self):
+        return len(self.offsets) - 1
+
+    def extent(self):
+        """Returns the longer side of the region covered by all polygons."""
+        if len(self) == 0:
+            return 0.0
+        return float(max(self.bounds[:, 2].max() - self.bounds[:, 0].min(), self.bounds[:, 3].max() - self.bounds[:, 1].min()))
+
+    def paths(self, mask, tolerance=0.0, view=None):
+        """Returns the selected polygons as NaN-separated x / y coordinates for a line trace.
+
+        Args:
+            mask (numpy.ndarray): Boolean mask of the polygons to draw.
+            tolerance (float, optional): Vertices closer than this to the previous one (on a grid with this
+                spacing) are dropped. Defaults to 0 (all vertices).
+            view (tuple, optional): Only draw the polygons intersecting this (x0, y0, x1, y1) region. Defaults to all.
+
+        Returns:
+            tuple: The x and y coordinates.
+        """
+        if view is not None:
+            x0, y0, x1, y1 = view
+            mask = mask & (self.bounds[:, 0] <= x1) & (self.bounds[:, 2] >= x0) & (self.bounds[:, 1] <= y1) & (self.bounds[:, 3] >= y0)
+        selected = np.flatnonzero(mask)
+        if len(selected) == 0:
+            return np.empty(0), np.empty(0)
+
+        # Gather the vertices of the selected polygons
+        starts = self.offsets[selected]
+        lengths = self.offsets[selected + 1] - starts
+        polygon_ids = np.repeat(np.arange(len(selected)), lengths)
+        first = np.cumsum(lengths) - lengths
+        points = self.points[np.arange(lengths.sum()) - np.repeat(first - starts, lengths)]
+
+        # Snap the vertices to a grid and drop the ones not moving to another cell (keeping the ends of each polygon)
+        keep = np.ones(len(points), dtype=bool)
+        if tolerance > 0:
+            cells = np.floor(points / tolerance)
+            keep[1:] = np.any(cells[1:] != cells[:-1], axis=1)
+            keep[first] = True
+            keep[first + lengths - 1] = True
+        points, polygon_ids = points[keep], polygon_ids[keep]
+
+        # One NaN point after each polygon separates it from the next one
+        paths = np.full((len(points) + len(selected), 2), np.nan)
+        paths[np.arange(len(points)) + polygon_ids] = points
+        return paths[:, 0], paths[:, 1]
+
+
+def parse_polygons(segmentations, categories):
+    """Parses the stringified COCO polygons ("[[x1, y1, x2, y2, ...], ...]") of the annotations of a page.
+
+    All strings are parsed at once into one float array; annotations without polygons (e.g. RLE masks
+    or missing values) are skipped.
+
+    Args:
+        segmentations (list): The segmentation strings.
+        categories (list): The category of each annotation.
+
+    Returns:
+        ImagePolygons: The polygons.
+    """
+    rows = [(segmentation, category) for segmentation, category in zip(segmentations, categories)
+            if isinstance(segmentation, str) and segmentation.startswith("[")]
+    if not rows:
+        return ImagePolygons(np.empty((0, 2)), np.zeros(1, dtype=np.int64), np.empty((0, 4)), np.empty(0, dtype=object))
+
+    # Replace the brackets by markers: NaN ends a polygon, inf ends an annotation
+    text = " inf ".join(segmentation for segmentation, _ in rows).replace("[", " ").replace("]", " nan ").replace(",", " ")
+    values = np.array(text.split(), dtype=np.float64)
+    is_end = np.isnan(values)
+    is_value = np.isfinite(values)
+    annotation_ids = np.cumsum(np.isinf(values))[is_value]
+    polygon_ids = np.cumsum(is_end)[is_value]
+
+    # Number of vertices of each polygon (the nested brackets also yield empty ones)
+    lengths = np.bincount(polygon_ids, minlength=is_end.sum() + 1)
+    if np.any(lengths % 2):
+        raise ValueError("Polygons must consist of x / y pairs!")
+    lengths //= 2
+    # Gather the vertices of the polygons, dropping degenerate ones (a single vertex)
+    polygons = np.flatnonzero(lengths >= 2)
+    lengths = lengths[polygons]
+    coords = values[is_value].reshape(-1, 2)
+    starts = np.searchsorted(polygon_ids[::2], polygons)
+    coords = coords[np.repeat(starts, lengths) + np.arange(lengths.sum()) - np.repeat(np.cumsum(lengths) - lengths, lengths)]
+    offsets = np.zeros(len(polygons) + 1, dtype=np.int64)
+    np.cumsum(lengths, out=offsets[1:])
+
+    # Close the polygons by repeating their first vertex
+    points = np.insert(coords, offsets[1:], coords[offsets[:-1]], axis=0)
+    first_annotations = annotation_ids[::2][starts]
+    offsets += np.arange(len(offsets))
+
+    bounds = np.column_stack([
+        np.minimum.reduceat(points[:, 0], offsets[:-1]),
+        np.minimum.reduceat(points[:, 1], offsets[:-1]),
+        np.maximum.reduceat(points[:, 0], offsets[:-1]),
+        np.maximum.reduceat(points[:, 1], offsets[:-1])
+    ]) if len(polygons) else np.empty((0, 4))
+    category_names = np.array([category for _, category in rows], dtype=object)
+    return ImagePolygons(points, offsets, bounds, category_names[first_annotations] if len(polygons) else np.empty(0, dtype=object))